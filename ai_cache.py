@@ -0,0 +1,164 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# 缓存目录
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Cache')
+# 磁盘缓存数据库路径
+DB_FILE = os.path.join(CACHE_DIR, 'ai_cache.db')
+
+# 缓存有效期（秒）
+DEFAULT_TTL = 7 * 24 * 60 * 60
+# 内存中最多缓存的回复数
+DEFAULT_MEMORY_ENTRIES = 256
+# 磁盘上最多缓存的回复数
+DEFAULT_DISK_ENTRIES = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS replies (
+    key TEXT PRIMARY KEY,
+    reply TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_replies_used_at ON replies(used_at);
+CREATE INDEX IF NOT EXISTS idx_replies_created_at ON replies(created_at);
+"""
+
+
+# 计算缓存键
+def make_key(model, prompt, text_raw):
+    """
+    以模型、prompt和微博内容的哈希作为缓存键，任一项变化都会生成新的回复
+
+    Returns:
+        str: 缓存键
+    """
+    digest = hashlib.sha256()
+    for part in (model, prompt, text_raw):
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+# AI回复缓存：内存LRU + 磁盘SQLite两级
+class ReplyCache:
+    def __init__(self, path=DB_FILE, ttl=DEFAULT_TTL, memory_entries=DEFAULT_MEMORY_ENTRIES,
+                 disk_entries=DEFAULT_DISK_ENTRIES):
+        """
+        初始化缓存
+
+        Args:
+            path: 磁盘缓存数据库路径
+            ttl: 缓存有效期（秒）
+            memory_entries: 内存中最多缓存的回复数
+            disk_entries: 磁盘上最多缓存的回复数
+        """
+        self.path = path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.memory = OrderedDict()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.conn = None
+        self._lock = threading.Lock()
+
+    def configure(self, ttl=None, memory_entries=None, disk_entries=None):
+        with self._lock:
+            if ttl is not None:
+                self.ttl = float(ttl)
+            if memory_entries is not None:
+                self.memory_entries = int(memory_entries)
+                while len(self.memory) > self.memory_entries:
+                    self.memory.popitem(last=False)
+            if disk_entries is not None:
+                self.disk_entries = int(disk_entries)
+
+    def _connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.executescript(SCHEMA)
+        return self.conn
+
+    def _remember(self, key, reply, created_at):
+        self.memory[key] = (reply, created_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        查询缓存，先查内存再查磁盘，过期的条目视为不存在
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            str: 缓存的回复，未命中时返回None
+        """
+        now = time.time()
+        with self._lock:
+            cached = self.memory.get(key)
+            if cached is not None:
+                if now - cached[1] < self.ttl:
+                    self.memory.move_to_end(key)
+                    self.hits_memory += 1
+                    return cached[0]
+                del self.memory[key]
+            conn = self._connect()
+            row = conn.execute('SELECT reply, created_at FROM replies WHERE key = ?', (key,)).fetchone()
+            if row is not None and now - row[1] < self.ttl:
+                conn.execute('UPDATE replies SET used_at = ? WHERE key = ?', (now, key))
+                self._remember(key, row[0], row[1])
+                self.hits_disk += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, reply):
+        """
+        写入缓存，并淘汰过期和超出容量的条目
+
+        Args:
+            key: 缓存键
+            reply: 回复内容
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, reply, now)
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('INSERT OR REPLACE INTO replies (key, reply, created_at, used_at) VALUES (?, ?, ?, ?)',
+                             (key, reply, now, now))
+                conn.execute('DELETE FROM replies WHERE created_at < ?', (now - self.ttl,))
+                # 超出容量时淘汰最久未使用的条目
+                conn.execute('DELETE FROM replies WHERE key IN ('
+                             'SELECT key FROM replies ORDER BY used_at DESC LIMIT -1 OFFSET ?)',
+                             (self.disk_entries,))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def stats(self):
+        """
+        获取命中统计
+
+        Returns:
+            dict: 内存命中、磁盘命中、未命中次数和内存条目数
+        """
+        with self._lock:
+            return {
+                'hits_memory': self.hits_memory,
+                'hits_disk': self.hits_disk,
+                'misses': self.misses,
+                'memory_entries': len(self.memory),
+            }
@@ -1,67 +1,377 @@
 import os
-from dotenv import load_dotenv
-from openai import OpenAI
-import json
-
-# 加载.env文件中的环境变量,文件路径为Config\.env
-load_dotenv('./Config/.env')
-
-# 从环境变量中获取您的API KEY，配置方法见：https://www.volcengine.com/docs/82379/1399008
-api_key = os.getenv('ARK_API_KEY')
-if not api_key:
-    raise ValueError("ARK_API_KEY 环境变量未设置")
-client = OpenAI(
-    base_url="https://ark.cn-beijing.volces.com/api/v3",
-    api_key=api_key,
-)
-
-# 从config.json中读取prompt
-with open(r'Config\config.json','r', encoding='utf-8') as f:
-    config = json.load(f)
-    prompt = config['prompt']
+import time
+import random
+import asyncio
+import threading
+import config_store
+from ai_cache import ReplyCache, make_key
+from hedging import Hedger
+import metrics
+from metrics import AI_GENERATION_SECONDS, AI_REQUESTS
+
+# .env文件路径
+ENV_FILE = './Config/.env'
+
+# 使用的模型
+MODEL = "doubao-seed-1-6-flash-250828"
+BASE_URL = "https://ark.cn-beijing.volces.com/api/v3"
+
+# 默认的调用参数，可在config.json的ai字段中覆盖
+DEFAULT_AI_SETTINGS = {
+    # 同时进行的模型请求数
+    'concurrency': 4,
+    # 单次生成（含重试）的总时限（秒）
+    'timeout': 60,
+    # 失败后最多重试的次数
+    'max_retries': 3,
+    # 指数退避的初始和最长等待时间（秒）
+    'backoff_base': 1.0,
+    'backoff_max': 20.0,
+    # 对冲请求配置，见hedging.DEFAULT_HEDGE_SETTINGS
+    'hedge': {},
+}
+
+
+# 生成回复失败，调用方应跳过发布
+class GenerationError(Exception):
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+# 超过时限仍未生成回复
+class GenerationTimeout(GenerationError):
+    def __init__(self, message):
+        super().__init__(message, retryable=True)
+
+# 模型返回了结果但无法提取回复内容
+class EmptyResponseError(GenerationError):
+    pass
+
+# 没有配置API KEY
+class APIKeyError(GenerationError):
+    pass
+
+
+# 相同内容的回复缓存
+reply_cache = ReplyCache()
+# 慢请求的对冲控制
+hedger = Hedger()
+
+async_client = None
+client_lock = threading.Lock()
+
+# 获取模型客户端
+def get_async_client():
+    """
+    获取模型客户端，首次调用时读取API KEY并创建，openai库也在此时才导入
+
+    Returns:
+        AsyncOpenAI: 模型客户端
+
+    Raises:
+        APIKeyError: 没有配置ARK_API_KEY
+    """
+    global async_client
+    if async_client is None:
+        with client_lock:
+            if async_client is None:
+                from dotenv import load_dotenv
+                from openai import AsyncOpenAI
+                # 加载.env文件中的环境变量
+                load_dotenv(ENV_FILE)
+                # 从环境变量中获取您的API KEY，配置方法见：https://www.volcengine.com/docs/82379/1399008
+                api_key = os.getenv('ARK_API_KEY')
+                if not api_key:
+                    raise APIKeyError("ARK_API_KEY 环境变量未设置")
+                async_client = AsyncOpenAI(
+                    # 压测时可通过ARK_BASE_URL指向本地替身服务
+                    base_url=os.getenv('ARK_BASE_URL', BASE_URL),
+                    api_key=api_key,
+                    # 重试由本模块控制
+                    max_retries=0,
+                )
+    return async_client
+
+
+# 后台运行异步请求的事件循环，同步调用方通过它并发地访问模型
+class AsyncRunner:
+    def __init__(self):
+        self.loop = None
+        self.semaphore = None
+        self.concurrency = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self.loop.run_forever, name='ai-loop', daemon=True)
+                thread.start()
+        return self.loop
+
+    def get_semaphore(self, concurrency):
+        # 只在事件循环线程中调用；并发数变化时换一个新的信号量，进行中的请求照常释放旧的
+        if self.semaphore is None or concurrency != self.concurrency:
+            self.semaphore = asyncio.Semaphore(concurrency)
+            self.concurrency = concurrency
+        return self.semaphore
+
+    def run(self, coroutine):
+        """
+        在后台事件循环中运行协程并等待结果
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.start()).result()
+
+
+runner = AsyncRunner()
+
+
+# 导出回复缓存和对冲请求的统计
+def collect_metrics():
+    cache_stats = reply_cache.stats()
+    hedge_stats = hedger.stats()
+    return [
+        ('ai_cache_hits_total', 'counter', '回复缓存命中数，tier为memory或disk',
+         [({'tier': 'memory'}, cache_stats['hits_memory']), ({'tier': 'disk'}, cache_stats['hits_disk'])]),
+        ('ai_cache_misses_total', 'counter', '回复缓存未命中数', [({}, cache_stats['misses'])]),
+        ('ai_hedges_total', 'counter', '发出的对冲请求数', [({}, hedge_stats['hedges'])]),
+        ('ai_hedge_wins_total', 'counter', '对冲请求先于首个请求返回的次数', [({}, hedge_stats['hedge_wins'])]),
+    ]
+
+metrics.register_collector(collect_metrics)
+
+
+# 获取AI调用参数
+def get_ai_settings(config):
+    settings = dict(DEFAULT_AI_SETTINGS)
+    settings.update(config.get('ai', {}))
+    return settings
+
 
 def generate_response(text_raw):
     """
-    根据微博内容生成回复
-    
+    根据微博内容生成回复（同步接口，供爬虫线程调用）
+
     Args:
         text_raw: 微博原始文本内容
-    
+
+    Returns:
+        str: 生成的回复内容
+
+    Raises:
+        GenerationError: 生成失败，调用方应跳过发布
+    """
+    # 在调用线程中完成首次初始化，避免导入openai时阻塞事件循环
+    get_async_client()
+    return runner.run(agenerate_response(text_raw))
+
+async def agenerate_response(text_raw):
+    """
+    根据微博内容生成回复，相同的模型、prompt和内容直接使用缓存的回复
+
+    Args:
+        text_raw: 微博原始文本内容
+
     Returns:
         str: 生成的回复内容
+
+    Raises:
+        GenerationError: 生成失败，调用方应跳过发布
     """
+    # 从配置存储中读取prompt，网页修改后无需重启即可生效
+    config = config_store.get_config() or {}
+    prompt = config.get('prompt', '')
+    cache_settings = config.get('ai_cache', {})
+    reply_cache.configure(ttl=cache_settings.get('ttl'),
+                          memory_entries=cache_settings.get('memory_entries'),
+                          disk_entries=cache_settings.get('disk_entries'))
+    key = make_key(MODEL, prompt, text_raw)
+    start = time.perf_counter()
+    # 缓存读写是带锁的SQLite操作，放到线程池中执行，不阻塞事件循环上的其他请求
+    loop = asyncio.get_running_loop()
+    try:
+        cached = await loop.run_in_executor(None, reply_cache.get, key)
+    except Exception as e:
+        print(f"读取回复缓存时出错: {e}")
+        cached = None
+    if cached is not None:
+        AI_GENERATION_SECONDS.observe(time.perf_counter() - start, result='cached')
+        return cached
+
+    try:
+        reply = await request_with_retry(prompt, text_raw, get_ai_settings(config))
+    except BaseException:
+        AI_GENERATION_SECONDS.observe(time.perf_counter() - start, result='error')
+        raise
+    AI_GENERATION_SECONDS.observe(time.perf_counter() - start, result='ok')
     try:
-        response = client.responses.create(
-            model="doubao-seed-1-6-flash-250828",
-            input=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "input_text",
-                            "text": f"{prompt}{text_raw}"
-                        },
-                    ],
-                }
-            ]
-        )
-        
-        # 从响应中提取实际的回复内容
-        if hasattr(response, 'output') and len(response.output) > 1:
-            output_message = response.output[1]
-            if hasattr(output_message, 'content') and len(output_message.content) > 0:
-                output_text = output_message.content[0]
-                if hasattr(output_text, 'text'):
-                    return output_text.text
-        # 如果以上结构不匹配，尝试其他可能的结构
-        elif hasattr(response, 'choices') and len(response.choices) > 0:
-            if hasattr(response.choices[0], 'message') and hasattr(response.choices[0].message, 'content'):
-                return response.choices[0].message.content
-            elif hasattr(response.choices[0], 'text'):
-                return response.choices[0].text
-        elif hasattr(response, 'text'):
-            return response.text
-        return "生成回复失败：无法提取回复内容"
+        await loop.run_in_executor(None, reply_cache.put, key, reply)
     except Exception as e:
-        print(f"AI生成回复时出错: {e}")
-        return f"生成回复失败: {str(e)}"
\ No newline at end of file
+        print(f"写入回复缓存时出错: {e}")
+    return reply
+
+# 判断模型接口的错误是否值得重试
+def is_retryable(error):
+    import openai
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+async def request_with_retry(prompt, text_raw, settings):
+    """
+    在并发限制和总时限内调用模型，遇到429和5xx时指数退避（带随机抖动）后重试
+
+    Args:
+        prompt: 提示文本
+        text_raw: 微博原始文本内容
+        settings: AI调用参数
+
+    Returns:
+        str: 生成的回复内容
+
+    Raises:
+        GenerationError: 生成失败
+    """
+    deadline = time.monotonic() + float(settings['timeout'])
+    hedger.configure(settings['hedge'])
+    semaphore = runner.get_semaphore(max(1, int(settings['concurrency'])))
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            AI_REQUESTS.inc(outcome='timeout')
+            raise GenerationTimeout(f"生成回复超时（{settings['timeout']}秒）")
+        try:
+            # 排队等待并发名额的时间同样计入时限
+            reply = await asyncio.wait_for(request_limited(prompt, text_raw, semaphore), timeout=remaining)
+            AI_REQUESTS.inc(outcome='ok')
+            return reply
+        except asyncio.TimeoutError:
+            AI_REQUESTS.inc(outcome='timeout')
+            raise GenerationTimeout(f"生成回复超时（{settings['timeout']}秒）")
+        except GenerationError:
+            AI_REQUESTS.inc(outcome='failed')
+            raise
+        except Exception as e:
+            if not is_retryable(e) or attempt >= int(settings['max_retries']):
+                AI_REQUESTS.inc(outcome='failed')
+                print(f"AI生成回复时出错: {e}")
+                raise GenerationError(f"生成回复失败: {str(e)}", retryable=is_retryable(e)) from e
+            # 指数退避加全抖动，避免多个请求同时重试
+            backoff = min(float(settings['backoff_max']), float(settings['backoff_base']) * 2 ** attempt)
+            delay = random.uniform(0, backoff)
+            AI_REQUESTS.inc(outcome='retry')
+            print(f"AI生成回复时出错，{delay:.1f}秒后重试: {e}")
+            attempt += 1
+            await asyncio.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+
+# 占用一个并发名额后调用模型
+async def request_limited(prompt, text_raw, semaphore):
+    async with semaphore:
+        return await request_hedged(prompt, text_raw, semaphore)
+
+async def request_hedged(prompt, text_raw, semaphore):
+    """
+    调用模型生成回复，开启对冲时如果首个请求超过最近耗时的百分位仍未返回，
+    再发一个相同的请求，取先返回的结果并取消另一个
+
+    Args:
+        prompt: 提示文本
+        text_raw: 微博原始文本内容
+        semaphore: 并发限制，调用方已为首个请求占用一个名额
+
+    Returns:
+        str: 生成的回复内容
+    """
+    hedger.on_request()
+    primary = asyncio.ensure_future(request_response(prompt, text_raw))
+    started = {primary: time.monotonic()}
+    hedge_acquired = False
+    try:
+        delay = hedger.hedge_delay() if hedger.enabled else None
+        if delay is not None:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            # 并发已满或额度用完时不对冲，只等首个请求
+            if not done and not semaphore.locked() and hedger.try_hedge():
+                await semaphore.acquire()
+                hedge_acquired = True
+                hedge = asyncio.ensure_future(request_response(prompt, text_raw))
+                started[hedge] = time.monotonic()
+        pending = set(started)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    hedger.record(time.monotonic() - started[task], hedge_won=task is not primary)
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        if not primary.done():
+            # 被取消的首个请求至少耗时这么久，也计入直方图，避免阈值偏低
+            hedger.record(time.monotonic() - started[primary])
+        for task in started:
+            if not task.done():
+                task.cancel()
+        if hedge_acquired:
+            semaphore.release()
+
+async def request_response(prompt, text_raw):
+    """
+    调用一次模型生成回复
+
+    Args:
+        prompt: 提示文本
+        text_raw: 微博原始文本内容
+
+    Returns:
+        str: 生成的回复内容
+
+    Raises:
+        EmptyResponseError: 无法从结果中提取回复内容
+    """
+    response = await get_async_client().responses.create(
+        model=MODEL,
+        input=[
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "input_text",
+                        "text": f"{prompt}{text_raw}"
+                    },
+                ],
+            }
+        ]
+    )
+    text = extract_text(response)
+    if not text:
+        raise EmptyResponseError("生成回复失败：无法提取回复内容")
+    return text
+
+def extract_text(response):
+    """
+    从模型返回结果中提取回复内容
+
+    Returns:
+        str: 回复内容，无法提取时返回None
+    """
+    # 从响应中提取实际的回复内容
+    if hasattr(response, 'output') and len(response.output) > 1:
+        output_message = response.output[1]
+        if hasattr(output_message, 'content') and len(output_message.content) > 0:
+            output_text = output_message.content[0]
+            if hasattr(output_text, 'text'):
+                return output_text.text
+    # 如果以上结构不匹配，尝试其他可能的结构
+    elif hasattr(response, 'choices') and len(response.choices) > 0:
+        if hasattr(response.choices[0], 'message') and hasattr(response.choices[0].message, 'content'):
+            return response.choices[0].message.content
+        elif hasattr(response.choices[0], 'text'):
+            return response.choices[0].text
+    elif hasattr(response, 'text'):
+        return response.text
+    return None
@@ -0,0 +1,172 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+
+# brotli是可选依赖，未安装时只提供gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 小于该字节数的内容不压缩
+COMPRESS_MIN_SIZE = 1024
+# gzip压缩级别（预压缩的静态文件用最高级别，动态内容用较低级别）
+STATIC_GZIP_LEVEL = 9
+DYNAMIC_GZIP_LEVEL = 5
+
+# 常见静态文件的内容类型
+CONTENT_TYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.html': 'text/html; charset=utf-8',
+    '.json': 'application/json',
+}
+
+
+# 获取文件的内容类型
+def guess_content_type(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in CONTENT_TYPES:
+        return CONTENT_TYPES[ext]
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+# 是否值得压缩该类型的内容
+def is_compressible(content_type):
+    return content_type.startswith('text/') or 'javascript' in content_type or 'json' in content_type
+
+
+# 根据Accept-Encoding选择压缩方式
+def choose_encoding(accept_encoding, available):
+    """
+    根据客户端支持的编码选择压缩方式，优先brotli
+
+    Args:
+        accept_encoding: 请求头Accept-Encoding
+        available: 可用的编码集合
+
+    Returns:
+        str: 'br'、'gzip'，不压缩时返回None
+    """
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0'):
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in ('br', 'gzip'):
+        if encoding in available and (encoding in accepted or '*' in accepted):
+            return encoding
+    return None
+
+
+# 压缩动态内容（如JSON接口响应）
+def compress_body(body, accept_encoding):
+    """
+    按客户端支持的编码压缩较大的响应体
+
+    Args:
+        body: 响应体
+        accept_encoding: 请求头Accept-Encoding
+
+    Returns:
+        tuple: (压缩后的响应体, 编码)，不压缩时编码为None
+    """
+    if len(body) < COMPRESS_MIN_SIZE:
+        return body, None
+    encoding = choose_encoding(accept_encoding, {'gzip'})
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=DYNAMIC_GZIP_LEVEL), 'gzip'
+    return body, None
+
+
+# 缓存的静态文件
+class Asset:
+    def __init__(self, path, body, mtime):
+        self.path = path
+        self.mtime = mtime
+        self.content_type = guess_content_type(path)
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        self.version = self.etag[1:9]
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.text = None
+        # 各编码对应的响应体，启动后只压缩一次
+        self.variants = {None: body}
+        if len(body) >= COMPRESS_MIN_SIZE and is_compressible(self.content_type):
+            self.variants['gzip'] = gzip.compress(body, compresslevel=STATIC_GZIP_LEVEL, mtime=0)
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(body)
+
+    def get_body(self, accept_encoding):
+        """
+        获取适合客户端的响应体
+
+        Returns:
+            tuple: (响应体, 编码)
+        """
+        encoding = choose_encoding(accept_encoding, self.variants.keys())
+        return self.variants[encoding], encoding
+
+    def is_not_modified(self, if_none_match, if_modified_since):
+        """
+        判断客户端缓存是否仍然有效
+        """
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or self.etag in tags or ('W/' + self.etag) in tags
+        if if_modified_since:
+            try:
+                return int(self.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+# 内存中的静态文件缓存，以路径和修改时间为键
+class AssetCache:
+    def __init__(self):
+        self.assets = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """
+        获取缓存的文件，文件修改后自动重新读取和压缩
+
+        Args:
+            path: 文件的绝对路径
+
+        Returns:
+            Asset: 缓存的文件，文件不存在时返回None
+        """
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        asset = self.assets.get(path)
+        if asset is not None and asset.mtime == mtime:
+            return asset
+        with open(path, 'rb') as f:
+            body = f.read()
+        asset = Asset(path, body, mtime)
+        with self._lock:
+            self.assets[path] = asset
+        return asset
+
+    def get_text(self, path):
+        """
+        获取缓存的文本文件内容（用于模板）
+
+        Returns:
+            str: 文件内容，文件不存在时返回空字符串
+        """
+        asset = self.get(path)
+        if asset is None:
+            return ''
+        if asset.text is None:
+            asset.text = asset.variants[None].decode('utf-8')
+        return asset.text
@@ -0,0 +1,153 @@
+"""
+配置服务器并发压测
+
+在本地临时端口启动配置服务器（日志写入临时目录，不影响正式日志），
+模拟多个仪表盘客户端用长连接轮询 /api/logs，同时保持若干实时日志流连接，
+统计每秒请求数、延迟分位数和错误数。
+
+用法：
+    python benchmarks/load_test_server.py --clients 1,10,50,100 --duration 5 --streams 8
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import http.client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_manager
+
+
+# 计算分位数
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+# 模拟一个轮询日志页面的客户端
+def dashboard_client(port, deadline, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    since = 0
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request('GET', f'/api/logs?since={since}')
+            resp = conn.getresponse()
+            body = resp.read()
+            if resp.status != 200:
+                errors.append(resp.status)
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+                continue
+            since = json.loads(body)['last_seq']
+        except Exception as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+# 模拟一个实时日志流客户端，只接收不处理
+def stream_client(port, deadline, received, conns):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    conns.append(conn)
+    try:
+        conn.request('GET', '/api/logs/stream')
+        resp = conn.getresponse()
+        while time.time() < deadline:
+            chunk = resp.fp.read1(65536)
+            if not chunk:
+                break
+            received.append(chunk.count(b'\n\n'))
+    except Exception:
+        pass
+    finally:
+        conn.close()
+
+
+# 后台持续写日志，模拟爬虫运行
+def log_writer(deadline, rate):
+    i = 0
+    while time.time() < deadline:
+        log_manager.add_log('INFO', f'压测日志 {i}，uid：{1000000 + i % 50}')
+        i += 1
+        time.sleep(1.0 / rate)
+
+
+def run(port, clients, duration, streams, log_rate):
+    deadline = time.time() + duration
+    latencies, errors, received, conns = [], [], [], []
+    pollers = [threading.Thread(target=log_writer, args=(deadline, log_rate))]
+    pollers += [threading.Thread(target=dashboard_client, args=(port, deadline, latencies, errors)) for _ in range(clients)]
+    stream_threads = [threading.Thread(target=stream_client, args=(port, deadline, received, conns))
+                      for _ in range(streams)]
+    start = time.perf_counter()
+    for t in stream_threads + pollers:
+        t.start()
+    for t in pollers:
+        t.join()
+    # 只统计轮询窗口，实时日志流在没有新事件时会阻塞到读超时
+    elapsed = time.perf_counter() - start
+    for conn in list(conns):
+        try:
+            conn.sock.shutdown(socket.SHUT_RDWR)
+        except (AttributeError, OSError):
+            pass
+    for t in stream_threads:
+        t.join()
+    return {
+        'clients': clients,
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'errors': len(errors),
+        'stream_events': sum(received),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='配置服务器并发压测')
+    parser.add_argument('--clients', default='1,10,50,100', help='并发客户端数，逗号分隔')
+    parser.add_argument('--duration', type=float, default=5, help='每轮压测时长（秒）')
+    parser.add_argument('--streams', type=int, default=8, help='同时保持的实时日志流连接数')
+    parser.add_argument('--log-rate', type=float, default=50, help='每秒写入的日志条数')
+    parser.add_argument('--workers', type=int, default=None, help='服务器线程池大小')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='weibo_bot_bench_')
+    log_manager.store = log_manager.LogStore(os.path.join(tmp_dir, 'logs.jsonl'), os.path.join(tmp_dir, 'backup'))
+
+    import config_server
+    # 压测时不打印每个请求
+    config_server.ConfigHandler.log_message = lambda self, *a: None
+    kwargs = {'max_workers': args.workers} if args.workers else {}
+    httpd = config_server.PooledConfigServer(('127.0.0.1', 0), config_server.ConfigHandler, **kwargs)
+    port = httpd.server_address[1]
+    server_thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    server_thread.start()
+
+    print(f'{"客户端":>6} {"请求数":>8} {"请求/秒":>10} {"p50(ms)":>9} {"p99(ms)":>9} {"错误":>6} {"推送事件":>8}')
+    try:
+        for clients in [int(c) for c in args.clients.split(',')]:
+            r = run(port, clients, args.duration, args.streams, args.log_rate)
+            print(f'{r["clients"]:>6} {r["requests"]:>8} {r["rps"]:>10.1f} {r["p50_ms"]:>9.2f} '
+                  f'{r["p99_ms"]:>9.2f} {r["errors"]:>6} {r["stream_events"]:>8}')
+    finally:
+        httpd.shutdown()
+        start = time.perf_counter()
+        httpd.drain()
+        print(f'优雅关闭耗时：{time.perf_counter() - start:.2f}秒')
+
+
+if __name__ == '__main__':
+    main()
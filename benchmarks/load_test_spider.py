@@ -0,0 +1,252 @@
+"""
+爬虫离线压测
+
+启动本地替身服务（见standin_server.py）模拟微博和AI接口，在子进程中运行spider.main，
+让爬虫检查若干个合成用户，统计每轮检查耗时、检测延迟、回复延迟、请求速率和内存占用。
+所有数据（配置、cookie、mid数据库、日志、回复缓存）都写入临时目录，不影响正式数据。
+
+用法：
+    python benchmarks/load_test_spider.py --uids 10,100,1000,10000 --duration 60
+    python benchmarks/load_test_spider.py --uids 1000 --posts-per-hour 20 --error-rate 0.02 --json result.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from standin_server import start_standin
+
+# 压测时不限速的配置
+UNLIMITED_RATE = {'rate': 100000, 'burst': 100000}
+
+
+# 计算分位数
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+# 根据指标快照中的直方图估计分位数（取所在桶的上边界）
+def histogram_percentile(metric, p):
+    if not metric or not metric['values']:
+        return None
+    counts = [sum(value['counts'][i] for value in metric['values'])
+              for i in range(len(metric['values'][0]['counts']))]
+    total = sum(counts)
+    if not total:
+        return None
+    seen = 0
+    for bound, count in zip(metric['values'][0]['buckets'], counts):
+        seen += count
+        if seen >= total * p / 100:
+            return float('inf') if bound == '+Inf' else bound
+    return None
+
+# 汇总指标快照中的计数
+def metric_total(metric, **labels):
+    if not metric:
+        return 0
+    total = 0
+    for value in metric['values']:
+        if all(value['labels'].get(key) == str(val) for key, val in labels.items()):
+            total += value.get('value', value.get('count', 0))
+    return total
+
+
+# 在当前进程中运行爬虫（子进程入口）
+def run_spider(workdir, uids, duration, options):
+    """
+    把爬虫的各个存储指向临时目录，运行spider.main并在duration秒后输出统计
+
+    Returns:
+        dict: 指标快照和内存占用
+    """
+    config = {
+        'uid': {uid: '1' for uid in uids},
+        'prompt': '请用一句话回复：',
+        'sleep_time': options['min_interval'],
+        'min_interval': options['min_interval'],
+        'max_interval': options['max_interval'],
+        'concurrency': options['concurrency'],
+        'http_pool_size': options['concurrency'],
+        'rate_limits': {name: UNLIMITED_RATE for name in ('timeline', 'profile', 'status_show', 'comment_create')},
+        'ai': {'concurrency': options['ai_concurrency'], 'timeout': 30, 'backoff_base': 0.2, 'backoff_max': 2},
+        'pipeline': {'generate_workers': options['ai_concurrency']},
+    }
+    config_file = os.path.join(workdir, 'config.json')
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False)
+    cookie_file = os.path.join(workdir, 'weibo_cookie.json')
+    with open(cookie_file, 'w', encoding='utf-8') as f:
+        json.dump({'Cookie': 'XSRF-TOKEN=benchmark; SUB=benchmark', 'User-Agent': 'benchmark'}, f)
+
+    import config_store
+    import log_manager
+    import mid_store
+    import weibo_client
+    import ai_cache
+    import profile_cache
+    config_store.store = config_store.ConfigStore(config_file)
+    log_manager.store = log_manager.LogStore(os.path.join(workdir, 'logs', 'logs.jsonl'),
+                                             os.path.join(workdir, 'logs', 'backup'))
+    mid_store.store = mid_store.MidStore(os.path.join(workdir, 'state.db'))
+    weibo_client.client = weibo_client.WeiboClient(cookie_file=cookie_file)
+    import ai_utils
+    import spider
+    import metrics
+    ai_utils.reply_cache = ai_cache.ReplyCache(os.path.join(workdir, 'ai_cache.db'))
+    spider.profile_cache = profile_cache.ProfileCache(os.path.join(workdir, 'profiles.db'))
+    # 不迁移正式目录下的旧缓存
+    spider.CACHE_DIR = os.path.join(workdir, 'Cache')
+
+    try:
+        import psutil
+        process = psutil.Process()
+        read_rss = lambda: process.memory_info().rss
+    except ImportError:
+        import resource
+        # ru_maxrss在Linux上以KB为单位
+        read_rss = lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    rss_start = read_rss()
+    peak_rss = [rss_start]
+
+    def watch_memory():
+        while True:
+            peak_rss[0] = max(peak_rss[0], read_rss())
+            time.sleep(0.5)
+
+    threading.Thread(target=watch_memory, daemon=True).start()
+    threading.Thread(target=spider.main, name='spider', daemon=True).start()
+    time.sleep(duration)
+    return {
+        'metrics': metrics.snapshot(),
+        'pipeline': spider.get_pipeline().stats(),
+        'rss_start': rss_start,
+        'rss_end': read_rss(),
+        'rss_peak': peak_rss[0],
+    }
+
+
+# 运行一组压测
+def run_case(uid_count, args):
+    server = start_standin(posts_per_hour=args.posts_per_hour, weibo_latency=args.weibo_latency,
+                           ai_latency=args.ai_latency, error_rate=args.error_rate,
+                           ai_error_rate=args.ai_error_rate)
+    port = server.server_address[1]
+    base_url = f'http://127.0.0.1:{port}'
+    options = {
+        'min_interval': args.min_interval,
+        'max_interval': args.max_interval,
+        'concurrency': args.concurrency,
+        'ai_concurrency': args.ai_concurrency,
+    }
+    uids = [str(1000000000 + i) for i in range(uid_count)]
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, WEIBO_BASE_URL=base_url, ARK_BASE_URL=f'{base_url}/api/v3',
+                   ARK_API_KEY='benchmark')
+        payload = json.dumps({'workdir': workdir, 'uids': uids, 'duration': args.duration, 'options': options})
+        # 爬虫在子进程中运行，避免与替身服务争抢GIL，也保证每组压测的全局状态独立
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'], input=payload,
+                              cwd=workdir, env=env, capture_output=True, text=True,
+                              timeout=args.duration + 120)
+        if proc.returncode != 0:
+            raise RuntimeError(f'爬虫子进程出错：{proc.stderr[-2000:]}')
+        child = json.loads(proc.stdout.strip().splitlines()[-1])
+    with urllib.request.urlopen(f'{base_url}/stats') as resp:
+        standin = json.loads(resp.read())
+    server.shutdown()
+    server.server_close()
+
+    snapshot = child['metrics']
+    weibo_requests = sum(value for key, value in standin['requests'].items() if key != 'ai')
+    cycle = snapshot.get('spider_cycle_seconds')
+    return {
+        'uids': uid_count,
+        'duration': args.duration,
+        'cycles': metric_total(cycle),
+        'cycle_p50': histogram_percentile(cycle, 50),
+        'cycle_p95': histogram_percentile(cycle, 95),
+        'checked_per_sec': metric_total(snapshot.get('spider_checked_uids_total')) / args.duration,
+        'weibo_rps': weibo_requests / args.duration,
+        'ai_requests': standin['requests'].get('ai', 0),
+        'errors': standin['errors'],
+        'detected': len(standin['detection_latency']),
+        'detection_p50': percentile(standin['detection_latency'], 50),
+        'detection_p95': percentile(standin['detection_latency'], 95),
+        'replies': standin['comments'],
+        'reply_p50': percentile(standin['reply_latency'], 50),
+        'reply_p95': percentile(standin['reply_latency'], 95),
+        'pipeline_depth': {name: stage['depth'] for name, stage in child['pipeline'].items()},
+        'rss_start_mb': child['rss_start'] / 2 ** 20,
+        'rss_peak_mb': child['rss_peak'] / 2 ** 20,
+    }
+
+
+# 格式化秒数
+def fmt(seconds):
+    if seconds is None:
+        return '-'
+    if seconds == float('inf'):
+        return 'inf'
+    return f'{seconds:.2f}s'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='爬虫离线压测')
+    parser.add_argument('--uids', default='10,100,1000', help='逗号分隔的用户数列表')
+    parser.add_argument('--duration', type=float, default=30, help='每组压测的时长（秒）')
+    parser.add_argument('--concurrency', type=int, default=20, help='并发检查的用户数')
+    parser.add_argument('--ai-concurrency', type=int, default=8, help='AI并发请求数')
+    parser.add_argument('--min-interval', type=float, default=5, help='最短检查间隔（秒）')
+    parser.add_argument('--max-interval', type=float, default=60, help='最长检查间隔（秒）')
+    parser.add_argument('--posts-per-hour', type=float, default=6, help='每个用户每小时的平均发帖数')
+    parser.add_argument('--weibo-latency', type=float, default=0.05, help='微博接口平均延迟（秒）')
+    parser.add_argument('--ai-latency', type=float, default=0.8, help='AI接口平均延迟（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='微博接口返回500的概率')
+    parser.add_argument('--ai-error-rate', type=float, default=0.0, help='AI接口返回429/500的概率')
+    parser.add_argument('--json', help='把结果写入JSON文件')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        payload = json.loads(sys.stdin.read())
+        # 爬虫的print输出不混入结果
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        result = run_spider(payload['workdir'], payload['uids'], payload['duration'], payload['options'])
+        stdout.write(json.dumps(result) + '\n')
+        stdout.flush()
+        # 爬虫线程不会自行退出，直接结束进程
+        os._exit(0)
+
+    results = []
+    print(f'{"用户数":>8} {"轮数":>6} {"每轮P50":>8} {"每轮P95":>8} {"检查/秒":>8} {"请求/秒":>8} '
+          f'{"检测P50":>8} {"检测P95":>8} {"回复数":>6} {"回复P50":>8} {"回复P95":>8} {"峰值内存":>9}')
+    for uid_count in [int(value) for value in args.uids.split(',') if value]:
+        result = run_case(uid_count, args)
+        results.append(result)
+        print(f'{result["uids"]:>10} {result["cycles"]:>8} {fmt(result["cycle_p50"]):>10} '
+              f'{fmt(result["cycle_p95"]):>10} {result["checked_per_sec"]:>11.1f} {result["weibo_rps"]:>11.1f} '
+              f'{fmt(result["detection_p50"]):>10} {fmt(result["detection_p95"]):>10} {result["replies"]:>9} '
+              f'{fmt(result["reply_p50"]):>10} {fmt(result["reply_p95"]):>10} {result["rss_peak_mb"]:>10.1f}MB',
+              flush=True)
+        if result['errors']:
+            print(f'    错误数：{result["errors"]}，队列深度：{result["pipeline_depth"]}')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,439 @@
+"""
+本地替身服务：模拟微博接口和火山方舟（OpenAI兼容）的responses接口，用于离线压测
+
+模拟的接口：
+    GET  /ajax/profile/info?custom=<uid>
+    GET  /ajax/statuses/mymblog?uid=<uid>&page=<n>
+    GET  /ajax/statuses/show?id=<mid>
+    POST /ajax/comments/create
+    POST /api/v3/responses
+辅助接口：
+    GET  /stats   返回检测延迟、回复延迟和各接口请求数
+
+每个用户按泊松过程发帖（--posts-per-hour），帖子在被请求时才生成。
+时间线第一次返回某条帖子时记录检测延迟（返回时间 - 发帖时间），
+收到该帖子的评论时记录回复延迟（评论时间 - 发帖时间）。
+
+用法：
+    python benchmarks/standin_server.py --port 18100 --weibo-latency 0.05 --ai-latency 0.8 --error-rate 0.01
+"""
+import re
+import sys
+import json
+import time
+import functools
+import random
+import argparse
+import threading
+from datetime import datetime, timezone, timedelta
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 每页帖子数，与微博一致
+PAGE_SIZE = 20
+# 每个用户初始的历史帖子数
+INITIAL_POSTS = 30
+# 微博created_at的格式和时区
+CREATED_AT_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+WEIBO_TZ = timezone(timedelta(hours=8))
+# 示例文本
+SAMPLE_TEXT = '今天天气不错，出去走走，顺便拍了几张照片分享给大家。#日常# 生活总是充满惊喜，希望大家都有好心情！'
+
+
+# 格式化发帖时间
+@functools.lru_cache(maxsize=1 << 18)
+def format_created_at(timestamp):
+    return datetime.fromtimestamp(timestamp, WEIBO_TZ).strftime(CREATED_AT_FORMAT)
+
+
+# 生成一条完整的时间线帖子，字段和嵌套层级参照真实的mymblog返回
+def make_timeline_item(uid, mid, created, text=SAMPLE_TEXT, retweet=False, is_top=False):
+    """
+    Args:
+        uid: 用户ID
+        mid: 帖子ID
+        created: 发帖时间戳
+        text: 帖子内容
+        retweet: 是否带转发的原帖
+        is_top: 是否置顶
+
+    Returns:
+        dict: 帖子
+    """
+    user = {
+        'id': int(uid), 'idstr': str(uid), 'pc_new': 7, 'screen_name': f'用户{uid}',
+        'profile_image_url': f'https://tvax1.sinaimg.cn/crop.0.0.512.512.50/{uid}.jpg',
+        'profile_url': f'/u/{uid}', 'verified': False, 'verified_type': -1, 'domain': '',
+        'weihao': '', 'avatar_large': f'https://tvax1.sinaimg.cn/crop.0.0.512.512.180/{uid}.jpg',
+        'avatar_hd': f'https://tvax1.sinaimg.cn/crop.0.0.512.512.1024/{uid}.jpg',
+        'follow_me': False, 'following': True, 'mbrank': 6, 'mbtype': 12, 'planet_video': False,
+        'icon_list': [], 'status_total_counter': {'total_cnt': '1,024', 'repost_cnt': '10',
+                                                  'comment_cnt': '500', 'like_cnt': '514'},
+    }
+    pic_ids = [f'{mid:x}pic{i}' for i in range(3)]
+    pic_infos = {pic: {size: {'url': f'https://wx1.sinaimg.cn/{size}/{pic}.jpg', 'width': 1080,
+                              'height': 1440, 'cut_type': 1, 'type': None}
+                       for size in ('thumbnail', 'bmiddle', 'large', 'original', 'largest', 'mw2000')}
+                 for pic in pic_ids}
+    item = {
+        'visible': {'type': 0, 'list_id': 0},
+        'created_at': format_created_at(created),
+        'id': mid,
+        'idstr': str(mid),
+        'mid': str(mid),
+        'mblogid': f'N{mid % 10 ** 9}',
+        'user': user,
+        'can_edit': False,
+        'textLength': len(text) * 2,
+        'source': 'iPhone客户端',
+        'favorited': False,
+        'text': f'<a href="/n/{uid}">@{uid}</a> {text}',
+        'text_raw': text,
+        'pic_ids': pic_ids,
+        'pic_num': len(pic_ids),
+        'pic_infos': pic_infos,
+        'is_paid': False,
+        'mblog_vip_type': 0,
+        'reposts_count': random.randint(0, 100),
+        'comments_count': random.randint(0, 500),
+        'attitudes_count': random.randint(0, 2000),
+        'isLongText': False,
+        'mlevel': 0,
+        'content_auth': 0,
+        'region_name': '发布于 北京',
+        'annotations': [{'mapi_request': True}],
+        'url_struct': [],
+        'topic_struct': [{'title': '', 'topic_url': 'sinaweibo://searchall?q=%23日常%23', 'topic_title': '日常'}],
+    }
+    if is_top:
+        item['isTop'] = 1
+    if retweet:
+        item['retweeted_status'] = make_timeline_item(uid, mid - 1, created - 3600, text)
+    return item
+
+
+# 生成模板用的占位uid、mid和时间
+TEMPLATE_UID = '1357913579'
+TEMPLATE_MID = 8642086420864208
+TEMPLATE_CREATED = '__CREATED__'
+TEMPLATE_RT_CREATED = '__RT_CREATED__'
+# 预先编码并按占位内容切分的帖子模板，按(是否转发, 是否置顶)区分
+item_templates = {}
+
+# 各占位内容对应的实际值
+def template_values(uid, mid, created):
+    return {
+        str(TEMPLATE_MID): str(mid),
+        str(TEMPLATE_MID - 1): str(mid - 1),
+        f'{TEMPLATE_MID:x}': f'{mid:x}',
+        f'{TEMPLATE_MID - 1:x}': f'{mid - 1:x}',
+        f'N{TEMPLATE_MID % 10 ** 9}': f'N{mid % 10 ** 9}',
+        f'N{(TEMPLATE_MID - 1) % 10 ** 9}': f'N{(mid - 1) % 10 ** 9}',
+        TEMPLATE_UID: str(uid),
+        TEMPLATE_CREATED: format_created_at(created),
+        TEMPLATE_RT_CREATED: format_created_at(created - 3600),
+    }
+
+# 把帖子编码为JSON
+def encode_timeline_item(uid, mid, created, retweet=False, is_top=False):
+    """
+    与json.dumps(make_timeline_item(...))等价（计数类字段固定），但只在首次使用时构造完整对象，
+    之后把模板中的占位内容替换为实际值，避免替身服务自身成为压测瓶颈
+
+    Returns:
+        str: 帖子的JSON文本
+    """
+    key = (retweet, is_top)
+    parts = item_templates.get(key)
+    if parts is None:
+        item = make_timeline_item(TEMPLATE_UID, TEMPLATE_MID, 0, retweet=retweet, is_top=is_top)
+        item['created_at'] = TEMPLATE_CREATED
+        if retweet:
+            item['retweeted_status']['created_at'] = TEMPLATE_RT_CREATED
+        # 较长的占位内容优先匹配（mblogid是mid的后9位）
+        tokens = sorted(template_values(TEMPLATE_UID, TEMPLATE_MID, 0), key=len, reverse=True)
+        pattern = '(' + '|'.join(re.escape(token) for token in tokens) + ')'
+        # 切分后奇数位置是占位内容
+        parts = item_templates[key] = re.split(pattern, json.dumps(item, ensure_ascii=False))
+    values = template_values(uid, mid, created)
+    filled = list(parts)
+    filled[1::2] = [values[token] for token in parts[1::2]]
+    return ''.join(filled)
+
+
+# 单个用户的发帖状态
+class StandinUser:
+    def __init__(self, uid, rate, next_mid):
+        """
+        Args:
+            uid: 用户ID
+            rate: 每秒发帖数
+            next_mid: 生成mid的函数
+        """
+        self.uid = uid
+        self.rate = rate
+        self.next_mid = next_mid
+        now = time.time()
+        # (mid, 发帖时间)，按时间从新到旧
+        self.posts = []
+        # 历史帖子的发帖间隔与发帖频率一致，调度器据此估计检查间隔
+        created = now
+        history = []
+        for _ in range(INITIAL_POSTS):
+            created -= random.expovariate(rate) if rate > 0 else 3600
+            history.append(created)
+        for created in sorted(history):
+            self.posts.insert(0, (next_mid(), created))
+        self.next_post_at = now + (random.expovariate(rate) if rate > 0 else float('inf'))
+        self.served = set(mid for mid, _ in self.posts)
+        self.lock = threading.Lock()
+
+    def advance(self, now):
+        # 生成到now为止应当发布的帖子
+        with self.lock:
+            while self.next_post_at <= now:
+                self.posts.insert(0, (self.next_mid(), self.next_post_at))
+                self.next_post_at += random.expovariate(self.rate)
+
+
+# 替身服务的状态和统计
+class StandinState:
+    def __init__(self, posts_per_hour=2.0, weibo_latency=0.05, ai_latency=0.8,
+                 error_rate=0.0, ai_error_rate=0.0, jitter=0.5):
+        """
+        Args:
+            posts_per_hour: 每个用户每小时的平均发帖数
+            weibo_latency: 微博接口的平均延迟（秒）
+            ai_latency: AI接口的平均延迟（秒）
+            error_rate: 微博接口返回500的概率
+            ai_error_rate: AI接口返回500或429的概率
+            jitter: 延迟的随机波动比例
+        """
+        self.rate = posts_per_hour / 3600.0
+        self.weibo_latency = weibo_latency
+        self.ai_latency = ai_latency
+        self.error_rate = error_rate
+        self.ai_error_rate = ai_error_rate
+        self.jitter = jitter
+        self.users = {}
+        self.posts = {}
+        self.mid_counter = 5000000000000000
+        self.requests = {}
+        self.errors = {}
+        self.detection_latency = []
+        self.reply_latency = []
+        self.comments = 0
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def next_mid(self):
+        with self._lock:
+            self.mid_counter += random.randint(1, 1000)
+            return self.mid_counter
+
+    def get_user(self, uid):
+        with self._lock:
+            user = self.users.get(uid)
+        if user is None:
+            user = StandinUser(uid, self.rate, self.next_mid)
+            with self._lock:
+                user = self.users.setdefault(uid, user)
+                for mid, created in user.posts:
+                    self.posts.setdefault(mid, (uid, created))
+        return user
+
+    def count(self, endpoint, error=False):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            if error:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def delay(self, latency):
+        if latency > 0:
+            time.sleep(latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def timeline(self, uid, page):
+        user = self.get_user(uid)
+        now = time.time()
+        user.advance(now)
+        with user.lock:
+            page_posts = user.posts[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+            new = [(mid, created) for mid, created in page_posts if mid not in user.served]
+            user.served.update(mid for mid, _ in new)
+        with self._lock:
+            for mid, created in new:
+                self.posts[mid] = (uid, created)
+                self.detection_latency.append(now - created)
+        items = [encode_timeline_item(uid, mid, created, retweet=(mid % 3 == 0)) for mid, created in page_posts]
+        # 第一页带一条置顶的旧帖
+        if page == 1 and len(user.posts) > PAGE_SIZE:
+            top_mid, top_created = user.posts[-1]
+            items.insert(0, encode_timeline_item(uid, top_mid, top_created, is_top=True))
+        body = '{"ok": 1, "data": {"since_id": "", "list": [' + ', '.join(items) + f'], "total": {len(user.posts)}}}}}'
+        return body.encode('utf-8')
+
+    def comment(self, mid):
+        now = time.time()
+        with self._lock:
+            self.comments += 1
+            post = self.posts.get(mid)
+            if post is not None:
+                self.reply_latency.append(now - post[1])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'elapsed': time.time() - self.started_at,
+                'users': len(self.users),
+                'requests': dict(self.requests),
+                'errors': dict(self.errors),
+                'comments': self.comments,
+                'detection_latency': list(self.detection_latency),
+                'reply_latency': list(self.reply_latency),
+            }
+
+
+# 替身服务的请求处理器
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = data if isinstance(data, bytes) else json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 压测结束时爬虫进程直接退出，未完成的请求会断开
+            self.close_connection = True
+
+    def fail(self, endpoint):
+        # 按错误率返回500
+        if random.random() < self.state.error_rate:
+            self.state.count(endpoint, error=True)
+            self.send_json({'ok': 0, 'msg': 'standin error'}, status=500)
+            return True
+        self.state.count(endpoint)
+        return False
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        state = self.state
+        if parsed.path == '/stats':
+            self.send_json(state.stats())
+            return
+        if parsed.path == '/ajax/profile/info':
+            state.delay(state.weibo_latency)
+            if not self.fail('profile'):
+                uid = query.get('custom', ['0'])[0]
+                self.send_json({'ok': 1, 'data': {'user': {'id': int(uid), 'screen_name': f'用户{uid}'}}})
+        elif parsed.path == '/ajax/statuses/mymblog':
+            state.delay(state.weibo_latency)
+            if not self.fail('timeline'):
+                uid = query.get('uid', ['0'])[0]
+                page = max(1, int(query.get('page', ['1'])[0]))
+                self.send_json(state.timeline(uid, page))
+        elif parsed.path == '/ajax/statuses/show':
+            state.delay(state.weibo_latency)
+            if not self.fail('status_show'):
+                mid = int(query.get('id', ['0'])[0])
+                self.send_json({'ok': 1, 'id': mid, 'text_raw': f'{SAMPLE_TEXT}（{mid}）'})
+        else:
+            self.send_json({'ok': 0, 'msg': 'not found'}, status=404)
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        state = self.state
+        if parsed.path == '/ajax/comments/create':
+            state.delay(state.weibo_latency)
+            if not self.fail('comment_create'):
+                form = parse_qs(body.decode('utf-8'))
+                state.comment(int(form.get('id', ['0'])[0]))
+                self.send_json({'ok': 1, 'data': {}})
+        elif parsed.path.endswith('/responses'):
+            state.delay(state.ai_latency)
+            if random.random() < state.ai_error_rate:
+                state.count('ai', error=True)
+                status = random.choice((429, 500))
+                self.send_json({'error': {'message': 'standin error', 'type': 'server_error', 'code': status}},
+                               status=status)
+                return
+            state.count('ai')
+            request = json.loads(body or b'{}')
+            self.send_json({
+                'id': f'resp_{random.getrandbits(48):x}',
+                'object': 'response',
+                'created_at': int(time.time()),
+                'model': request.get('model', ''),
+                'status': 'completed',
+                'output': [
+                    {'type': 'reasoning', 'id': 'rs_standin', 'summary': []},
+                    {'type': 'message', 'id': 'msg_standin', 'role': 'assistant', 'status': 'completed',
+                     'content': [{'type': 'output_text', 'text': '说得真好，支持一下！', 'annotations': []}]},
+                ],
+            })
+        else:
+            self.send_json({'ok': 0, 'msg': 'not found'}, status=404)
+
+
+# 替身服务器，压测结束时客户端直接断开，不输出连接错误
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 大量并发连接时加大监听队列
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+# 启动替身服务
+def start_standin(port=0, **options):
+    """
+    在后台线程启动替身服务
+
+    Args:
+        port: 监听端口，0表示随机
+        options: 传给StandinState的参数
+
+    Returns:
+        StandinServer: 服务器，server_address[1]为实际端口
+    """
+    handler = type('Handler', (StandinHandler,), {'state': StandinState(**options)})
+    server = StandinServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, name='standin', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='微博和AI接口的本地替身服务')
+    parser.add_argument('--port', type=int, default=0, help='监听端口，0表示随机')
+    parser.add_argument('--posts-per-hour', type=float, default=2.0, help='每个用户每小时的平均发帖数')
+    parser.add_argument('--weibo-latency', type=float, default=0.05, help='微博接口平均延迟（秒）')
+    parser.add_argument('--ai-latency', type=float, default=0.8, help='AI接口平均延迟（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='微博接口返回500的概率')
+    parser.add_argument('--ai-error-rate', type=float, default=0.0, help='AI接口返回429/500的概率')
+    args = parser.parse_args()
+    server = start_standin(args.port, posts_per_hour=args.posts_per_hour, weibo_latency=args.weibo_latency,
+                           ai_latency=args.ai_latency, error_rate=args.error_rate,
+                           ai_error_rate=args.ai_error_rate)
+    # 输出实际端口，供压测脚本读取
+    print(server.server_address[1], flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+启动耗时测试
+
+1. 用 python -X importtime 统计 start.py、config_server、spider、ai_utils 各自的导入耗时，
+   列出累计耗时最多的模块；
+2. 以子进程运行 start.py，测量从启动到配置页面可以访问（GET / 返回200）的时间。
+
+第2步会运行真实的 start.py：缺少Config下的示例文件时会自动创建，并占用18002端口。
+
+用法：
+    python benchmarks/startup_time.py --repeat 5 --top 10
+    python benchmarks/startup_time.py --skip-serve
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import http.client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 配置服务器端口，与config_server.start_config_server一致
+PORT = 18002
+# 需要统计导入耗时的模块
+MODULES = ['start', 'config_server', 'spider', 'ai_utils']
+
+
+# 解析 -X importtime 的输出
+def parse_importtime(stderr):
+    """
+    Returns:
+        list: (模块名, 自身耗时微秒, 累计耗时微秒)
+    """
+    result = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        result.append((name.strip(), int(self_us), int(cumulative_us)))
+    return result
+
+
+# 在新进程中导入模块并统计耗时
+def measure_import(module, baseline=()):
+    """
+    Args:
+        module: 模块名
+        baseline: 解释器启动时就会导入的模块，不计入明细
+
+    Returns:
+        tuple: (模块累计耗时微秒, 明细列表)
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f'导入{module}失败：{proc.stderr.strip().splitlines()[-1]}')
+    entries = [entry for entry in parse_importtime(proc.stderr) if entry[0] not in baseline]
+    total = next((cumulative for name, _, cumulative in entries if name == module), 0)
+    return total, entries
+
+
+# 运行start.py并等待配置页面可访问
+def measure_serve(timeout=30):
+    env = dict(os.environ)
+    # 不实际打开浏览器
+    env['BROWSER'] = 'true'
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, 'start.py'], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f'start.py提前退出，返回码{proc.returncode}')
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=1)
+                conn.request('GET', '/')
+                if conn.getresponse().status == 200:
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f'{timeout}秒内配置页面仍不可访问')
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动耗时测试')
+    parser.add_argument('--repeat', type=int, default=5, help='每项测量的次数，取中位数')
+    parser.add_argument('--top', type=int, default=10, help='列出累计耗时最多的模块数')
+    parser.add_argument('--skip-serve', action='store_true', help='不运行start.py测量页面可访问时间')
+    args = parser.parse_args()
+
+    # 解释器自身启动时导入的模块（site等）
+    _, startup = measure_import('sys')
+    baseline = {name for name, _, _ in startup}
+    for module in MODULES:
+        runs = [measure_import(module, baseline) for _ in range(args.repeat)]
+        totals = sorted(total for total, _ in runs)
+        print(f'import {module}: 中位数 {totals[len(totals) // 2] / 1000:.1f}ms')
+        # 只显示最后一次的明细
+        entries = sorted(runs[-1][1], key=lambda entry: entry[2], reverse=True)
+        for name, self_us, cumulative_us in entries[1:args.top + 1]:
+            print(f'    {cumulative_us / 1000:8.1f}ms  (自身 {self_us / 1000:6.1f}ms)  {name}')
+
+    if not args.skip_serve:
+        times = sorted(measure_serve() for _ in range(args.repeat))
+        print(f'start.py 到配置页面可访问: 中位数 {times[len(times) // 2] * 1000:.0f}ms，'
+              f'最快 {times[0] * 1000:.0f}ms，最慢 {times[-1] * 1000:.0f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+时间线解析测试
+
+比较两种解析mymblog响应的方式：
+1. 完整解析：json.loads整个响应后读取data.list（改动前的做法）；
+2. 流式解析：timeline_parser.read_timeline逐条解码，读到已处理的帖子即停止。
+
+分别统计每页的解析耗时和解析过程中的峰值内存（tracemalloc）。新帖数为0表示
+只需读到第一条已处理的帖子，all表示读取整页（首次检查时）。
+
+响应可以是录制的真实响应（--payload，可指定多个文件），也可以由替身服务的
+生成器按真实结构生成（默认，20条帖子，三分之一带转发，第一条为置顶的旧帖）。
+
+用法：
+    python benchmarks/timeline_parse.py
+    python benchmarks/timeline_parse.py --payload mymblog1.json mymblog2.json --repeat 500
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from timeline_parser import read_timeline
+from standin_server import encode_timeline_item, PAGE_SIZE
+
+
+# 生成一页时间线
+def make_payload(uid, start_mid, now):
+    items = [encode_timeline_item(uid, start_mid - 10, now - 86400 * 30, is_top=True)]
+    for i in range(PAGE_SIZE):
+        mid = start_mid + (PAGE_SIZE - i) * 10
+        items.append(encode_timeline_item(uid, mid, now - i * 3600, retweet=(i % 3 == 0)))
+    return ('{"ok": 1, "data": {"since_id": "", "list": [' + ', '.join(items)
+            + f'], "total": {PAGE_SIZE}}}}}').encode('utf-8')
+
+# 改动前的完整解析
+def full_parse(content, max_id):
+    posts = json.loads(content.decode('utf-8'))['data']['list']
+    return [(post['id'], post.get('created_at')) for post in posts if not post.get('isTop')]
+
+# 流式解析
+def stream_parse(content, max_id):
+    posts = read_timeline(content, max_id)
+    return [(post['id'], post.get('created_at')) for post in posts if not post.get('isTop')]
+
+
+# 计算每页解析耗时（微秒）
+def measure_time(func, payloads, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for content, max_id in payloads:
+            func(content, max_id)
+    return (time.perf_counter() - start) / (repeat * len(payloads)) * 1e6
+
+# 计算单页解析的峰值内存（KB）
+def measure_memory(func, payloads):
+    peaks = []
+    for content, max_id in payloads:
+        tracemalloc.start()
+        func(content, max_id)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return max(peaks) / 1024
+
+
+# 非置顶帖子的mid，按页面顺序
+def timeline_mids(content):
+    return [post['id'] for post in json.loads(content.decode('utf-8'))['data']['list'] if not post.get('isTop')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='时间线解析测试')
+    parser.add_argument('--payload', nargs='*', help='录制的mymblog响应文件')
+    parser.add_argument('--repeat', type=int, default=200, help='每种情况的重复次数')
+    parser.add_argument('--new', default='0,1,5,all', help='逗号分隔的新帖数，all表示读取整页')
+    args = parser.parse_args()
+
+    if args.payload:
+        pages = []
+        for path in args.payload:
+            with open(path, 'rb') as f:
+                pages.append(f.read())
+    else:
+        now = time.time()
+        pages = [make_payload(str(1000000000 + i), 5000000000000000 + i * 1000, now) for i in range(10)]
+    size = sum(len(content) for content in pages) / len(pages)
+    print(f'{len(pages)}页响应，平均{size / 1024:.1f}KB')
+
+    # 流式解析的结果应与完整解析一致
+    for content in pages:
+        mids = timeline_mids(content)
+        assert [mid for mid, _ in stream_parse(content, None)] == mids
+        if len(mids) > 1:
+            assert [mid for mid, _ in stream_parse(content, mids[1])] == mids[:2]
+
+    print(f'{"新帖数":>6} {"完整解析":>10} {"流式解析":>10} {"加速":>6} {"完整峰值内存":>12} {"流式峰值内存":>12}')
+    for new in args.new.split(','):
+        payloads = []
+        for content in pages:
+            mids = timeline_mids(content)
+            if new == 'all' or int(new) >= len(mids):
+                max_id = None
+            else:
+                max_id = mids[int(new)]
+            payloads.append((content, max_id))
+        full_us = measure_time(full_parse, payloads, args.repeat)
+        stream_us = measure_time(stream_parse, payloads, args.repeat)
+        full_kb = measure_memory(full_parse, payloads)
+        stream_kb = measure_memory(stream_parse, payloads)
+        print(f'{new:>9} {full_us:>11.0f}us {stream_us:>11.0f}us {full_us / stream_us:>7.1f}x '
+              f'{full_kb:>15.0f}KB {stream_kb:>15.0f}KB')
+
+
+if __name__ == '__main__':
+    main()
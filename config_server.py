@@ -2,10 +2,17 @@ import http.server
 import socketserver
 import json
 import os
-import webbrowser
+import re
+import copy
+import hashlib
 from urllib.parse import parse_qs, urlparse
 import time
+import signal
+import socket
 import threading
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # 模板文件路径
 TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates')
@@ -15,17 +22,51 @@ print(f"STATIC_DIR: {STATIC_DIR}")
 print(f"TEMPLATE_DIR: {TEMPLATE_DIR}")
 
 # 从log_manager.py导入日志相关的函数
-from log_manager import add_log, get_all_logs, get_new_logs, clear_logs
+from log_manager import add_log, get_all_logs, get_new_logs, clear_logs, subscribe_logs, unsubscribe_logs, search_logs
+import config_store
+from asset_cache import AssetCache, compress_body, is_compressible
+import metrics
+from profiler import profiler, DEFAULT_SAMPLE_INTERVAL
+from sharding import coordinator, is_sharded
+from spider_runtime import runtime
+
+# 实时日志流的心跳间隔（秒）
+HEARTBEAT_INTERVAL = 15
+# 处理请求的最大线程数（长连接会占用线程，需大于同时在线的客户端数）
+MAX_WORKERS = 64
+# 线程全忙时最多排队的连接数，超过后直接返回503
+MAX_PENDING = 64
+# 最多同时连接的实时日志客户端数，避免长连接占满线程池
+MAX_STREAM_CLIENTS = 16
+# 单个连接的读写超时（秒），也是长连接的空闲超时
+REQUEST_TIMEOUT = 15
 
 # 配置文件路径
-CONFIG_FILE = os.path.join(os.path.dirname(__file__), 'Config', 'config.json')
+CONFIG_FILE = config_store.CONFIG_FILE
 ENV_FILE = os.path.join(os.path.dirname(__file__), 'Config', '.env')
 COOKIE_FILE = os.path.join(os.path.dirname(__file__), 'Config', 'weibo_cookie.json')
 
+# 模板和静态文件缓存
+assets = AssetCache()
+# 模板中引用静态文件的地址
+STATIC_URL_PATTERN = re.compile(r'(["\'])/static/([^"\'?]+)\1')
+# 带版本号的静态文件缓存一年
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# 给模板中的静态文件地址加上版本号，文件修改后地址随之变化
+def add_static_versions(html):
+    def versioned(match):
+        quote, relative_path = match.group(1), match.group(2)
+        asset = assets.get(os.path.join(STATIC_DIR, *relative_path.split('/')))
+        if asset is None:
+            return match.group(0)
+        return f'{quote}/static/{relative_path}?v={asset.version}{quote}'
+    return STATIC_URL_PATTERN.sub(versioned, html)
+
 # 读取模板文件
 def read_template(template_name):
     """
-    读取HTML模板文件
+    读取HTML模板文件（文件未修改时直接使用内存中的缓存）
     
     Args:
         template_name: 模板文件名
@@ -34,17 +75,14 @@ def read_template(template_name):
         str: 模板文件内容
     """
     template_path = os.path.join(TEMPLATE_DIR, template_name)
-    if os.path.exists(template_path):
-        with open(template_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    return ''
+    return add_static_versions(assets.get_text(template_path))
 
-# 读取配置文件
+# 读取配置文件（返回内存配置的副本）
 def read_config():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {'uid': {}}
+    config = config_store.get_config()
+    if config is None:
+        return {'uid': {}}
+    return copy.deepcopy(config)
 
 # 读取.env文件
 def read_env():
@@ -59,10 +97,9 @@ def read_env():
             return env_vars
     return {}
 
-# 保存配置文件
+# 保存配置文件，同时更新进程内的配置存储
 def save_config(config):
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(config, f, ensure_ascii=False, indent=2)
+    config_store.save_config(config)
 
 # 保存.env文件
 def save_env(env_vars):
@@ -99,16 +136,94 @@ def save_cookie(cookie_data):
 
 # 自定义HTTP请求处理器
 class ConfigHandler(http.server.SimpleHTTPRequestHandler):
+    # 使用HTTP/1.1以支持长连接，所有响应都必须带Content-Length
+    protocol_version = 'HTTP/1.1'
+    timeout = REQUEST_TIMEOUT
+    # 响应头和响应体分两次写出，关闭Nagle算法避免每个请求多等40ms
+    disable_nagle_algorithm = True
+    
+    def send_body(self, body, content_type='text/plain; charset=utf-8', status=200,
+                  encoding=None, headers=None, compress=True):
+        """
+        发送完整的响应，较大的文本内容按客户端支持自动压缩
+        
+        Args:
+            body: 响应内容（bytes）
+            content_type: 内容类型
+            status: 状态码
+            encoding: body已经压缩时的编码
+            headers: 额外的响应头
+            compress: 是否尝试压缩
+        """
+        if encoding is None and compress and is_compressible(content_type):
+            body, encoding = compress_body(body, self.headers.get('Accept-Encoding'))
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if is_compressible(content_type):
+            self.send_header('Vary', 'Accept-Encoding')
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+    
+    def send_not_modified(self, headers):
+        """
+        客户端缓存仍然有效，返回304
+        """
+        self.send_response(304)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+    
+    def send_page(self, html):
+        """
+        发送HTML页面，内容未变化时返回304
+        """
+        body = html.encode('utf-8')
+        headers = {
+            'ETag': '"' + hashlib.sha1(body).hexdigest()[:16] + '"',
+            'Cache-Control': 'no-cache',
+        }
+        if self.headers.get('If-None-Match') == headers['ETag']:
+            self.send_not_modified(headers)
+            return
+        self.send_body(body, 'text/html; charset=utf-8', headers=headers)
+    
+    def send_asset(self, asset, immutable=False):
+        """
+        发送缓存的静态文件，支持ETag/Last-Modified协商缓存
+        
+        Args:
+            asset: 缓存的文件
+            immutable: 地址带版本号时允许浏览器长期缓存
+        """
+        headers = {
+            'ETag': asset.etag,
+            'Last-Modified': asset.last_modified,
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else 'no-cache',
+        }
+        if asset.is_not_modified(self.headers.get('If-None-Match'), self.headers.get('If-Modified-Since')):
+            self.send_not_modified(headers)
+            return
+        body, encoding = asset.get_body(self.headers.get('Accept-Encoding'))
+        self.send_body(body, asset.content_type, encoding=encoding, headers=headers, compress=False)
+    
+    def send_json(self, data, status=200):
+        """
+        发送JSON响应
+        """
+        self.send_body(json.dumps(data).encode('utf-8'), 'application/json', status)
+    
     def do_GET(self):
         parsed_path = urlparse(self.path)
         path = parsed_path.path
         
         if path == '/':
             # 提供配置页面
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html; charset=utf-8')
-            self.end_headers()
-            
             config = read_config()
             env_vars = read_env()
             
@@ -151,9 +266,11 @@ class ConfigHandler(http.server.SimpleHTTPRequestHandler):
             try:
                 prompt = config.get('prompt', '')
                 sleep_time = config.get('sleep_time', 10)
+                concurrency = config.get('concurrency', 5)
             except:
                 prompt = ''
                 sleep_time = 10
+                concurrency = 5
             
             # 读取HTML模板文件
             template_content = read_template('config.html')
@@ -165,96 +282,242 @@ class ConfigHandler(http.server.SimpleHTTPRequestHandler):
             html = html.replace('{{user_agent}}', user_agent)
             html = html.replace('{{prompt}}', prompt)
             html = html.replace('{{sleep_time}}', str(sleep_time))
+            html = html.replace('{{concurrency}}', str(concurrency))
             
-            self.wfile.write(html.encode('utf-8'))
+            self.send_page(html)
         
         elif path == '/logs':
             # 提供日志页面
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html; charset=utf-8')
-            self.end_headers()
-            
             # 读取HTML模板文件
             template_content = read_template('logs.html')
             
-            self.wfile.write(template_content.encode('utf-8'))
+            self.send_page(template_content)
         
         elif path == '/api/logs':
-            # 提供日志数据
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
+            # 提供日志数据：带检索参数时在服务端过滤分页，带since参数时只返回新增的日志
+            query = parse_qs(parsed_path.query)
+            search_keys = ('level', 'uid', 'start', 'end', 'q', 'limit', 'offset')
+            
+            if any(key in query for key in search_keys):
+                try:
+                    result = search_logs(
+                        level=query.get('level', [None])[0],
+                        uid=query.get('uid', [None])[0],
+                        start=query.get('start', [None])[0],
+                        end=query.get('end', [None])[0],
+                        query=query.get('q', [None])[0],
+                        limit=int(query.get('limit', ['100'])[0]),
+                        offset=int(query.get('offset', ['0'])[0]))
+                except ValueError as e:
+                    self.send_json({
+                        'success': False,
+                        'message': f'参数错误：{str(e)}'
+                    }, status=400)
+                    return
+                
+                self.send_json({
+                    'success': True,
+                    'logs': result['logs'],
+                    'total': result['total']
+                })
+                return
+            
+            try:
+                since = int(query.get('since', ['0'])[0])
+            except ValueError:
+                since = 0
             
             # 获取日志
-            logs = get_all_logs()
+            if since > 0:
+                logs, reset, last_seq = get_new_logs(since)
+            else:
+                logs, reset = get_all_logs(), True
+                last_seq = logs[-1]['seq'] if logs else 0
             
             # 返回日志数据
-            self.wfile.write(json.dumps({
+            self.send_json({
                 'success': True,
-                'logs': logs
-            }).encode('utf-8'))
+                'logs': logs,
+                'last_seq': last_seq,
+                'reset': reset
+            })
+        
+        elif path == '/api/logs/stream':
+            # 通过Server-Sent Events推送实时日志
+            self.stream_logs(parsed_path)
+        
+        elif path == '/api/metrics':
+            # 导出性能指标：默认Prometheus文本格式，format=json时供网页图表使用
+            query = parse_qs(parsed_path.query)
+            if query.get('format', [''])[0] == 'json':
+                self.send_json(metrics.snapshot())
+            else:
+                self.send_body(metrics.render().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8')
+        
+        elif path == '/api/spider':
+            # 爬虫的运行状态
+            self.send_json({'success': True, **runtime.status(), 'sharded': coordinator.running,
+                            'controls': list(spider_controls)})
+        
+        elif path == '/api/workers':
+            # 分片模式下协调器和各工作进程的状态
+            self.send_json({'success': True, **coordinator.status()})
+        
+        elif path == '/api/profile':
+            # 当前的分析任务和已保存的结果
+            self.send_json({'success': True, **profiler.status()})
+        
+        elif path == '/api/profile/download':
+            # 下载分析结果：pstats可用pstats/snakeviz查看，folded可用flamegraph.pl/speedscope生成火焰图，
+            # snapshot可用tracemalloc.Snapshot.load读取
+            query = parse_qs(parsed_path.query)
+            result_id = query.get('id', [''])[0]
+            fmt = query.get('format', [''])[0]
+            file_path = profiler.get_result_file(result_id, fmt)
+            if file_path is None or not os.path.exists(file_path):
+                self.send_json({'success': False, 'message': '分析结果不存在'}, status=404)
+                return
+            with open(file_path, 'rb') as f:
+                body = f.read()
+            text = fmt in ('txt', 'folded')
+            self.send_body(body, 'text/plain; charset=utf-8' if text else 'application/octet-stream',
+                           headers={'Content-Disposition': f'attachment; filename="{os.path.basename(file_path)}"'},
+                           compress=text)
         
         elif path.startswith('/static/'):
             # 提供静态文件
             try:
                 # 获取静态文件相对路径
                 relative_path = path[7:]
-                # 构建静态文件路径
-                static_file_path = os.path.join(STATIC_DIR, *relative_path.split('/'))
+                # 构建静态文件路径，不允许访问静态目录之外的文件
+                static_file_path = os.path.normpath(os.path.join(STATIC_DIR, *relative_path.split('/')))
+                asset = None
+                if static_file_path.startswith(os.path.join(STATIC_DIR, '')) and os.path.isfile(static_file_path):
+                    asset = assets.get(static_file_path)
                 
-                # 检查文件是否存在
-                if os.path.exists(static_file_path) and os.path.isfile(static_file_path):
-                    # 根据文件扩展名设置Content-type
-                    if static_file_path.endswith('.css'):
-                        content_type = 'text/css'
-                    elif static_file_path.endswith('.js'):
-                        content_type = 'application/javascript'
-                    else:
-                        content_type = 'application/octet-stream'
-                    
-                    # 读取并返回文件内容
-                    self.send_response(200)
-                    self.send_header('Content-type', content_type)
-                    self.end_headers()
-                    
-                    with open(static_file_path, 'rb') as f:
-                        self.wfile.write(f.read())
+                if asset is not None:
+                    # 地址带版本号时允许浏览器长期缓存
+                    immutable = 'v' in parse_qs(parsed_path.query)
+                    self.send_asset(asset, immutable=immutable)
                 else:
                     # 文件不存在
-                    self.send_response(404)
-                    self.end_headers()
-                    self.wfile.write(f'Not Found: {static_file_path}\nRelative path: {relative_path}'.encode('utf-8'))
+                    self.send_body(f'Not Found: {relative_path}'.encode('utf-8'), status=404)
             except Exception as e:
                 # 发生错误
-                self.send_response(500)
-                self.end_headers()
-                self.wfile.write(f'Internal Server Error: {str(e)}\nSTATIC_DIR: {STATIC_DIR}'.encode('utf-8'))
+                self.send_body(f'Internal Server Error: {str(e)}'.encode('utf-8'), status=500)
         
         else:
             # 404错误
-            self.send_response(404)
+            self.send_body(b'Not Found', status=404)
+    
+    def send_event(self, data, event=None, event_id=None):
+        """
+        发送一条Server-Sent Event
+        """
+        message = ''
+        if event:
+            message += f'event: {event}\n'
+        if event_id is not None:
+            message += f'id: {event_id}\n'
+        message += f'data: {json.dumps(data, ensure_ascii=False)}\n\n'
+        self.wfile.write(message.encode('utf-8'))
+    
+    def stream_logs(self, parsed_path):
+        """
+        推送实时日志，支持通过Last-Event-ID或since参数断点续传
+        """
+        query = parse_qs(parsed_path.query)
+        try:
+            last_seq = int(self.headers.get('Last-Event-ID') or query.get('since', ['0'])[0])
+        except ValueError:
+            last_seq = 0
+        
+        server = self.server
+        if not server.stream_slots.acquire(blocking=False):
+            self.send_json({'success': False, 'message': '实时日志连接数已达上限'}, status=503)
+            return
+        
+        # 先订阅再补发历史，避免两步之间产生的日志丢失
+        subscriber = subscribe_logs()
+        try:
+            # 事件流没有长度，以关闭连接表示结束
+            self.close_connection = True
+            self.send_response(200)
+            self.send_header('Content-type', 'text/event-stream; charset=utf-8')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.send_header('X-Accel-Buffering', 'no')
             self.end_headers()
-            self.wfile.write(b'Not Found')
+            self.wfile.write(b'retry: 3000\n\n')
+            
+            def resync():
+                nonlocal last_seq
+                logs, reset, _ = get_new_logs(last_seq)
+                if reset or last_seq == 0:
+                    self.send_event({}, event='reset')
+                    last_seq = 0
+                return logs
+            
+            pending = resync()
+            idle = 0
+            while not server.stopping.is_set():
+                for entry in pending:
+                    if entry.get('reset'):
+                        self.send_event({}, event='reset')
+                        last_seq = 0
+                    elif entry['seq'] > last_seq:
+                        self.send_event(entry, event_id=entry['seq'])
+                        last_seq = entry['seq']
+                self.wfile.flush()
+                
+                # 分段等待，服务器停止时能及时退出
+                entry = subscriber.get(timeout=1)
+                if subscriber.overflow:
+                    # 发送队列积压已满，丢弃队列内容，按序号重新同步
+                    subscriber.overflow = False
+                    while subscriber.get(timeout=0) is not None:
+                        pass
+                    pending = resync()
+                elif entry is None:
+                    pending = []
+                    idle += 1
+                    if idle >= HEARTBEAT_INTERVAL:
+                        # 心跳，保持连接并及时发现断开的客户端
+                        self.wfile.write(b': heartbeat\n\n')
+                        idle = 0
+                    continue
+                else:
+                    pending = [entry]
+                idle = 0
+        except OSError:
+            # 客户端断开或写超时
+            pass
+        finally:
+            unsubscribe_logs(subscriber)
+            server.stream_slots.release()
     
     def do_POST(self):
         parsed_path = urlparse(self.path)
         path = parsed_path.path
         
+        # 读取请求体（长连接下必须读完，否则会污染下一个请求）
+        content_length = int(self.headers.get('Content-Length') or 0)
+        post_data = self.rfile.read(content_length) if content_length else b''
+        
         if path == '/save':
-            # 读取请求体
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            
             try:
                 # 解析JSON数据
                 config_data = json.loads(post_data)
                 
-                # 保存配置文件
-                save_config({
+                # 保存配置文件（保留页面未涉及的高级配置项）
+                config = read_config()
+                config.update({
                     'uid': config_data.get('uid', {}),
                     'prompt': config_data.get('prompt', ''),
-                    'sleep_time': config_data.get('sleep_time', 10)
+                    'sleep_time': config_data.get('sleep_time', 10),
+                    'concurrency': config_data.get('concurrency', 5)
                 })
+                save_config(config)
                 
                 # 保存.env文件
                 save_env(config_data.get('env', {}))
@@ -263,76 +526,144 @@ class ConfigHandler(http.server.SimpleHTTPRequestHandler):
                 save_cookie(config_data.get('cookie', {}))
                 
                 # 返回成功响应
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({
+                self.send_json({
                     'success': True,
                     'message': '配置保存成功！点击启动爬虫按钮开始运行。'
-                }).encode('utf-8'))
+                })
                 add_log('INFO', '配置文件已更新。')
                 
             except Exception as e:
                 # 返回错误响应
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({
+                self.send_json({
                     'success': False,
                     'message': f'保存失败：{str(e)}'
-                }).encode('utf-8'))
+                })
                 add_log('ERROR', f'保存配置文件时出错：{str(e)}')
         
         elif path == '/start-spider':
+            # 重启要等旧的调度循环处理完当前任务，在后台执行，结果通过/api/spider的controls查询
+            action = '重启爬虫' if runtime.running or coordinator.running else '启动爬虫'
+            control_id = control_spider(action, restart_spider)
+            self.send_json({
+                'success': True,
+                'control_id': control_id,
+                'message': f'已提交{action}请求，当前任务完成后生效',
+            })
+        
+        elif path == '/stop-spider':
+            # 停止检查新的用户，流水线处理完已发现的微博后退出
+            if runtime.running or coordinator.running:
+                control_id = control_spider('停止爬虫', stop_spider)
+                self.send_json({'success': True, 'control_id': control_id,
+                                'message': '已提交停止爬虫请求，当前任务完成后退出'})
+            else:
+                self.send_json({'success': False, 'message': '爬虫没有在运行'})
+        
+        elif path == '/api/profile/start':
+            # 开始分析爬虫：mode为cpu、sample或memory，按seconds秒或cycles轮后自动停止
             try:
-                global spider_running
-                
-                # 启动爬虫子进程（输出重定向到日志文件，避免管道阻塞）
-                restart_spider()
-                
-                message = '重启' if spider_running else '启动'
-                # 返回成功响应
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({
-                    'success': True,
-                    'message': message + '成功！🚀',
-                }).encode('utf-8'))
-                add_log('INFO', message + '爬虫启动成功！🚀')
-
-                
-            except Exception as e:
-                # 返回错误响应
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({
-                    'success': False,
-                    'message': f'重启爬虫失败：{str(e)}'
-                }).encode('utf-8'))
-                add_log('ERROR', f'重启爬虫失败：{str(e)}')
+                options = json.loads(post_data or b'{}')
+                status = profiler.start(options.get('mode', 'cpu'),
+                                        seconds=options.get('seconds'),
+                                        cycles=options.get('cycles'),
+                                        interval=options.get('interval', DEFAULT_SAMPLE_INTERVAL))
+                add_log('INFO', f"开始分析爬虫性能，模式：{status['mode']}")
+                self.send_json({'success': True, 'running': status})
+            except (ValueError, RuntimeError) as e:
+                self.send_json({'success': False, 'message': str(e)}, status=400)
+        
+        elif path == '/api/profile/stop':
+            # 提前停止分析并保存结果
+            result = profiler.stop()
+            self.send_json({'success': result is not None, 'result': result})
         
         elif path == '/api/logs/clear':
-            # 清空日志
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            
             # 清空日志文件
             clear_logs()
             
             # 返回成功响应
-            self.wfile.write(json.dumps({
+            self.send_json({
                 'success': True,
                 'message': '日志清空成功！'
-            }).encode('utf-8'))
+            })
         
         else:
             # 404错误
-            self.send_response(404)
-            self.end_headers()
-            self.wfile.write(b'Not Found')
+            self.send_body(b'Not Found', status=404)
+
+# 使用有界线程池处理请求的HTTP服务器，支持优雅关闭
+class PooledConfigServer(socketserver.TCPServer):
+    allow_reuse_address = True
+    
+    def __init__(self, server_address, handler_class, max_workers=MAX_WORKERS,
+                 max_pending=MAX_PENDING, max_streams=MAX_STREAM_CLIENTS):
+        """
+        初始化服务器
+        
+        Args:
+            server_address: 监听地址
+            handler_class: 请求处理器类
+            max_workers: 处理请求的最大线程数
+            max_pending: 线程全忙时最多排队的连接数
+            max_streams: 最多同时连接的实时日志客户端数
+        """
+        super().__init__(server_address, handler_class)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='config-server')
+        self.slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self.stream_slots = threading.BoundedSemaphore(max_streams)
+        self.stopping = threading.Event()
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+    
+    def process_request(self, request, client_address):
+        # 超载时直接拒绝，避免无限排队
+        if self.stopping.is_set() or not self.slots.acquire(blocking=False):
+            try:
+                request.sendall(b'HTTP/1.1 503 Service Unavailable\r\n'
+                                b'Content-Length: 0\r\nConnection: close\r\n\r\n')
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.executor.submit(self.process_request_worker, request, client_address)
+    
+    def process_request_worker(self, request, client_address):
+        with self.connections_lock:
+            self.connections.add(request)
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self.connections_lock:
+                self.connections.discard(request)
+            self.shutdown_request(request)
+            self.slots.release()
+    
+    def drain(self):
+        """
+        优雅关闭：停止接受新连接，结束空闲的长连接，等待进行中的请求完成
+        """
+        self.stopping.set()
+        self.server_close()
+        with self.connections_lock:
+            connections = list(self.connections)
+        for request in connections:
+            try:
+                # 只关闭读方向，正在写的响应可以写完
+                request.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+httpd = None
+
+def stop_config_server():
+    """
+    停止配置服务器（可以在任意线程调用）
+    """
+    if httpd is not None:
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
 
 def start_config_server():
     """
@@ -342,16 +673,25 @@ def start_config_server():
     PORT = 18002
     
     # 创建服务器
-    httpd = socketserver.TCPServer(("", PORT), ConfigHandler)
+    config = read_config()
+    httpd = PooledConfigServer(("", PORT), ConfigHandler,
+                               max_workers=int(config.get('server_workers', MAX_WORKERS)))
     print(f"配置服务器已启动：http://localhost:{PORT}")
     # 添加日志记录
     add_log('INFO', f"配置服务已启动：http://localhost:{PORT}")
     try:
-        # 自动打开浏览器
+        # 自动打开浏览器，webbrowser仅在此处用到，延迟导入
+        import webbrowser
         webbrowser.open(f"http://localhost:{PORT}")
     except:
         pass
 
+    # 容器停止时发送SIGTERM，按正常流程关闭
+    try:
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_config_server())
+    except ValueError:
+        # 非主线程无法注册信号处理
+        pass
     
     try:
         # 启动服务器
@@ -359,50 +699,90 @@ def start_config_server():
     except KeyboardInterrupt:
         print("\n配置服务器已停止")
     finally:
-        httpd.server_close()
+        httpd.drain()
+        # 等待已发现的微博回复完成后再退出
+        try:
+            stop_spider()
+        except RuntimeError as e:
+            add_log('WARNING', str(e))
+        add_log('INFO', '配置服务已停止')
 
-def restart_spider():
+# 串行化爬虫的启动、停止和重启
+spider_control_lock = threading.Lock()
+# 最近的启动、停止和重启请求及其结果
+spider_controls = deque(maxlen=20)
+spider_control_ids = itertools.count(1)
+
+def control_spider(name, action):
     """
-    重启爬虫服务
+    在后台线程中执行启动、停止或重启，多次点击按顺序执行
+
+    Args:
+        name: 操作名称
+        action: 执行操作的函数，成功时返回结果说明，失败时抛出异常
+
+    Returns:
+        int: 操作ID，结果通过/api/spider的controls查询
     """
+    control = {'id': next(spider_control_ids), 'action': name, 'state': 'queued',
+               'message': None, 'finished_at': None}
+    spider_controls.append(control)
 
-    global spider_running,spider_thread
-    # 初始化爬虫线程
-    spider_thread = None
-    if spider_thread is None:
-        spider_thread = threading.Thread(target=start_spider,daemon=True)   
-        spider_thread.start()
-    else:
-        if spider_thread is not None and spider_thread.is_alive():
-            print('正在等待爬虫线程结束...')
-            add_log('INFO','正在等待爬虫线程结束...')
-            spider_running = False\
-                and spider_thread.join(timeout=10)
-                
-            if spider_thread.is_alive():
-                print('等待超时，强制终止爬虫线程')
-                add_log('WARNING','等待超时，强制终止爬虫线程')
-                spider_thread.terminate()
-        
-        print('重启新爬虫线程')
-        add_log('INFO','重启新爬虫线程')
-        spider_thread = threading.Thread(target=start_spider,daemon=True)   
-        spider_thread.start()
+    def run():
+        with spider_control_lock:
+            control['state'] = 'running'
+            try:
+                control['message'] = action()
+                control['state'] = 'done'
+                add_log('INFO', control['message'])
+            except Exception as e:
+                control['message'] = f'{name}失败：{str(e)}'
+                control['state'] = 'failed'
+                add_log('ERROR', control['message'])
+                print(control['message'])
+            control['finished_at'] = time.time()
+    threading.Thread(target=run, name='spider-control', daemon=True).start()
+    return control['id']
 
-def start_spider():
+def restart_spider():
     """
-    启动爬虫服务
+    按当前配置启动或重启爬虫：配置了工作进程数时由分片协调器运行，否则在本进程内运行，
+    切换运行方式时先停止另一种。进程内重启复用已有的连接池、缓存和流水线
+
+    Returns:
+        str: 结果说明
+
+    Raises:
+        RuntimeError: 旧的调度循环未能按时停止
+        ValueError: 分片配置无效
     """
-    global spider_running
-    spider_running = True
-    while spider_running:
-        try:
-            import spider
-            spider.main()
-        except Exception as e:
-            add_log('ERROR',f'爬虫运行出错：{e}')
-            print(f'爬虫运行出错：{e}')
-            time.sleep(5)  # 出错后等待5秒后重试
+    config = read_config()
+    restarting = runtime.running or coordinator.running
+    if is_sharded(config):
+        # 进程内的调度循环还在运行时启动工作进程，会有两个循环检查同一批用户
+        if not runtime.stop():
+            raise RuntimeError('进程内的爬虫未能按时停止，已拒绝启动工作进程，请在当前任务完成后重试')
+        coordinator.start(config)
+        return '爬虫工作进程已重启！🚀' if restarting else '爬虫工作进程已启动！🚀'
+    coordinator.stop()
+    if not runtime.restart():
+        raise RuntimeError('旧的调度循环未能按时停止，请在当前任务完成后重试')
+    return '爬虫已重启！🚀' if restarting else '爬虫已启动！🚀'
+
+def stop_spider():
+    """
+    停止爬虫，等待已发现的微博处理完成
+
+    Returns:
+        str: 结果说明
+
+    Raises:
+        RuntimeError: 调度循环未能按时停止
+    """
+    coordinator.stop()
+    if not runtime.stop():
+        raise RuntimeError('爬虫未能按时停止，将在当前任务完成后退出')
+    return '爬虫已停止'
         
 if __name__ == "__main__":
     start_config_server()
@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import copy
+import threading
+
+# 配置文件路径
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Config', 'config.json')
+
+# 两次检查配置文件是否变化的最小间隔（秒）
+CHECK_INTERVAL = 1.0
+
+
+# 内存中的配置存储，spider、ai_utils、config_server共用
+class ConfigStore:
+    def __init__(self, path=CONFIG_FILE, check_interval=CHECK_INTERVAL):
+        """
+        初始化配置存储
+
+        Args:
+            path: 配置文件路径
+            check_interval: 检查文件变化的最小间隔（秒）
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self._config = None
+        self._stamp = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _reload_if_changed(self):
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        if stamp is None:
+            # 文件被删除时保留内存中的配置
+            self._stamp = None
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            # 文件可能正在被写入或格式错误，保留旧配置，下次再试
+            print(f'读取配置文件时发生错误：{e}')
+            return
+        self._stamp = stamp
+        self._config = config
+
+    def get(self):
+        """
+        获取当前配置，最多每check_interval秒检查一次文件是否变化
+
+        返回的字典在多个线程间共享，调用方不要修改它，需要修改时使用update()
+
+        Returns:
+            dict: 配置，文件不存在或无法解析时返回None
+        """
+        now = time.monotonic()
+        if self._config is None or now - self._checked_at >= self.check_interval:
+            with self._lock:
+                self._checked_at = now
+                self._reload_if_changed()
+        return self._config
+
+    def save(self, config):
+        """
+        保存配置到文件并立即更新内存中的配置
+
+        Args:
+            config: 新的配置
+        """
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(config, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+            self._stamp = self._file_stamp()
+            self._checked_at = time.monotonic()
+            self._config = copy.deepcopy(config)
+
+    def update(self, func):
+        """
+        在锁内修改配置并保存，避免并发修改互相覆盖
+
+        Args:
+            func: 接收配置副本并就地修改的函数
+        """
+        with self._lock:
+            config = copy.deepcopy(self.get() or {'uid': {}})
+            func(config)
+            self.save(config)
+            return config
+
+
+store = ConfigStore()
+
+# 获取当前配置
+def get_config():
+    return store.get()
+
+# 保存配置
+def save_config(config):
+    store.save(config)
+
+# 修改并保存配置
+def update_config(func):
+    return store.update(func)
@@ -0,0 +1,183 @@
+import math
+import threading
+from collections import deque
+
+# 直方图最小和最大的桶边界（秒）
+MIN_LATENCY = 0.05
+MAX_LATENCY = 300.0
+# 相邻桶边界的倍数
+BUCKET_FACTOR = 1.25
+# 滚动窗口内保留的样本数
+DEFAULT_WINDOW = 500
+
+# 默认的对冲配置，可在config.json的ai.hedge字段中覆盖
+DEFAULT_HEDGE_SETTINGS = {
+    # 是否开启对冲请求
+    'enabled': False,
+    # 首个请求超过最近耗时的该百分位仍未返回时发出对冲请求
+    'percentile': 95,
+    # 样本数不足时不对冲
+    'min_samples': 20,
+    # 对冲等待时间的下限（秒）
+    'min_delay': 1.0,
+    # 额外请求占正常请求的最大比例
+    'max_extra_ratio': 0.1,
+    # 最多累积的对冲额度
+    'max_credits': 10,
+}
+
+
+# 滚动窗口的耗时直方图，桶边界按几何级数增长
+class LatencyHistogram:
+    def __init__(self, window=DEFAULT_WINDOW):
+        """
+        初始化直方图
+
+        Args:
+            window: 保留最近的样本数，更早的样本被移出统计
+        """
+        self.bounds = []
+        bound = MIN_LATENCY
+        while bound < MAX_LATENCY:
+            self.bounds.append(bound)
+            bound *= BUCKET_FACTOR
+        self.bounds.append(MAX_LATENCY)
+        # 最后一个桶收集超过MAX_LATENCY的样本
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.samples = deque()
+        self.window = window
+        self._lock = threading.Lock()
+
+    def _bucket(self, seconds):
+        if seconds <= MIN_LATENCY:
+            return 0
+        if seconds > MAX_LATENCY:
+            return len(self.bounds)
+        index = math.ceil(math.log(seconds / MIN_LATENCY, BUCKET_FACTOR))
+        # 浮点误差可能让index差一位
+        while index > 0 and seconds <= self.bounds[index - 1]:
+            index -= 1
+        while index < len(self.bounds) - 1 and seconds > self.bounds[index]:
+            index += 1
+        return index
+
+    def record(self, seconds):
+        """
+        记录一次耗时
+        """
+        bucket = self._bucket(seconds)
+        with self._lock:
+            self.samples.append(bucket)
+            self.counts[bucket] += 1
+            while len(self.samples) > self.window:
+                self.counts[self.samples.popleft()] -= 1
+
+    def percentile(self, p):
+        """
+        估计耗时的百分位
+
+        Args:
+            p: 百分位（0-100）
+
+        Returns:
+            float: 所在桶的上边界（秒），没有样本时返回None
+        """
+        with self._lock:
+            total = len(self.samples)
+            if total == 0:
+                return None
+            target = max(1, math.ceil(total * p / 100.0))
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= target:
+                    return self.bounds[min(index, len(self.bounds) - 1)]
+        return MAX_LATENCY
+
+    def __len__(self):
+        return len(self.samples)
+
+
+# 对冲请求控制器：决定等待多久再发第二个请求，并限制额外请求的比例
+class Hedger:
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.histogram = LatencyHistogram(window)
+        self.settings = dict(DEFAULT_HEDGE_SETTINGS)
+        # 每个正常请求增加max_extra_ratio的额度，每个对冲请求消耗1
+        self.credits = 0.0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def configure(self, settings):
+        with self._lock:
+            self.settings = dict(DEFAULT_HEDGE_SETTINGS)
+            self.settings.update(settings or {})
+
+    @property
+    def enabled(self):
+        return bool(self.settings.get('enabled'))
+
+    def on_request(self):
+        """
+        发出正常请求时调用，累积对冲额度
+        """
+        with self._lock:
+            self.requests += 1
+            self.credits = min(float(self.settings['max_credits']),
+                               self.credits + float(self.settings['max_extra_ratio']))
+
+    def hedge_delay(self):
+        """
+        计算对冲前的等待时间
+
+        Returns:
+            float: 等待秒数，样本不足时返回None表示不对冲
+        """
+        if len(self.histogram) < int(self.settings['min_samples']):
+            return None
+        threshold = self.histogram.percentile(float(self.settings['percentile']))
+        if threshold is None:
+            return None
+        return max(float(self.settings['min_delay']), threshold)
+
+    def try_hedge(self):
+        """
+        尝试消耗一次对冲额度
+
+        Returns:
+            bool: 是否允许发出对冲请求
+        """
+        with self._lock:
+            if self.credits < 1:
+                return False
+            self.credits -= 1
+            self.hedges += 1
+            return True
+
+    def record(self, seconds, hedge_won=False):
+        """
+        记录请求耗时，被取消的请求记录取消时已等待的时间
+        """
+        self.histogram.record(seconds)
+        if hedge_won:
+            with self._lock:
+                self.hedge_wins += 1
+
+    def stats(self):
+        """
+        获取对冲统计
+
+        Returns:
+            dict: 请求数、对冲数、对冲获胜数、剩余额度和当前阈值
+        """
+        with self._lock:
+            result = {
+                'requests': self.requests,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'credits': self.credits,
+            }
+        result['threshold'] = self.hedge_delay()
+        return result
@@ -0,0 +1,157 @@
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+
+# 索引中最多保留的日志条数，超过后丢弃最早的部分
+MAX_INDEXED_LOGS = 200000
+# 单页最多返回的日志条数
+MAX_PAGE_SIZE = 500
+
+# 从日志消息中提取uid
+UID_PATTERNS = [
+    re.compile(r'uid[：:]\s*(\d+)'),
+    re.compile(r'\((\d{5,})\)'),
+    re.compile(r'用户(\d{5,})'),
+]
+
+
+# 提取日志关联的uid
+def extract_uid(entry):
+    """
+    获取日志关联的uid，优先使用日志中的uid字段，否则从消息中匹配
+
+    Args:
+        entry: 日志条目
+
+    Returns:
+        str: uid，找不到时返回None
+    """
+    uid = entry.get('uid')
+    if uid:
+        return str(uid)
+    message = entry.get('message', '')
+    for pattern in UID_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return match.group(1)
+    return None
+
+
+# 日志索引：按时间排序的日志列表，外加按级别和uid的倒排表
+class LogIndex:
+    def __init__(self, max_logs=MAX_INDEXED_LOGS):
+        """
+        初始化日志索引
+
+        Args:
+            max_logs: 最多索引的日志条数
+        """
+        self.max_logs = max_logs
+        self.entries = []
+        self.times = []
+        self.by_level = {}
+        self.by_uid = {}
+        self._lock = threading.RLock()
+
+    def add(self, entry):
+        """
+        把一条日志加入索引
+
+        Args:
+            entry: 日志条目
+        """
+        with self._lock:
+            position = len(self.entries)
+            self.entries.append(entry)
+            # 日志按写入顺序追加，时间字符串天然有序；时钟回拨时沿用上一条的时间保持有序
+            log_time = entry.get('time', '')
+            if self.times and log_time < self.times[-1]:
+                log_time = self.times[-1]
+            self.times.append(log_time)
+            self.by_level.setdefault(str(entry.get('level', '')).upper(), []).append(position)
+            uid = extract_uid(entry)
+            if uid:
+                self.by_uid.setdefault(uid, []).append(position)
+            if len(self.entries) > self.max_logs * 5 // 4:
+                self._trim()
+
+    def _trim(self):
+        """
+        丢弃最早的日志，只保留max_logs条并重建倒排表
+        """
+        entries = self.entries[-self.max_logs:]
+        self.entries, self.times, self.by_level, self.by_uid = [], [], {}, {}
+        for entry in entries:
+            self.add(entry)
+
+    def search(self, level=None, uid=None, start=None, end=None, query=None, limit=100, offset=0):
+        """
+        按条件检索日志，结果按时间从新到旧分页
+
+        Args:
+            level: 日志级别
+            uid: 用户ID
+            start: 开始时间（含），格式为YYYY-MM-DD HH:MM:SS，可以只写前缀
+            end: 结束时间（含），格式同上
+            query: 全文搜索关键字（不区分大小写）
+            limit: 每页条数
+            offset: 跳过最新的多少条
+
+        Returns:
+            dict: 包含logs（按时间从旧到新）和total
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        offset = max(0, int(offset))
+        with self._lock:
+            # 时间范围对应的位置区间
+            lo = bisect_left(self.times, start) if start else 0
+            # 结束时间可能只写到日期或分钟，补齐后取闭区间
+            hi = bisect_right(self.times, end + '\uffff') if end else len(self.entries)
+            if lo >= hi:
+                return {'logs': [], 'total': 0}
+
+            # 从最短的倒排表开始求交集
+            postings = []
+            if level and level.lower() != 'all':
+                postings.append(self.by_level.get(level.upper(), []))
+            if uid:
+                postings.append(self.by_uid.get(str(uid), []))
+            if postings:
+                postings.sort(key=len)
+                first = postings[0]
+                candidates = first[bisect_left(first, lo):bisect_left(first, hi)]
+                for other in postings[1:]:
+                    other_set = set(other[bisect_left(other, lo):bisect_left(other, hi)])
+                    candidates = [p for p in candidates if p in other_set]
+            else:
+                candidates = range(lo, hi)
+
+            if query:
+                query = query.lower()
+                entries = self.entries
+                candidates = [p for p in candidates if query in str(entries[p].get('message', '')).lower()]
+
+            total = len(candidates)
+            page_end = max(0, total - offset)
+            page_start = max(0, page_end - limit)
+            logs = [self.entries[p] for p in candidates[page_start:page_end]]
+        return {'logs': logs, 'total': total}
+
+
+# 按文件名顺序列出需要索引的备份文件
+def list_backup_files(backup_dir):
+    """
+    列出备份目录中的日志文件（按时间从旧到新）
+
+    Args:
+        backup_dir: 备份目录
+
+    Returns:
+        list: 文件路径列表
+    """
+    if not os.path.isdir(backup_dir):
+        return []
+    names = [name for name in os.listdir(backup_dir)
+             if name.endswith('.json') or name.endswith('.jsonl')]
+    return [os.path.join(backup_dir, name) for name in sorted(names)]
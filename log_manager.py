@@ -1,9 +1,33 @@
 import time
 import json
 import os
+import queue
+import threading
+from collections import deque
+from log_index import LogIndex, list_backup_files
 
-# 日志文件路径
-LOG_FILE = 'logs/logs.json'
+# 日志目录
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+# 日志文件路径（每行一条JSON日志，只追加不重写）
+LOG_FILE = os.path.join(LOG_DIR, 'logs.jsonl')
+# 旧版日志文件路径（整个文件是一个JSON数组）
+LEGACY_LOG_FILE = os.path.join(LOG_DIR, 'logs.json')
+# 日志备份目录
+BACKUP_DIR = os.path.join(LOG_DIR, 'backup')
+
+# 内存中保留的最近日志条数
+MAX_LOGS = 1000
+# 单个日志文件的最大字节数，超过后轮转
+MAX_FILE_SIZE = 5 * 1024 * 1024
+# 单个日志文件的最长使用时间（秒），超过后轮转
+MAX_FILE_AGE = 24 * 60 * 60
+# 最多保留的备份文件数
+MAX_BACKUPS = 50
+# 不持锁建立索引的最多尝试次数，之后持锁建立
+INDEX_BUILD_ATTEMPTS = 3
+
+# 每个实时订阅者最多积压的日志条数
+SUBSCRIBER_QUEUE_SIZE = 500
 
 # 日志级别
 LOG_LEVELS = {
@@ -12,95 +36,428 @@ LOG_LEVELS = {
     'ERROR': 'error'
 }
 
+
+# 实时日志订阅者，每个连接的浏览器一个
+class LogSubscriber:
+    def __init__(self, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        """
+        初始化订阅者
+
+        Args:
+            maxsize: 发送队列的最大长度
+        """
+        self.queue = queue.Queue(maxsize=maxsize)
+        # 队列满时置位，发送方需要按序号重新同步
+        self.overflow = False
+
+    def push(self, entry):
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.overflow = True
+
+    def get(self, timeout):
+        """
+        等待下一条日志
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            dict: 日志条目，超时返回None
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+# 只追加的日志存储，写一条日志的开销与历史日志量无关
+class LogStore:
+    def __init__(self, path=LOG_FILE, backup_dir=BACKUP_DIR, max_logs=MAX_LOGS,
+                 max_file_size=MAX_FILE_SIZE, max_file_age=MAX_FILE_AGE, max_backups=MAX_BACKUPS):
+        """
+        初始化日志存储
+
+        Args:
+            path: 日志文件路径
+            backup_dir: 轮转后的备份目录
+            max_logs: 内存环形缓冲区的大小
+            max_file_size: 单个日志文件的最大字节数
+            max_file_age: 单个日志文件的最长使用时间（秒）
+            max_backups: 最多保留的备份文件数
+        """
+        self.path = path
+        self.backup_dir = backup_dir
+        self.max_file_size = max_file_size
+        self.max_file_age = max_file_age
+        self.max_backups = max_backups
+        self.recent = deque(maxlen=max_logs)
+        self._file = None
+        self._size = 0
+        self._opened_at = 0.0
+        self._loaded = False
+        self.last_seq = 0
+        self.subscribers = set()
+        self.index = None
+        # 轮转次数，建立索引期间文件被轮转时需要重建
+        self._rotations = 0
+        self._lock = threading.RLock()
+        # 同一时刻只有一个线程建立索引
+        self._index_lock = threading.Lock()
+
+    def _load(self):
+        """
+        首次使用时打开日志文件，并把最近的日志读入内存
+        """
+        if self._loaded:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._migrate_legacy()
+        if os.path.exists(self.path):
+            for entry in read_log_file(self.path):
+                self._assign_seq(entry)
+                self.recent.append(entry)
+        if not self.recent:
+            # 当前文件为空（刚清空或刚轮转）时，序号接着最近的备份继续
+            backups = list_backup_files(self.backup_dir)
+            if backups:
+                previous = read_log_file(backups[-1])
+                if previous and isinstance(previous[-1].get('seq'), int):
+                    self.last_seq = previous[-1]['seq']
+        self._open()
+        self._loaded = True
+
+    def _migrate_legacy(self):
+        """
+        把旧版logs.json中的日志迁移到新的日志文件
+        """
+        if self.path != LOG_FILE or not os.path.exists(LEGACY_LOG_FILE) or os.path.exists(self.path):
+            return
+        try:
+            with open(LEGACY_LOG_FILE, 'r', encoding='utf-8') as f:
+                logs = json.load(f)
+        except (OSError, ValueError):
+            logs = []
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for entry in logs:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.remove(LEGACY_LOG_FILE)
+
+    def _open(self):
+        # 上次崩溃可能留下没有换行的半行，先补上换行，避免污染下一条日志
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            with open(self.path, 'rb+') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+        self._opened_at = time.time()
+
+    def _rotate(self):
+        """
+        把当前日志文件移入备份目录并新建一个空文件
+        """
+        self._file.close()
+        if self._size:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            timestamp = time.strftime('%Y%m%d%H%M%S')
+            backup_path = os.path.join(self.backup_dir, f'logs_backup_{timestamp}.jsonl')
+            suffix = 1
+            while os.path.exists(backup_path):
+                backup_path = os.path.join(self.backup_dir, f'logs_backup_{timestamp}_{suffix}.jsonl')
+                suffix += 1
+            os.replace(self.path, backup_path)
+            self._prune_backups()
+        self._rotations += 1
+        self._open()
+
+    def _prune_backups(self):
+        backups = sorted(os.listdir(self.backup_dir))
+        for name in backups[:max(0, len(backups) - self.max_backups)]:
+            try:
+                os.remove(os.path.join(self.backup_dir, name))
+            except OSError:
+                pass
+
+    def _assign_seq(self, entry):
+        # 旧日志没有序号时按顺序补上
+        if isinstance(entry.get('seq'), int) and entry['seq'] > self.last_seq:
+            self.last_seq = entry['seq']
+        else:
+            self.last_seq += 1
+            entry['seq'] = self.last_seq
+
+    def append(self, entry):
+        """
+        追加一条日志，并分配单调递增的序号
+
+        Args:
+            entry: 日志条目
+        """
+        with self._lock:
+            self._load()
+            self.last_seq += 1
+            entry['seq'] = self.last_seq
+            line = json.dumps(entry, ensure_ascii=False) + '\n'
+            if self._size and (self._size >= self.max_file_size
+                               or time.time() - self._opened_at >= self.max_file_age):
+                self._rotate()
+            # 整行一次写入并刷新，进程崩溃时最多丢失最后一行
+            self._file.write(line)
+            self._file.flush()
+            self._size += len(line.encode('utf-8'))
+            self.recent.append(entry)
+            if self.index is not None:
+                self.index.add(entry)
+            for subscriber in self.subscribers:
+                subscriber.push(entry)
+
+    def search(self, **filters):
+        """
+        检索当前日志和备份日志，首次调用时建立索引
+
+        Args:
+            filters: 见LogIndex.search
+
+        Returns:
+            dict: 包含logs和total
+        """
+        if self.index is None:
+            with self._index_lock:
+                for _ in range(INDEX_BUILD_ATTEMPTS):
+                    if self.index is not None:
+                        break
+                    self._build_index()
+                if self.index is None:
+                    # 日志写入或轮转过于频繁，每次读完都已过时，持锁建立以保证完成
+                    with self._lock:
+                        self.append({'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'level': 'WARNING',
+                                     'message': f'日志写入过快，连续{INDEX_BUILD_ATTEMPTS}次建立索引都已过时，改为暂停写日志后建立'})
+                        self.index = self._read_index(list_backup_files(self.backup_dir) + [self.path],
+                                                      self.last_seq)
+        return self.index.search(**filters)
+
+    def _build_index(self):
+        """
+        读取所有历史日志建立索引。读取可能要几秒，期间不持有self._lock，
+        写日志照常进行，之后再补上期间新写入的日志
+        """
+        with self._lock:
+            self._load()
+            paths = list_backup_files(self.backup_dir) + [self.path]
+            last_seq = self.last_seq
+            rotations = self._rotations
+        index = self._read_index(paths, last_seq)
+        with self._lock:
+            # 期间发生轮转时当前文件可能没读到；新日志太多时内存中的也不全，重新读取
+            if self._rotations != rotations or (self.recent and self.recent[0]['seq'] > last_seq + 1):
+                return
+            for entry in self.recent:
+                if entry['seq'] > last_seq:
+                    index.add(entry)
+            self.index = index
+
+    def _read_index(self, paths, last_seq):
+        """
+        读取日志文件中序号不超过last_seq的日志建立索引
+
+        Returns:
+            LogIndex: 日志索引
+        """
+        index = LogIndex()
+        # 只有最新的max_logs条会留在索引中，先截取再加入，避免反复裁剪
+        entries = deque(maxlen=index.max_logs)
+        for path in paths:
+            for entry in read_log_file(path):
+                # 当前文件中在此之后写入的日志从内存中补上
+                seq = entry.get('seq')
+                if not isinstance(seq, int) or seq <= last_seq:
+                    entries.append(entry)
+        for entry in entries:
+            index.add(entry)
+        return index
+
+    def subscribe(self):
+        """
+        注册实时日志订阅者
+
+        Returns:
+            LogSubscriber: 订阅者
+        """
+        subscriber = LogSubscriber()
+        with self._lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+
+    def get_recent(self):
+        """
+        获取内存中的最近日志
+
+        Returns:
+            list: 日志列表
+        """
+        with self._lock:
+            self._load()
+            return list(self.recent)
+
+    def get_since(self, since):
+        """
+        获取序号大于since的日志，只遍历新增的部分
+
+        Args:
+            since: 客户端已有的最后一条日志序号
+
+        Returns:
+            tuple: (日志列表, 是否需要客户端重新加载全部日志)
+        """
+        with self._lock:
+            self._load()
+            # 序号比当前还大说明服务端重启过，较早的日志已不在缓冲区中
+            oldest = self.recent[0]['seq'] if self.recent else self.last_seq + 1
+            if since > self.last_seq or since < oldest - 1:
+                return list(self.recent), True
+            delta = []
+            for entry in reversed(self.recent):
+                if entry['seq'] <= since:
+                    break
+                delta.append(entry)
+            delta.reverse()
+            return delta, False
+
+    def clear(self):
+        """
+        把当前日志移入备份目录并清空内存中的日志
+        """
+        with self._lock:
+            self._load()
+            self._rotate()
+            self.recent.clear()
+            # 通知实时订阅者清空页面
+            for subscriber in self.subscribers:
+                subscriber.push({'reset': True})
+
+
+# 读取一个日志文件，兼容旧版JSON数组格式和新版JSONL格式
+def read_log_file(path):
+    """
+    读取日志文件中的所有日志，跳过损坏的行
+
+    Args:
+        path: 日志文件路径
+
+    Returns:
+        list: 日志列表
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                return json.load(f)
+            logs = []
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    logs.append(json.loads(line))
+                except ValueError:
+                    # 崩溃时可能留下写了一半的行
+                    continue
+            return logs
+    except (OSError, ValueError):
+        return []
+
+
+store = LogStore()
+
 # 初始化日志文件
 def init_log_file():
-    if not os.path.exists(LOG_FILE):
-        with open(LOG_FILE, 'w', encoding='utf-8') as f:
-            json.dump([], f, ensure_ascii=False, indent=2)
+    with store._lock:
+        store._load()
 
 # 添加日志到文件
-def add_log(level, message):
+def add_log(level, message, uid=None):
     """
     添加日志到文件
-    
+
     Args:
         level: 日志级别 (INFO, WARNING, ERROR)
         message: 日志消息
+        uid: 日志关联的用户ID，用于按用户检索
     """
-    # 初始化日志文件
-    init_log_file()
-    
     # 创建日志条目
     log_entry = {
         'time': time.strftime('%Y-%m-%d %H:%M:%S'),
         'level': level,
         'message': message
     }
-    
-    # 读取现有日志
-    try:
-        with open(LOG_FILE, 'r', encoding='utf-8') as f:
-            logs = json.load(f)
-    except:
-        logs = []
-    
-    # 添加新日志
-    logs.append(log_entry)
-    
-    # 限制日志数量，最多保存1000条
-    if len(logs) > 1000:
-        logs = logs[-1000:]
-    
-    # 写入日志文件
+    if uid:
+        log_entry['uid'] = str(uid)
     try:
-        with open(LOG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(logs, f, ensure_ascii=False, indent=2)
-    except:
+        store.append(log_entry)
+    except Exception:
         pass
 
 # 获取所有日志
 def get_all_logs():
     """
-    获取文件中的所有日志
-    
+    获取最近的日志（最多MAX_LOGS条）
+
     Returns:
         list: 日志列表
     """
-    # 初始化日志文件
-    init_log_file()
-    
-    # 读取日志文件
     try:
-        with open(LOG_FILE, 'r', encoding='utf-8') as f:
-            logs = json.load(f)
-    except:
-        logs = []
-    
-    return logs
+        return store.get_recent()
+    except Exception:
+        return []
 
 # 获取新增日志
-def get_new_logs():
+def get_new_logs(since=0):
     """
-    获取文件中的所有日志
-    
+    获取序号大于since的日志
+
+    Args:
+        since: 客户端已有的最后一条日志序号
+
     Returns:
-        list: 日志列表
+        tuple: (日志列表, 是否需要客户端重新加载全部日志, 当前最大序号)
     """
-    return get_all_logs()
+    try:
+        logs, reset = store.get_since(since)
+        return logs, reset, store.last_seq
+    except Exception:
+        return [], True, 0
+
+# 检索日志
+def search_logs(level=None, uid=None, start=None, end=None, query=None, limit=100, offset=0):
+    """
+    按级别、用户、时间范围和关键字检索日志（包括备份日志）
+
+    Returns:
+        dict: 包含logs（按时间从旧到新）和total
+    """
+    return store.search(level=level, uid=uid, start=start, end=end,
+                        query=query, limit=limit, offset=offset)
+
+# 订阅实时日志
+def subscribe_logs():
+    return store.subscribe()
+
+# 取消订阅实时日志
+def unsubscribe_logs(subscriber):
+    store.unsubscribe(subscriber)
 
 # 清空日志
 def clear_logs():
     """
-    清空日志文件
+    清空日志文件，原有日志移入备份目录
     """
     try:
-        # 将当前日志内容写入另一个文件
-        timestamp = time.strftime('%Y%m%d%H%M%S')
-        current_logs = get_all_logs()
-        with open(f'logs/backup/logs_backup_{timestamp}.json', 'w', encoding='utf-8') as f:
-            json.dump(current_logs, f, ensure_ascii=False, indent=2)
-        with open(LOG_FILE, 'w', encoding='utf-8') as f:
-            # 清空当前日志文件
-            json.dump([], f, ensure_ascii=False, indent=2)
-    except:
+        store.clear()
+    except Exception:
         pass
@@ -0,0 +1,250 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# 默认的耗时直方图桶边界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+# 转义Prometheus标签值
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+# 格式化标签
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + '}'
+
+# 格式化数值
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+# 指标基类，按标签值分别计数
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        """
+        初始化指标
+
+        Args:
+            name: 指标名称
+            help: 说明
+            labelnames: 标签名列表
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name}的标签应为{self.labelnames}，实际为{tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key):
+        return dict(zip(self.labelnames, key))
+
+
+# 只增不减的计数器
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self.values.items()]
+
+    def snapshot(self):
+        with self._lock:
+            return [{'labels': self._labels(key), 'value': value} for key, value in self.values.items()]
+
+
+# 累计直方图
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self.values.get(key)
+            if state is None:
+                # 各桶的计数（非累计）、总和、次数
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        统计with语句块的耗时，语句块抛出异常时同样记录
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, (counts, total, count) in self.values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    result.append((f'{self.name}_bucket', dict(labels, le=format_value(float(bound))), cumulative))
+                result.append((f'{self.name}_sum', labels, total))
+                result.append((f'{self.name}_count', labels, count))
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            return [{
+                'labels': self._labels(key),
+                'buckets': [bound if bound != float('inf') else '+Inf' for bound in self.buckets],
+                'counts': list(counts),
+                'sum': total,
+                'count': count,
+            } for key, (counts, total, count) in self.values.items()]
+
+
+# 指标注册表
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                # 模块重新导入时复用已有的指标
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collector):
+        """
+        注册在导出时才采集的指标，适合队列深度、缓存命中数等已有统计
+
+        Args:
+            collector: 无参函数，返回[(名称, 类型, 说明, [(标签dict, 值)])]
+        """
+        with self._lock:
+            if collector not in self.collectors:
+                self.collectors.append(collector)
+
+    def _collect(self):
+        with self._lock:
+            collectors = list(self.collectors)
+        result = []
+        for collector in collectors:
+            try:
+                result.extend(collector())
+            except Exception as e:
+                print(f'采集指标时出错：{e}')
+        return result
+
+    def render(self):
+        """
+        导出为Prometheus文本格式
+
+        Returns:
+            str: 指标文本
+        """
+        lines = []
+        with self._lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+        for name, metric_type, help, samples in self._collect():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, value in samples:
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """
+        导出为JSON友好的结构，供网页图表使用
+
+        Returns:
+            dict: 指标名称到类型和各标签取值的映射
+        """
+        with self._lock:
+            metrics = list(self.metrics.values())
+        result = {'time': time.time()}
+        for metric in metrics:
+            result[metric.name] = {'type': metric.type, 'values': metric.snapshot()}
+        for name, metric_type, help, samples in self._collect():
+            result[name] = {'type': metric_type,
+                            'values': [{'labels': labels, 'value': value} for labels, value in samples]}
+        return result
+
+
+registry = Registry()
+
+# 微博接口
+WEIBO_REQUEST_SECONDS = registry.histogram(
+    'weibo_request_seconds', '微博接口请求耗时（不含限速等待）', ['endpoint'])
+WEIBO_RESPONSES = registry.counter(
+    'weibo_responses_total', '微博接口响应数，status为HTTP状态码，请求异常时为error', ['endpoint', 'status'])
+# AI生成
+AI_GENERATION_SECONDS = registry.histogram(
+    'ai_generation_seconds', 'AI生成回复耗时（含重试和对冲），result为ok、cached或error', ['result'])
+AI_REQUESTS = registry.counter(
+    'ai_requests_total', '模型请求结果，outcome为ok、retry、failed或timeout', ['outcome'])
+# 爬虫
+CYCLE_SECONDS = registry.histogram(
+    'spider_cycle_seconds', '每轮检查所有到期用户的耗时')
+CHECKED_UIDS = registry.counter(
+    'spider_checked_uids_total', '已检查的用户次数')
+REPLY_SECONDS = registry.histogram(
+    'spider_reply_seconds', '从发现新微博到回复发布完成的耗时')
+REPLIES = registry.counter(
+    'spider_replies_total', '回复结果，result为posted、failed或skipped', ['result'])
+UID_ERRORS = registry.counter(
+    'spider_uid_errors_total', '按用户统计的错误数，stage为出错的环节', ['uid', 'stage'])
+
+
+# 以Prometheus文本格式导出所有指标
+def render():
+    return registry.render()
+
+# 导出所有指标的JSON快照
+def snapshot():
+    return registry.snapshot()
+
+# 注册导出时采集的指标
+def register_collector(collector):
+    registry.register_collector(collector)
@@ -0,0 +1,201 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+
+# 缓存目录
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Cache')
+# 数据库文件路径
+DB_FILE = os.path.join(CACHE_DIR, 'weibo_state.db')
+
+# 每个用户默认保留的已处理mid数量
+DEFAULT_RETENTION = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_mids (
+    uid TEXT NOT NULL,
+    mid INTEGER NOT NULL,
+    created_at TEXT,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (uid, mid)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS uid_state (
+    uid TEXT PRIMARY KEY,
+    nickname TEXT,
+    max_id INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+"""
+
+
+# 所有用户共用的已处理mid存储
+class MidStore:
+    def __init__(self, path=DB_FILE, retention=DEFAULT_RETENTION):
+        """
+        初始化存储，数据库不存在时自动创建
+
+        Args:
+            path: 数据库文件路径
+            retention: 每个用户保留的mid数量
+        """
+        self.path = path
+        self.retention = retention
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def get_max_id(self, uid):
+        """
+        获取用户已处理的最大mid
+
+        Args:
+            uid: 用户ID
+
+        Returns:
+            int: 最大mid，用户还没有发过帖子时为0，尚未初始化时返回None
+        """
+        with self._lock:
+            row = self.conn.execute('SELECT max_id FROM uid_state WHERE uid = ?', (str(uid),)).fetchone()
+        return row[0] if row else None
+
+    def is_seen(self, uid, mid):
+        """
+        判断mid是否已经处理过（走主键索引）
+        """
+        with self._lock:
+            row = self.conn.execute('SELECT 1 FROM seen_mids WHERE uid = ? AND mid = ?',
+                                    (str(uid), int(mid))).fetchone()
+        return row is not None
+
+    def add_mids(self, uid, mids, nickname=None, created_at=None, max_id=None):
+        """
+        记录已处理的mid并更新最大mid，在一个事务中完成
+
+        Args:
+            uid: 用户ID
+            mids: mid列表
+            nickname: 用户昵称
+            created_at: mid到创建时间的字典
+            max_id: 额外指定的最大mid（默认取mids中的最大值）
+        """
+        uid = str(uid)
+        mids = [int(mid) for mid in mids]
+        max_id = max(mids + [int(max_id or 0)], default=0)
+        created_at = created_at or {}
+        now = time.time()
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.executemany(
+                    'INSERT OR IGNORE INTO seen_mids (uid, mid, created_at, seen_at) VALUES (?, ?, ?, ?)',
+                    [(uid, mid, created_at.get(mid), now) for mid in mids])
+                self.conn.execute(
+                    'INSERT INTO uid_state (uid, nickname, max_id, updated_at) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT(uid) DO UPDATE SET '
+                    'max_id = MAX(max_id, excluded.max_id), '
+                    'nickname = COALESCE(excluded.nickname, nickname), '
+                    'updated_at = excluded.updated_at',
+                    (uid, nickname, max_id, now))
+                self._prune(uid)
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def max_ids(self):
+        """
+        获取所有用户已处理的最大mid
+
+        Returns:
+            dict: 用户ID到最大mid的映射
+        """
+        with self._lock:
+            rows = self.conn.execute('SELECT uid, max_id FROM uid_state WHERE max_id > 0').fetchall()
+        return dict(rows)
+
+    def recent_mids(self, uid, limit):
+        """
+        获取用户最新的limit个已处理mid
+
+        Returns:
+            list: mid列表，从新到旧
+        """
+        with self._lock:
+            rows = self.conn.execute('SELECT mid FROM seen_mids WHERE uid = ? ORDER BY mid DESC LIMIT ?',
+                                     (str(uid), int(limit))).fetchall()
+        return [row[0] for row in rows]
+
+    def _prune(self, uid):
+        """
+        只保留用户最新的retention个mid
+        """
+        self.conn.execute(
+            'DELETE FROM seen_mids WHERE uid = ? AND mid < ('
+            'SELECT mid FROM seen_mids WHERE uid = ? ORDER BY mid DESC LIMIT 1 OFFSET ?)',
+            (uid, uid, self.retention - 1))
+
+    def migrate_json_cache(self, cache_dir=CACHE_DIR, uids=()):
+        """
+        一次性迁移旧版的Cache/weibo_mid_<昵称><uid>.json文件，迁移后文件重命名为.migrated
+
+        Args:
+            cache_dir: 旧缓存目录
+            uids: 已配置的用户ID，用于从文件名中识别没有记录uid的文件
+
+        Returns:
+            int: 迁移的文件数
+        """
+        if not os.path.isdir(cache_dir):
+            return 0
+        migrated = 0
+        # 较长的uid优先匹配，避免一个uid是另一个的后缀时匹配错
+        uids = sorted((str(uid) for uid in uids), key=len, reverse=True)
+        for name in sorted(os.listdir(cache_dir)):
+            match = re.match(r'weibo_mid_(.*)\.json$', name)
+            if not match:
+                continue
+            path = os.path.join(cache_dir, name)
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            uid = data.get('uid')
+            if not uid:
+                uid = next((u for u in uids if match.group(1).endswith(u)), None)
+            if not uid:
+                continue
+            mids = data.get('mids') or []
+            if mids or data.get('max_id'):
+                self.add_mids(uid, mids, nickname=data.get('nickname'), max_id=data.get('max_id'))
+            os.replace(path, path + '.migrated')
+            migrated += 1
+        return migrated
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+store = None
+store_lock = threading.Lock()
+
+# 获取全局共享的mid存储
+def get_store():
+    """
+    获取全局共享的mid存储，首次调用时创建
+
+    Returns:
+        MidStore: mid存储
+    """
+    global store
+    if store is None:
+        with store_lock:
+            if store is None:
+                store = MidStore()
+    return store
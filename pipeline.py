@@ -0,0 +1,162 @@
+import time
+import queue
+import threading
+
+# 默认每个阶段的队列长度
+DEFAULT_QUEUE_SIZE = 100
+
+# 通知工作线程退出的标记
+STOP = object()
+
+
+# 流水线中的一个阶段：一个有界队列加若干工作线程
+class Stage:
+    def __init__(self, name, handler, workers=1, queue_size=DEFAULT_QUEUE_SIZE, on_error=None):
+        """
+        初始化阶段
+
+        Args:
+            name: 阶段名称
+            handler: 处理函数，接收任务并返回交给下一阶段的任务，返回None表示任务到此结束
+            workers: 工作线程数
+            queue_size: 队列长度，队列满时上游的put会阻塞（背压）
+            on_error: 处理出错时的回调，参数为(阶段名称, 任务, 异常)
+        """
+        self.name = name
+        self.handler = handler
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.on_error = on_error
+        self.next_stage = None
+        self.threads = []
+        self.workers = 0
+        self.busy = 0
+        self.processed = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self.resize(workers)
+
+    def resize(self, workers):
+        """
+        调整工作线程数，减少时通过队列发送退出标记，正在处理的任务会先完成
+        """
+        workers = max(1, int(workers))
+        with self._lock:
+            self.threads = [thread for thread in self.threads if thread.is_alive()]
+            for _ in range(workers - self.workers):
+                thread = threading.Thread(target=self._run, name=f'pipeline-{self.name}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            for _ in range(self.workers - workers):
+                self.queue.put(STOP)
+            self.workers = workers
+
+    def put(self, job, timeout=None):
+        """
+        提交任务，队列满时阻塞
+
+        Raises:
+            queue.Full: 超过timeout仍未能放入队列
+        """
+        self.queue.put(job, timeout=timeout)
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is STOP:
+                    return
+                with self._lock:
+                    self.busy += 1
+                try:
+                    result = self.handler(job)
+                    with self._lock:
+                        self.processed += 1
+                    if result is not None and self.next_stage is not None:
+                        self.next_stage.put(result)
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                    if self.on_error is not None:
+                        self.on_error(self.name, job, e)
+                finally:
+                    with self._lock:
+                        self.busy -= 1
+            finally:
+                self.queue.task_done()
+
+    def stats(self):
+        """
+        获取阶段的运行状态
+
+        Returns:
+            dict: 队列深度、工作线程数、忙碌线程数、已处理数、出错数
+        """
+        with self._lock:
+            return {
+                'depth': self.queue.qsize(),
+                'capacity': self.queue.maxsize,
+                'workers': self.workers,
+                'busy': self.busy,
+                'processed': self.processed,
+                'errors': self.errors,
+            }
+
+
+# 由多个阶段串联而成的流水线
+class Pipeline:
+    def __init__(self, stages):
+        """
+        初始化流水线
+
+        Args:
+            stages: 按顺序排列的阶段列表
+        """
+        self.stages = stages
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+
+    def submit(self, job, timeout=None):
+        """
+        向第一个阶段提交任务
+        """
+        self.stages[0].put(job, timeout=timeout)
+
+    def get_stage(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        return None
+
+    def join(self):
+        """
+        等待所有已提交的任务处理完成
+        """
+        for stage in self.stages:
+            stage.queue.join()
+
+    def drain(self, timeout=None):
+        """
+        等待所有已提交的任务处理完成，最多等待timeout秒，工作线程保持运行
+
+        Returns:
+            bool: 是否在超时前全部完成
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # 任务在上一阶段task_done之前已放入下一阶段，按顺序等待即可
+        for stage in self.stages:
+            with stage.queue.all_tasks_done:
+                while stage.queue.unfinished_tasks:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    stage.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stats(self):
+        """
+        获取各阶段的运行状态
+
+        Returns:
+            dict: 阶段名称到状态的映射
+        """
+        return {stage.name: stage.stats() for stage in self.stages}
@@ -0,0 +1,169 @@
+import os
+import time
+import sqlite3
+import threading
+
+# 缓存目录
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Cache')
+# 磁盘缓存数据库路径
+DB_FILE = os.path.join(CACHE_DIR, 'profiles.db')
+
+# 昵称的有效期（秒），过期后重新获取
+DEFAULT_TTL = 24 * 60 * 60
+# 获取失败的有效期（秒），期间不再请求该用户的资料
+DEFAULT_NEGATIVE_TTL = 10 * 60
+# 启动时预取昵称的默认并发数
+DEFAULT_PREFETCH_CONCURRENCY = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    uid TEXT PRIMARY KEY,
+    nickname TEXT,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+# 缓存的用户资料
+class ProfileEntry:
+    __slots__ = ('nickname', 'fetched_at', 'expires_at')
+
+    def __init__(self, nickname, fetched_at, expires_at):
+        # nickname为None表示获取失败
+        self.nickname = nickname
+        self.fetched_at = fetched_at
+        self.expires_at = expires_at
+
+    def expired(self, now=None):
+        return (time.time() if now is None else now) >= self.expires_at
+
+
+# 用户昵称缓存：内存 + 磁盘SQLite，重启后仍然有效
+class ProfileCache:
+    def __init__(self, path=DB_FILE, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL):
+        """
+        初始化缓存，首次查询时从磁盘载入所有条目
+
+        Args:
+            path: 磁盘缓存数据库路径
+            ttl: 昵称的有效期（秒）
+            negative_ttl: 获取失败的有效期（秒）
+        """
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = None
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.conn = None
+        self._lock = threading.Lock()
+
+    def configure(self, ttl=None, negative_ttl=None):
+        with self._lock:
+            if ttl is not None:
+                self.ttl = float(ttl)
+            if negative_ttl is not None:
+                self.negative_ttl = float(negative_ttl)
+
+    def _connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.executescript(SCHEMA)
+        return self.conn
+
+    def _load(self):
+        # 用户数通常只有几百个，全部载入内存
+        if self.entries is None:
+            rows = self._connect().execute('SELECT uid, nickname, fetched_at, expires_at FROM profiles')
+            self.entries = {uid: ProfileEntry(nickname, fetched_at, expires_at)
+                            for uid, nickname, fetched_at, expires_at in rows}
+        return self.entries
+
+    def get(self, uid):
+        """
+        查询缓存，过期的条目同样返回，由调用方决定是否刷新
+
+        Args:
+            uid: 用户ID
+
+        Returns:
+            ProfileEntry: 缓存的条目，没有时返回None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._load().get(str(uid))
+            if entry is None or entry.expired(now):
+                self.misses += 1
+            elif entry.nickname is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, uid, nickname, ttl=None):
+        """
+        写入获取结果
+
+        Args:
+            uid: 用户ID
+            nickname: 昵称，获取失败时为None
+            ttl: 有效期（秒），默认成功时为ttl，失败时为negative_ttl
+        """
+        now = time.time()
+        with self._lock:
+            if ttl is None:
+                ttl = self.ttl if nickname is not None else self.negative_ttl
+            entry = ProfileEntry(nickname, now, now + ttl)
+            self._load()[str(uid)] = entry
+            self._connect().execute(
+                'INSERT OR REPLACE INTO profiles (uid, nickname, fetched_at, expires_at) VALUES (?, ?, ?, ?)',
+                (str(uid), nickname, entry.fetched_at, entry.expires_at))
+
+    def discard_failures(self, uids):
+        """
+        删除这些用户获取失败的记录，下次使用时重新获取（如用户在网页上被重新启用）
+        """
+        with self._lock:
+            entries = self._load()
+            failed = [str(uid) for uid in uids if str(uid) in entries and entries[str(uid)].nickname is None]
+            for uid in failed:
+                del entries[uid]
+            if failed:
+                self._connect().executemany('DELETE FROM profiles WHERE uid = ?', [(uid,) for uid in failed])
+
+    def stale(self, uids):
+        """
+        筛选没有缓存或缓存已过期的用户
+
+        Returns:
+            list: 需要获取昵称的用户ID
+        """
+        now = time.time()
+        with self._lock:
+            entries = self._load()
+            return [uid for uid in uids if str(uid) not in entries or entries[str(uid)].expired(now)]
+
+    def stats(self):
+        """
+        获取命中统计
+
+        Returns:
+            dict: 命中、失败命中（负缓存）、未命中次数和条目数
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'entries': len(self.entries or {}),
+            }
+
+    def close(self):
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
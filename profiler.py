@@ -0,0 +1,324 @@
+import os
+import io
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import functools
+from collections import Counter
+
+# 分析结果保存目录
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Cache', 'profiles')
+# 最多保留的分析结果数
+MAX_RESULTS = 20
+# 单次分析的最长时间（秒），避免忘记停止
+MAX_DURATION = 600
+# 默认的采样间隔（秒）
+DEFAULT_SAMPLE_INTERVAL = 0.005
+# tracemalloc记录的调用栈深度
+TRACEMALLOC_FRAMES = 10
+# 爬虫相关线程的名称前缀，采样时只看这些线程，调用栈按线程名前缀分组
+SPIDER_THREAD_PREFIXES = ('spider', 'weibo-poll', 'profile-prefetch', 'pipeline-', 'ai-loop')
+
+# Python 3.12起cProfile基于sys.monitoring：同一时刻只能启用一个Profile，且它会记录所有线程，
+# 因此改为整个分析任务共用一个Profile
+SHARED_CPU_PROFILE = sys.version_info >= (3, 12)
+
+# 分析模式：cpu为cProfile，sample为统计采样，memory为tracemalloc
+MODES = ('cpu', 'sample', 'memory')
+
+
+# 一次分析任务
+class ProfileSession:
+    def __init__(self, mode, seconds=None, cycles=None, interval=DEFAULT_SAMPLE_INTERVAL):
+        """
+        初始化分析任务，seconds和cycles都未指定时最多运行MAX_DURATION秒
+
+        Args:
+            mode: 分析模式，见MODES
+            seconds: 运行的秒数
+            cycles: 运行的检查轮数
+            interval: 采样间隔（秒），仅sample模式使用
+        """
+        if mode not in MODES:
+            raise ValueError(f'未知的分析模式：{mode}')
+        self.id = time.strftime('%Y%m%d%H%M%S') + f'_{mode}'
+        self.mode = mode
+        self.seconds = min(float(seconds), MAX_DURATION) if seconds else None
+        self.cycles = int(cycles) if cycles else None
+        self.interval = max(0.001, float(interval))
+        self.started_at = time.time()
+        self.finished_at = None
+        self.cycles_done = 0
+        self.calls = 0
+        # 因其他分析器正在运行而没有记录的调用数
+        self.skipped = 0
+        self.samples = 0
+        # 整个任务共用的Profile（SHARED_CPU_PROFILE时）
+        self.profile = None
+        self.stats = None
+        self.stacks = Counter()
+        self.start_snapshot = None
+        self.owns_tracemalloc = False
+        self.done = threading.Event()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def run_call(self, func, args, kwargs):
+        if self.profile is not None:
+            # 共用的Profile已在记录所有线程，只统计调用次数
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.calls += 1
+        # cpu模式下用单独的Profile记录本次调用，结束后合并
+        if getattr(self._local, 'active', False):
+            # 外层调用已在记录
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 同一时刻已有其他分析器在运行，不记录本次调用，在结果中注明
+            with self._lock:
+                self.skipped += 1
+            return func(*args, **kwargs)
+        self._local.active = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            self._local.active = False
+            with self._lock:
+                self.calls += 1
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+
+    def sample_loop(self):
+        # 定期抓取爬虫线程的调用栈，汇总为flamegraph使用的折叠格式
+        own = threading.get_ident()
+        while not self.done.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, '')
+                if ident == own or not name.startswith(SPIDER_THREAD_PREFIXES):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                    frame = frame.f_back
+                # 同一线程池的线程合并为一行
+                stack.append(name.rstrip('0123456789_-'))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def status(self):
+        return {
+            'id': self.id,
+            'mode': self.mode,
+            'seconds': self.seconds,
+            'cycles': self.cycles,
+            'cycles_done': self.cycles_done,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'calls': self.calls,
+            'skipped': self.skipped,
+            'samples': self.samples,
+        }
+
+
+# 按需开启的分析器，未开启时不安装任何钩子
+class Profiler:
+    def __init__(self, result_dir=PROFILE_DIR):
+        self.result_dir = result_dir
+        self.session = None
+        self.results = []
+        self._timer = None
+        self._sampler = None
+        self._lock = threading.Lock()
+
+    def start(self, mode, seconds=None, cycles=None, interval=DEFAULT_SAMPLE_INTERVAL):
+        """
+        开始分析，到达指定秒数或检查轮数后自动停止并保存结果
+
+        Returns:
+            dict: 分析任务的状态
+
+        Raises:
+            RuntimeError: 已有分析任务在运行
+        """
+        with self._lock:
+            if self.session is not None:
+                raise RuntimeError('已有分析任务正在运行')
+            session = ProfileSession(mode, seconds, cycles, interval)
+            if session.seconds is None and session.cycles is None:
+                session.seconds = MAX_DURATION
+            if mode == 'memory':
+                # 进程启动时已开启tracemalloc（PYTHONTRACEMALLOC）的情况下，结束时不关闭
+                session.owns_tracemalloc = not tracemalloc.is_tracing()
+                if session.owns_tracemalloc:
+                    tracemalloc.start(TRACEMALLOC_FRAMES)
+                session.start_snapshot = tracemalloc.take_snapshot()
+            elif mode == 'cpu' and SHARED_CPU_PROFILE:
+                session.profile = cProfile.Profile()
+                try:
+                    session.profile.enable()
+                except ValueError:
+                    raise RuntimeError('已有其他分析工具正在运行，无法开始cpu分析')
+            elif mode == 'sample':
+                self._sampler = threading.Thread(target=session.sample_loop, name='profiler-sampler', daemon=True)
+                self._sampler.start()
+            # 按轮数运行时同样受MAX_DURATION限制
+            self._timer = threading.Timer(session.seconds or MAX_DURATION, self.stop)
+            self._timer.daemon = True
+            self._timer.start()
+            self.session = session
+            return session.status()
+
+    def stop(self):
+        """
+        停止当前分析并保存结果
+
+        Returns:
+            dict: 分析结果的状态，没有运行中的任务时返回None
+        """
+        with self._lock:
+            session = self.session
+            if session is None:
+                return None
+            self.session = None
+            session.done.set()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._sampler is not None:
+                self._sampler.join(timeout=5)
+                self._sampler = None
+            if session.profile is not None:
+                session.profile.disable()
+                if session.calls:
+                    session.stats = pstats.Stats(session.profile)
+            end_snapshot = None
+            if session.mode == 'memory':
+                end_snapshot = tracemalloc.take_snapshot()
+                if session.owns_tracemalloc:
+                    tracemalloc.stop()
+            session.finished_at = time.time()
+        result = session.status()
+        result['files'] = self._save(session, end_snapshot)
+        with self._lock:
+            self.results.append(result)
+            self._prune()
+        return result
+
+    def _save(self, session, end_snapshot):
+        os.makedirs(self.result_dir, exist_ok=True)
+        files = {}
+        base = os.path.join(self.result_dir, session.id)
+        if session.mode == 'cpu':
+            text = io.StringIO()
+            if session.profile is not None:
+                text.write('# 记录的是分析期间进程内所有线程的调用（Python 3.12起cProfile全局唯一）\n')
+            if session.skipped:
+                text.write(f'# 注意：有{session.skipped}次调用因其他分析器正在运行而没有记录，结果不完整\n')
+            if session.stats is not None:
+                session.stats.dump_stats(base + '.pstats')
+                files['pstats'] = base + '.pstats'
+                session.stats.stream = text
+                session.stats.sort_stats('cumulative').print_stats(50)
+            else:
+                text.write('分析期间没有执行任何检查或流水线任务\n')
+            files['txt'] = self._write(base + '.txt', text.getvalue())
+        elif session.mode == 'sample':
+            lines = [f'{stack} {count}' for stack, count in session.stacks.most_common()]
+            files['folded'] = self._write(base + '.folded', '\n'.join(lines) + '\n')
+        elif session.mode == 'memory':
+            end_snapshot.dump(base + '.snapshot')
+            files['snapshot'] = base + '.snapshot'
+            filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+            end_snapshot = end_snapshot.filter_traces(filters)
+            lines = ['# 分析期间内存增长最多的位置']
+            for stat in end_snapshot.compare_to(session.start_snapshot.filter_traces(filters), 'lineno')[:30]:
+                lines.append(str(stat))
+            lines.append('')
+            lines.append('# 结束时占用内存最多的位置')
+            for stat in end_snapshot.statistics('lineno')[:30]:
+                lines.append(str(stat))
+            files['txt'] = self._write(base + '.txt', '\n'.join(lines) + '\n')
+        return files
+
+    def _write(self, path, text):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def _prune(self):
+        while len(self.results) > MAX_RESULTS:
+            for path in self.results.pop(0)['files'].values():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def on_cycle_end(self):
+        """
+        每轮检查结束时调用，达到指定轮数后停止分析
+        """
+        session = self.session
+        if session is None or session.cycles is None:
+            return
+        session.cycles_done += 1
+        if session.cycles_done >= session.cycles:
+            self.stop()
+
+    def run(self, func, *args, **kwargs):
+        """
+        执行func，cpu模式分析期间记录其调用开销
+        """
+        session = self.session
+        if session is None or session.mode != 'cpu':
+            return func(*args, **kwargs)
+        return session.run_call(func, args, kwargs)
+
+    def status(self):
+        """
+        获取当前任务和已保存的结果
+
+        Returns:
+            dict: running为运行中的任务（没有时为None），results为已保存的结果
+        """
+        with self._lock:
+            session = self.session
+            return {
+                'running': session.status() if session is not None else None,
+                'results': list(reversed(self.results)),
+            }
+
+    def get_result_file(self, result_id, fmt):
+        """
+        获取结果文件路径
+
+        Returns:
+            str: 文件路径，不存在时返回None
+        """
+        with self._lock:
+            for result in self.results:
+                if result['id'] == result_id:
+                    return result['files'].get(fmt)
+        return None
+
+
+profiler = Profiler()
+
+# 包装函数，cpu分析期间记录调用开销，未开启时直接调用
+def profiled(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return profiler.run(func, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,128 @@
+import time
+import threading
+from urllib.parse import urlparse
+
+# 各类接口默认的限速：rate为每秒补充的令牌数，burst为桶容量
+DEFAULT_RATE_LIMITS = {
+    'timeline': {'rate': 2, 'burst': 10},
+    'profile': {'rate': 2, 'burst': 10},
+    'status_show': {'rate': 1, 'burst': 5},
+    'comment_create': {'rate': 0.2, 'burst': 2},
+}
+
+# 接口路径到接口类别的映射
+ENDPOINT_CLASSES = {
+    '/ajax/statuses/mymblog': 'timeline',
+    '/ajax/profile/info': 'profile',
+    '/ajax/statuses/show': 'status_show',
+    '/ajax/comments/create': 'comment_create',
+}
+
+
+# 获取请求对应的接口类别
+def classify(url):
+    """
+    根据请求地址判断接口类别
+
+    Args:
+        url: 请求地址
+
+    Returns:
+        tuple: (主机名, 接口类别)，未知接口的类别为None
+    """
+    parsed = urlparse(url)
+    return parsed.hostname, ENDPOINT_CLASSES.get(parsed.path)
+
+
+# 令牌桶
+class TokenBucket:
+    def __init__(self, rate, burst):
+        """
+        初始化令牌桶，初始时桶是满的
+
+        Args:
+            rate: 每秒补充的令牌数
+            burst: 桶容量，即允许的突发请求数
+        """
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        预定一个令牌
+
+        Returns:
+            float: 需要等待的秒数（0表示立即可用）
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            if self.tokens >= 0 or self.rate <= 0:
+                return 0.0
+            # 令牌可以为负，排在后面的请求依次顺延
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        """
+        获取一个令牌，不够时等待（不持有锁，不会阻塞其他桶）
+
+        Returns:
+            float: 实际等待的秒数
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+# 按主机和接口类别限速
+class RateLimiter:
+    def __init__(self, limits=None):
+        """
+        初始化限速器
+
+        Args:
+            limits: 限速配置，键为接口类别或主机名，值为{'rate': 每秒请求数, 'burst': 突发请求数}
+        """
+        self.limits = {}
+        self.buckets = {}
+        self._lock = threading.Lock()
+        self.configure(limits)
+
+    def configure(self, limits=None):
+        """
+        更新限速配置，与默认配置合并，只重建发生变化的令牌桶
+        """
+        merged = {key: dict(value) for key, value in DEFAULT_RATE_LIMITS.items()}
+        for key, value in (limits or {}).items():
+            merged[key] = dict(value)
+        with self._lock:
+            for key, value in merged.items():
+                if self.limits.get(key) != value:
+                    self.buckets[key] = TokenBucket(value.get('rate', 1), value.get('burst', 1))
+            for key in set(self.buckets) - set(merged):
+                del self.buckets[key]
+            self.limits = merged
+
+    def acquire(self, url):
+        """
+        请求前调用，超过限速时等待
+
+        Args:
+            url: 请求地址
+
+        Returns:
+            float: 等待的秒数
+        """
+        host, endpoint = classify(url)
+        waited = 0.0
+        for key in (host, endpoint):
+            bucket = self.buckets.get(key) if key else None
+            if bucket is not None:
+                waited += bucket.acquire()
+        return waited
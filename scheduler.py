@@ -0,0 +1,203 @@
+import time
+import heapq
+import threading
+from datetime import datetime
+
+# 默认最短和最长检查间隔（秒）
+DEFAULT_MIN_INTERVAL = 10
+DEFAULT_MAX_INTERVAL = 1800
+# 预期每个发帖间隔内检查的次数，越大发现新帖越快
+POLLS_PER_POST = 10
+# 每个用户保留的发帖时间条数
+HISTORY_SIZE = 50
+# 微博created_at的格式，例如 Sat Oct 18 15:00:00 +0800 2026
+CREATED_AT_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+
+
+# 解析微博的发帖时间
+def parse_created_at(created_at):
+    """
+    把微博的created_at转换为时间戳
+
+    Returns:
+        float: 时间戳，无法解析时返回None
+    """
+    try:
+        return datetime.strptime(created_at, CREATED_AT_FORMAT).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+# 单个用户的调度状态
+class UidSchedule:
+    def __init__(self, uid):
+        self.uid = uid
+        # mid到发帖时间戳
+        self.posts = {}
+        # 各小时的发帖数，用于按时段调整间隔
+        self.hourly = [0] * 24
+        self.interval = None
+        self.due_at = 0.0
+
+    def observe(self, mid, timestamp):
+        if mid in self.posts or timestamp is None:
+            return
+        self.posts[mid] = timestamp
+        self.hourly[time.localtime(timestamp).tm_hour] += 1
+        if len(self.posts) > HISTORY_SIZE:
+            oldest = min(self.posts, key=self.posts.get)
+            self.hourly[time.localtime(self.posts.pop(oldest)).tm_hour] -= 1
+
+    def compute_interval(self, now, min_interval, max_interval):
+        """
+        根据发帖频率和当前时段计算下次检查的间隔
+
+        Returns:
+            float: 间隔（秒）
+        """
+        times = sorted(self.posts.values())
+        if len(times) < 2:
+            # 没有足够的历史，按最短间隔检查
+            return min_interval
+        # 最近一次发帖到现在的时间也算作一个间隔，长期不发帖的账号间隔会逐渐变大
+        gaps = [b - a for a, b in zip(times, times[1:])] + [max(0.0, now - times[-1])]
+        mean_gap = sum(gaps) / len(gaps)
+        interval = mean_gap / POLLS_PER_POST
+        # 当前小时发帖越多，间隔越短
+        total = sum(self.hourly)
+        hour_weight = (self.hourly[time.localtime(now).tm_hour] + 1) / (total / 24 + 1)
+        interval /= hour_weight
+        return max(min_interval, min(max_interval, interval))
+
+
+# 按下次检查时间排序的用户调度器
+class PollScheduler:
+    def __init__(self, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL):
+        """
+        初始化调度器
+
+        Args:
+            min_interval: 最短检查间隔（秒）
+            max_interval: 最长检查间隔（秒）
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.schedules = {}
+        self.heap = []
+        self._lock = threading.Lock()
+
+    def configure(self, min_interval=None, max_interval=None):
+        with self._lock:
+            if min_interval is not None:
+                self.min_interval = float(min_interval)
+            if max_interval is not None:
+                self.max_interval = max(float(max_interval), self.min_interval)
+
+    def sync(self, uids):
+        """
+        同步启用的用户：新用户立即检查，已禁用的用户移出调度
+
+        Args:
+            uids: 启用的用户ID列表
+        """
+        with self._lock:
+            for uid in set(self.schedules) - set(uids):
+                # 堆中的旧条目在弹出时按due_at对不上而被丢弃
+                del self.schedules[uid]
+            now = time.time()
+            for uid in uids:
+                if uid not in self.schedules:
+                    schedule = UidSchedule(uid)
+                    schedule.due_at = now
+                    self.schedules[uid] = schedule
+                    heapq.heappush(self.heap, (now, uid))
+
+    def observe_posts(self, uid, posts):
+        """
+        记录从时间线看到的帖子，用于估计发帖频率
+
+        Args:
+            uid: 用户ID
+            posts: (mid, created_at)列表
+        """
+        with self._lock:
+            schedule = self.schedules.get(uid)
+            if schedule is None:
+                return
+            for mid, created_at in posts:
+                schedule.observe(mid, parse_created_at(created_at))
+
+    def pop_due(self, now=None):
+        """
+        取出所有到期的用户
+
+        Returns:
+            list: 到期的用户ID
+        """
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            while self.heap and self.heap[0][0] <= now:
+                due_at, uid = heapq.heappop(self.heap)
+                schedule = self.schedules.get(uid)
+                if schedule is not None and schedule.due_at == due_at:
+                    due.append(uid)
+        return due
+
+    def reschedule(self, uid, now=None):
+        """
+        用户检查完成后按自适应间隔安排下次检查
+
+        Returns:
+            float: 新的间隔（秒），用户已被移出调度时返回None
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            schedule = self.schedules.get(uid)
+            if schedule is None:
+                return None
+            schedule.interval = schedule.compute_interval(now, self.min_interval, self.max_interval)
+            schedule.due_at = now + schedule.interval
+            heapq.heappush(self.heap, (schedule.due_at, uid))
+            return schedule.interval
+
+    def requeue(self, uid, now=None):
+        """
+        把没有检查的用户放回队列，下次调度时立即检查（保留原有的间隔）
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            schedule = self.schedules.get(uid)
+            if schedule is None:
+                return
+            schedule.due_at = now
+            heapq.heappush(self.heap, (now, uid))
+
+    def seconds_until_next(self, now=None):
+        """
+        距离下一个用户到期的秒数，没有用户时返回None
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            while self.heap:
+                due_at, uid = self.heap[0]
+                schedule = self.schedules.get(uid)
+                if schedule is not None and schedule.due_at == due_at:
+                    return max(0.0, due_at - now)
+                heapq.heappop(self.heap)
+        return None
+
+    def get_intervals(self):
+        """
+        获取各用户当前的检查间隔
+        """
+        with self._lock:
+            return {uid: schedule.interval for uid, schedule in self.schedules.items()}
+
+    def needs_history(self, uid):
+        """
+        用户的发帖记录是否还不足以估计间隔，此时应读取整页时间线补充记录
+        """
+        with self._lock:
+            schedule = self.schedules.get(uid)
+            return schedule is not None and len(schedule.posts) < 2
@@ -0,0 +1,522 @@
+import os
+import sys
+import time
+import bisect
+import socket
+import hashlib
+import secrets
+import threading
+import subprocess
+from multiprocessing.connection import Listener, AuthenticationError
+import config_store
+import log_manager
+import metrics
+from log_manager import add_log
+from spider_runtime import DEFAULT_STOP_TIMEOUT
+
+# 协调器默认监听地址，其他主机上的工作进程需要连接时改为0.0.0.0并配置authkey
+DEFAULT_LISTEN = '127.0.0.1:18003'
+# 每个工作进程在哈希环上的虚拟节点数，越多分配越均匀
+DEFAULT_REPLICAS = 100
+# 工作进程的心跳间隔（秒），同时也是转发日志的间隔
+DEFAULT_HEARTBEAT = 2
+# 超过该时间（秒）没有心跳视为失联，失联进程持有的用户在同样长的时间后才重新分配
+DEFAULT_TIMEOUT = 15
+# 本机工作进程退出后重新启动前的等待时间（秒）
+RESPAWN_DELAY = 5
+# 停止时等待工作进程自行退出的时间（秒），工作进程会先处理完已发现的微博
+STOP_TIMEOUT = DEFAULT_STOP_TIMEOUT
+# 工作进程脚本
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spider_worker.py')
+# 用户换到其他进程时随最大mid一起转交的最近mid数量
+HANDOFF_MIDS = 20
+# 传给本机工作进程的认证密钥环境变量
+AUTHKEY_ENV = 'SPIDER_AUTHKEY'
+
+
+# 解析host:port格式的地址
+def parse_address(address):
+    host, _, port = str(address).rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+# 读取分片配置
+def get_worker_settings(config):
+    """
+    Args:
+        config: 配置，workers项包含processes、listen、authkey、heartbeat、timeout
+
+    Returns:
+        dict: 分片配置，processes为0表示不分片（爬虫在配置服务进程内运行）
+    """
+    settings = (config or {}).get('workers', {})
+    return {
+        'processes': max(0, int(settings.get('processes', 0))),
+        'listen': settings.get('listen', DEFAULT_LISTEN),
+        'authkey': settings.get('authkey') or os.getenv(AUTHKEY_ENV),
+        'heartbeat': float(settings.get('heartbeat', DEFAULT_HEARTBEAT)),
+        'timeout': float(settings.get('timeout', DEFAULT_TIMEOUT)),
+        'replicas': int(settings.get('replicas', DEFAULT_REPLICAS)),
+    }
+
+# 是否以分片模式运行
+def is_sharded(config):
+    return get_worker_settings(config)['processes'] > 0
+
+
+# 一致性哈希环：增减工作进程时只有约1/N的用户换到其他进程
+class HashRing:
+    def __init__(self, nodes=(), replicas=DEFAULT_REPLICAS):
+        """
+        Args:
+            nodes: 节点（工作进程ID）列表
+            replicas: 每个节点的虚拟节点数
+        """
+        self.replicas = replicas
+        self.keys = []
+        self.owners = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(hashlib.md5(str(key).encode('utf-8')).digest()[:8], 'big')
+
+    @property
+    def nodes(self):
+        return sorted(set(self.owners))
+
+    def add(self, node):
+        for i in range(self.replicas):
+            point = self.hash(f'{node}#{i}')
+            index = bisect.bisect(self.keys, point)
+            self.keys.insert(index, point)
+            self.owners.insert(index, node)
+
+    def remove(self, node):
+        kept = [(key, owner) for key, owner in zip(self.keys, self.owners) if owner != node]
+        self.keys = [key for key, _ in kept]
+        self.owners = [owner for _, owner in kept]
+
+    def owner(self, key):
+        """
+        获取key所属的节点，环为空时返回None
+        """
+        if not self.keys:
+            return None
+        index = bisect.bisect(self.keys, self.hash(key)) % len(self.keys)
+        return self.owners[index]
+
+    def assign(self, keys):
+        """
+        Returns:
+            dict: 节点到所属key列表的映射（保持keys中的顺序）
+        """
+        result = {node: [] for node in self.nodes}
+        for key in keys:
+            node = self.owner(key)
+            if node is not None:
+                result[node].append(key)
+        return result
+
+
+# 协调器看到的一个工作进程
+class WorkerInfo:
+    def __init__(self, worker_id, host, pid):
+        self.worker_id = worker_id
+        self.host = host
+        self.pid = pid
+        self.state = 'active'
+        self.connected_at = time.time()
+        self.last_seen = self.connected_at
+        self.lost_at = None
+        # 工作进程当前正在检查的用户，换到其他进程前必须先由它释放
+        self.held = set()
+        # 上次心跳回复中分配给它的用户
+        self.assigned = set()
+        self.health = {}
+
+    def status(self):
+        return {
+            'worker_id': self.worker_id,
+            'host': self.host,
+            'pid': self.pid,
+            'state': self.state,
+            'connected_at': self.connected_at,
+            'last_seen': self.last_seen,
+            'uids': len(self.held),
+            'health': self.health,
+        }
+
+
+# 本机启动的工作进程
+class LocalProcess:
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.popen = None
+        self.process = None
+        self.started_at = None
+        self.exited_at = None
+        self.restarts = 0
+
+    def alive(self):
+        return self.popen is not None and self.popen.poll() is None
+
+    def status(self):
+        result = {
+            'worker_id': self.worker_id,
+            'pid': self.popen.pid if self.popen is not None else None,
+            'alive': self.alive(),
+            'started_at': self.started_at,
+            'restarts': self.restarts,
+        }
+        if self.alive() and self.process is not None:
+            try:
+                result['rss'] = self.process.memory_info().rss
+                result['cpu_percent'] = self.process.cpu_percent(None)
+            except Exception:
+                pass
+        return result
+
+
+# 分片协调器：按一致性哈希把启用的用户分给各工作进程，收集心跳和日志
+class Coordinator:
+    def __init__(self):
+        self.settings = get_worker_settings({})
+        self.listener = None
+        self.address = None
+        self.authkey = None
+        self.workers = {}
+        self.processes = {}
+        self.ring = HashRing()
+        self.version = 0
+        self._assignment = {}
+        self._assignment_key = None
+        # 各用户最新的已处理状态（最大mid和最近的mid），由工作进程在心跳中上报。
+        # 不同主机上的工作进程各有自己的mid数据库，用户换到其他进程时先转交状态，
+        # 否则新进程会从它自己记录的旧位置开始翻页，重复回复已回复过的微博
+        self.uid_states = {}
+        self.stopping = threading.Event()
+        self._threads = []
+        self._lock = threading.RLock()
+
+    @property
+    def running(self):
+        return self.listener is not None
+
+    def start(self, config):
+        """
+        启动协调器和本机工作进程；已在运行时按新配置重启本机工作进程
+
+        Args:
+            config: 配置
+
+        Raises:
+            ValueError: 监听非本机地址但没有配置authkey
+        """
+        settings = get_worker_settings(config)
+        with self._lock:
+            restart = self.running
+            if restart:
+                self.settings = settings
+                processes = self._take_processes()
+        if restart:
+            # 等待旧进程退出时不能持有锁，否则处理不了它们的心跳
+            add_log('INFO', '正在重启本机爬虫工作进程')
+            self._stop_processes(processes)
+            with self._lock:
+                self._start_processes(settings['processes'])
+            return
+        with self._lock:
+            host, port = parse_address(settings['listen'])
+            authkey = settings['authkey']
+            if not authkey:
+                if host not in ('127.0.0.1', 'localhost', '::1'):
+                    raise ValueError('协调器监听非本机地址时必须配置workers.authkey')
+                authkey = secrets.token_hex(16)
+            self.settings = settings
+            self.authkey = authkey
+            self.listener = Listener((host, port), authkey=authkey.encode('utf-8'))
+            self.address = self.listener.address
+            self.ring = HashRing(replicas=settings['replicas'])
+            self.stopping.clear()
+            # 多个进程同时迁移旧缓存会互相冲突，在启动工作进程前迁移一次
+            from mid_store import get_store, CACHE_DIR
+            migrated = get_store().migrate_json_cache(CACHE_DIR, uids=(config or {}).get('uid', {}).keys())
+            if migrated:
+                add_log('INFO', f'已将{migrated}个旧版mid缓存文件迁移到数据库')
+            self._threads = [
+                threading.Thread(target=self._accept_loop, name='coordinator-accept', daemon=True),
+                threading.Thread(target=self._supervise_loop, name='coordinator-supervisor', daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._start_processes(settings['processes'])
+        add_log('INFO', f'分片协调器已启动：{self.address[0]}:{self.address[1]}，本机工作进程数：{settings["processes"]}')
+
+    def stop(self):
+        """
+        通知所有工作进程退出并关闭协调器
+        """
+        with self._lock:
+            if not self.running:
+                return
+            self.stopping.set()
+            processes = self._take_processes()
+        self._stop_processes(processes)
+        with self._lock:
+            listener, self.listener = self.listener, None
+        # accept()阻塞时关闭监听套接字无法唤醒它，连接一次让它返回
+        try:
+            socket.create_connection(self.address, timeout=1).close()
+        except OSError:
+            pass
+        listener.close()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        with self._lock:
+            self.workers.clear()
+            self.ring = HashRing()
+            self._assignment_key = None
+        add_log('INFO', '分片协调器已停止')
+
+    def _start_processes(self, count):
+        connect_host = self.address[0]
+        if connect_host in ('0.0.0.0', '::'):
+            connect_host = '127.0.0.1'
+        self._connect_address = f'{connect_host}:{self.address[1]}'
+        for index in range(count):
+            process = LocalProcess(f'{socket.gethostname()}-{index}')
+            self.processes[process.worker_id] = process
+            self._spawn(process)
+
+    def _spawn(self, process):
+        import psutil
+        env = dict(os.environ, **{AUTHKEY_ENV: self.authkey})
+        process.popen = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT, '--coordinator', self._connect_address,
+             '--worker-id', process.worker_id],
+            env=env, cwd=os.path.dirname(WORKER_SCRIPT))
+        process.process = psutil.Process(process.popen.pid)
+        process.started_at = time.time()
+        process.exited_at = None
+
+    def _take_processes(self):
+        # 取出本机进程并在心跳回复中通知它们退出
+        processes = list(self.processes.values())
+        for process in processes:
+            worker = self.workers.get(process.worker_id)
+            if worker is not None and worker.state == 'active':
+                worker.state = 'stopping'
+        self.processes.clear()
+        return processes
+
+    def _stop_processes(self, processes):
+        # 等待进程在下次心跳后自行退出，超时后终止
+        deadline = time.time() + STOP_TIMEOUT
+        for process in processes:
+            if process.popen is None:
+                continue
+            try:
+                process.popen.wait(timeout=max(0.1, deadline - time.time()))
+            except subprocess.TimeoutExpired:
+                add_log('WARNING', f'工作进程{process.worker_id}未按时退出，强制终止')
+                process.popen.terminate()
+                try:
+                    process.popen.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.popen.kill()
+                    process.popen.wait()
+
+    def _accept_loop(self):
+        while not self.stopping.is_set():
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, AuthenticationError) as e:
+                if self.stopping.is_set() or self.listener is None:
+                    return
+                add_log('WARNING', f'工作进程连接失败：{e}')
+                continue
+            threading.Thread(target=self._serve, args=(conn,), name='coordinator-conn', daemon=True).start()
+
+    def _serve(self, conn):
+        worker = None
+        try:
+            while True:
+                # 超过timeout没有心跳视为失联
+                if not conn.poll(self.settings['timeout']):
+                    add_log('WARNING', f'工作进程{worker.worker_id if worker else "未知"}心跳超时')
+                    break
+                message = conn.recv()
+                if worker is None:
+                    worker = self._register(message)
+                    if worker is None:
+                        conn.send({'stop': True, 'error': f'工作进程ID重复：{message.get("worker_id")}'})
+                        break
+                conn.send(self._handle(worker, message))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            if worker is not None:
+                self._lose(worker)
+
+    def _register(self, message):
+        worker_id = str(message.get('worker_id'))
+        with self._lock:
+            existing = self.workers.get(worker_id)
+            if existing is not None and existing.state in ('active', 'stopping'):
+                return None
+            worker = WorkerInfo(worker_id, message.get('host'), message.get('pid'))
+            if existing is not None:
+                # 重新连接的进程可能仍在检查失联前的用户
+                worker.held = existing.held
+            self.workers[worker_id] = worker
+            self.ring.add(worker_id)
+        add_log('INFO', f'工作进程{worker_id}已连接（{worker.host}，pid {worker.pid}）')
+        return worker
+
+    def _lose(self, worker):
+        with self._lock:
+            if self.workers.get(worker.worker_id) is not worker:
+                return
+            if worker.state == 'active':
+                add_log('WARNING', f'工作进程{worker.worker_id}已断开，{self.settings["timeout"]:.0f}秒后重新分配它的用户')
+            worker.state = 'lost'
+            worker.lost_at = time.time()
+            self.ring.remove(worker.worker_id)
+
+    def _handle(self, worker, message):
+        # 工作进程转发的日志写入本进程的日志存储，网页上照常显示
+        for entry in message.get('logs', []):
+            entry['worker'] = worker.worker_id
+            try:
+                log_manager.store.append(entry)
+            except Exception:
+                pass
+        updates = message.get('config_updates', [])
+        if updates:
+            def apply(config):
+                for uid, enabled in updates:
+                    config.setdefault('uid', {})[uid] = enabled
+            config_store.update_config(apply)
+        with self._lock:
+            worker.last_seen = time.time()
+            # 先合并状态再更新持有的用户：释放用户的那次心跳已带上它最后的状态
+            self._merge_states(message.get('states', {}))
+            worker.held = set(message.get('held', []))
+            worker.health = message.get('health', {})
+            stop = self.stopping.is_set() or worker.state == 'stopping'
+            uids = [] if stop else self._uids_for(worker.worker_id)
+            # 新分配给它的用户附带最新状态，工作进程写入本地数据库后才开始检查
+            states = {uid: self.uid_states[uid] for uid in uids
+                      if uid not in worker.assigned and uid in self.uid_states}
+            worker.assigned = set(uids)
+            return {
+                'uids': uids,
+                'states': states,
+                'version': self.version,
+                'heartbeat': self.settings['heartbeat'],
+                'stop': stop,
+            }
+
+    def _merge_states(self, states):
+        # 最大mid只增不减，最近的mid取并集
+        for uid, state in states.items():
+            current = self.uid_states.get(uid)
+            if current is None:
+                self.uid_states[uid] = {'max_id': state['max_id'], 'mids': list(state['mids'])[:HANDOFF_MIDS]}
+                continue
+            mids = sorted(set(current['mids']) | set(state['mids']), reverse=True)[:HANDOFF_MIDS]
+            self.uid_states[uid] = {'max_id': max(current['max_id'], state['max_id']), 'mids': mids}
+
+    def _uids_for(self, worker_id):
+        # 启用的用户或工作进程变化时重新分配
+        config = config_store.get_config() or {}
+        uids = tuple(uid for uid, enabled in config.get('uid', {}).items() if enabled == '1')
+        key = (uids, tuple(self.ring.nodes))
+        if key != self._assignment_key:
+            self._assignment = self.ring.assign(uids)
+            self._assignment_key = key
+            self.version += 1
+            counts = '，'.join(f'{node}={len(owned)}' for node, owned in self._assignment.items())
+            add_log('INFO', f'重新分配用户（第{self.version}版）：{counts or "没有在线的工作进程"}')
+        # 其他进程正在检查的用户，以及刚分配给它、下一轮就会检查的用户（失联的进程在超时前同样算），
+        # 等它释放后再分配，避免两个进程同时回复同一条微博
+        taken = set()
+        for other in self.workers.values():
+            if other.worker_id != worker_id:
+                taken |= other.held | other.assigned
+        return [uid for uid in self._assignment.get(worker_id, []) if uid not in taken]
+
+    def _supervise_loop(self):
+        while not self.stopping.wait(1):
+            now = time.time()
+            with self._lock:
+                # 失联超过timeout的进程视为已停止检查，释放它持有的用户
+                for worker_id, worker in list(self.workers.items()):
+                    if worker.state == 'lost' and now - worker.lost_at >= self.settings['timeout']:
+                        del self.workers[worker_id]
+                for process in list(self.processes.values()):
+                    self._check_process(process, now)
+
+    def _check_process(self, process, now):
+        if process.alive():
+            worker = self.workers.get(process.worker_id)
+            if (worker is not None and worker.state == 'lost'
+                    and now - worker.lost_at >= self.settings['timeout']):
+                # 进程还在但已失联（如卡死），结束后由下面的逻辑重新启动
+                add_log('WARNING', f'工作进程{process.worker_id}失联，终止进程')
+                try:
+                    process.process.kill()
+                except Exception:
+                    pass
+            return
+        if process.exited_at is None:
+            process.exited_at = now
+            add_log('WARNING', f'工作进程{process.worker_id}已退出，退出码：{process.popen.returncode}')
+        elif now - process.exited_at >= RESPAWN_DELAY:
+            process.restarts += 1
+            add_log('INFO', f'重新启动工作进程{process.worker_id}（第{process.restarts}次）')
+            self._spawn(process)
+
+    def status(self):
+        """
+        获取协调器、各工作进程和本机进程的状态
+
+        Returns:
+            dict: running、address、version、workers、processes
+        """
+        with self._lock:
+            return {
+                'running': self.running,
+                'address': f'{self.address[0]}:{self.address[1]}' if self.running else None,
+                'version': self.version,
+                'workers': [worker.status() for worker in self.workers.values()],
+                'processes': [process.status() for process in self.processes.values()],
+            }
+
+
+coordinator = Coordinator()
+
+# 导出工作进程状态指标
+def collect_metrics():
+    if not coordinator.running:
+        return []
+    status = coordinator.status()
+    states = {}
+    for worker in status['workers']:
+        states[worker['state']] = states.get(worker['state'], 0) + 1
+    return [
+        ('spider_workers', 'gauge', '工作进程数，state为active、lost或stopping',
+         [({'state': state}, count) for state, count in states.items()]),
+        ('spider_worker_uids', 'gauge', '各工作进程正在检查的用户数',
+         [({'worker': worker['worker_id']}, worker['uids']) for worker in status['workers']]),
+        ('spider_worker_checked_uids_total', 'counter', '各工作进程已检查的用户次数',
+         [({'worker': worker['worker_id']}, worker['health'].get('checked', 0)) for worker in status['workers']]),
+        ('spider_worker_rss_bytes', 'gauge', '各工作进程的常驻内存',
+         [({'worker': worker['worker_id']}, worker['health'].get('rss', 0)) for worker in status['workers']]),
+        ('spider_worker_restarts_total', 'counter', '本机工作进程的重启次数',
+         [({'worker': process['worker_id']}, process['restarts']) for process in status['processes']]),
+    ]
+
+metrics.register_collector(collect_metrics)
@@ -1,142 +1,244 @@
-from time import sleep
 import time
-import requests
 import json
 import os
-from ai_utils import generate_response
-import json, requests, re
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ai_utils import generate_response, GenerationError
 from log_manager import add_log
+from weibo_client import get_client, DEFAULT_POOL_SIZE
+import config_store
+from mid_store import get_store as get_mid_store, CACHE_DIR, DEFAULT_RETENTION
+from scheduler import PollScheduler, DEFAULT_MIN_INTERVAL, DEFAULT_MAX_INTERVAL
+from timeline_parser import read_timeline
+from profile_cache import ProfileCache, DEFAULT_PREFETCH_CONCURRENCY
+from pipeline import Pipeline, Stage, DEFAULT_QUEUE_SIZE
+import metrics
+from profiler import profiler, profiled
+from metrics import CYCLE_SECONDS, CHECKED_UIDS, REPLY_SECONDS, REPLIES, UID_ERRORS
+
+# 微博接口地址，压测时可通过WEIBO_BASE_URL环境变量指向本地替身服务
+WEIBO_BASE_URL = os.getenv('WEIBO_BASE_URL', 'https://weibo.com').rstrip('/')
+# 默认并发检查的用户数
+DEFAULT_CONCURRENCY = 5
+# 调度循环单次最长休眠时间（秒）
+MAX_IDLE = 5
+# 每次检查最多处理的新微博数，停机较久后恢复时更早的帖子不再回复
+DEFAULT_MAX_BACKLOG = 20
+# 时间线每页的帖子数，用于估算最多需要翻的页数
+TIMELINE_PAGE_SIZE = 20
+# 流水线各阶段默认的工作线程数
+DEFAULT_PIPELINE_WORKERS = {'content': 2, 'generate': 4, 'post': 1}
+# 停止时等待流水线处理完已发现的微博的最长时间（秒）
+DEFAULT_DRAIN_TIMEOUT = 60
 
 
 def get_header():
-    # 使用os.path.dirname(__file__)获取脚本所在目录
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    cookie_file_path = os.path.join(script_dir, 'Config', 'weibo_cookie.json')
-    with open(cookie_file_path,'r') as f:
-        header=json.loads(f.read())
-        cookie = header['Cookie']
-        header["x-xsrf-token"] = re.findall(r'XSRF-TOKEN=([^;]+)', cookie)[0]
-        # 加上Referer
-        header['referer']='https://weibo.com/'
-    return header
-
-cache = {}
-# 获取用户的昵称
-def get_name(uid):
-    # 从缓存中获取昵称
-    if uid in cache:
-        return cache[uid]
+    # 请求头由共享客户端缓存，cookie文件变化时才重新解析
+    return get_client().get_header()
+
+# 用户昵称缓存，重启后仍然有效
+profile_cache = ProfileCache()
+# 每次检查最多处理的新微博数，由配置max_backlog调整
+max_backlog = DEFAULT_MAX_BACKLOG
+# 按用户发帖频率安排检查时间
+scheduler = PollScheduler()
+# 分片模式下的工作进程代理（见spider_worker.py），单进程运行时为None
+shard = None
+# 保证同一进程内只有一个调度循环在运行
+main_lock = threading.Lock()
+
+# 请求用户的昵称
+def fetch_name(uid):
+    """
+    Returns:
+        str: 昵称，获取失败或为空时返回None
+    """
     try:
-        url = f"https://weibo.com/ajax/profile/info?custom={uid}"
-        resp = requests.get(url=url,headers=get_header())
+        url = f"{WEIBO_BASE_URL}/ajax/profile/info?custom={uid}"
+        resp = get_client().get(url)
         if resp.status_code != 200:
-            add_log('ERROR',f'获取用户{uid}的昵称时出错，状态码：{resp.status_code}，检查cookie是否过期')
+            UID_ERRORS.inc(uid=uid, stage='profile')
+            add_log('ERROR',f'获取用户{uid}的昵称时出错，状态码：{resp.status_code}，检查cookie是否过期',uid=uid)
             print(f'获取用户{uid}的昵称时出错，状态码：{resp.status_code}，检查cookie是否过期')
-            name = uid
-            return name
+            return None
         name = json.loads(resp.content.decode('utf-8'))['data']['user']['screen_name']
         print(f'获取用户{uid}的昵称：{name}')
     except:
+        UID_ERRORS.inc(uid=uid, stage='profile')
         print(f'获取用户{uid}的昵称时出错')
-        name = uid
+        return None
     if name == '':
         print(f'获取用户{uid}的昵称时为空')
-        name = uid
-    # 缓存昵称
-    cache[uid] = name
+        return None
     return name
 
+# 获取用户的昵称
+def get_name(uid):
+    """
+    优先使用缓存，过期后重新获取；获取失败的结果缓存negative_ttl秒，期间不再请求
+
+    Returns:
+        str: 昵称，获取失败时返回uid
+    """
+    entry = profile_cache.get(uid)
+    if entry is not None and not entry.expired():
+        return entry.nickname or uid
+    name = fetch_name(uid)
+    if name is None and entry is not None and entry.nickname:
+        # 刷新失败时沿用旧昵称，稍后再试
+        profile_cache.put(uid, entry.nickname, ttl=profile_cache.negative_ttl)
+        return entry.nickname
+    profile_cache.put(uid, name)
+    return name or uid
+
+# 并发获取多个用户的昵称
+def prefetch_names(uids, concurrency=DEFAULT_PREFETCH_CONCURRENCY):
+    """
+    启动时预取没有缓存或缓存已过期的昵称，避免第一轮检查逐个阻塞在资料请求上
+
+    Args:
+        uids: 用户ID列表
+        concurrency: 最大并发数
+
+    Returns:
+        int: 请求的用户数
+    """
+    stale = profile_cache.stale(uids)
+    if stale:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(stale)),
+                                thread_name_prefix='profile-prefetch') as executor:
+            list(executor.map(get_name, stale))
+    return len(stale)
+
 
 # 初始化已有的mid
 def get_mids(uid):
-    # 使用os.path.dirname(__file__)获取脚本所在目录
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    cache_dir = os.path.join(script_dir, 'Cache')
-    file_path = os.path.join(cache_dir, f'weibo_mid_{get_name(uid)}{uid}.json')
-    if not os.path.exists(file_path):
-        # 创建空的JSON文件
-        with open(file_path,'w') as f:
-            json.dump({'mids':[],'max_id':0},f,ensure_ascii=False,indent=2)
-            
+    """
+    确保用户的已处理mid已初始化，首次检查时把第一页的帖子全部记为已处理
+
+    Args:
+        uid: 用户ID
+
+    Returns:
+        int: 已处理的最大mid，初始化失败时返回None
+    """
+    store = get_mid_store()
+    max_id = store.get_max_id(uid)
+    if max_id is not None:
+        return max_id
+
+    add_log('INFO',f'初始化mid，uid：{uid}，昵称：{get_name(uid)}',uid=uid)
+    print(f'初始化mid，uid：{uid}，昵称：{get_name(uid)}')
+    url = f'{WEIBO_BASE_URL}/ajax/statuses/mymblog?uid={uid}&page=1&feature=0'
     try:
-        with open(file_path,'r') as f:
-            mids_dict = json.load(f)
-            mids = mids_dict['mids']
+        list = read_timeline(get_client().get(url).content, fields=('id',))
     except:
-        mids_dict = {'nickname':get_name(uid),
-                    'uid':uid,'mids':[],'max_id':0}
-    if len(mids) == 0:
-        add_log('INFO',f'初始化mid，uid：{uid}，昵称：{get_name(uid)}')
-        print(f'初始化mid，uid：{uid}，昵称：{get_name(uid)}')
-        url = f'https://weibo.com/ajax/statuses/mymblog?uid={uid}&page=1&feature=0'
-        try:
-            resp = json.loads(requests.get(url=url,headers=get_header()).content.decode('utf-8'))
-        except:
-            add_log('ERROR',f'初始化mid时出错，uid：{uid}，昵称：{get_name(uid)}')
-            print(f'初始化mid时出错，uid：{uid}，昵称：{get_name(uid)}')
-            reset_uid(uid,'0')
-            return mids_dict
-        list = resp['data']['list']
-        for item in list:
-            sleep(1)
-            mid = item['id']
-            mids.append(mid)
-        
-        mids_dict = {'nickname':get_name(uid),
-                    'uid':uid,
-                    "mids": mids,
-                    'max_id': mid}
-        add_log('INFO',f'初始化mid完成，最新帖子mid：{mids_dict["max_id"]}')
-        with open(file_path,'w') as f:
-            json.dump(mids_dict,f,ensure_ascii=False,indent=2)
-    else:
-        add_log('INFO',f'{get_name(uid)}已存在数据')
-    return mids_dict
+        UID_ERRORS.inc(uid=uid, stage='init')
+        add_log('ERROR',f'初始化mid时出错，uid：{uid}，昵称：{get_name(uid)}',uid=uid)
+        print(f'初始化mid时出错，uid：{uid}，昵称：{get_name(uid)}')
+        reset_uid(uid,'0')
+        return None
+    mids = []
+    for item in list:
+        mids.append(item['id'])
+
+    store.add_mids(uid, mids, nickname=get_name(uid))
+    max_id = store.get_max_id(uid)
+    add_log('INFO',f'初始化mid完成，最新帖子mid：{max_id}',uid=uid)
+    return max_id
+
+# 获取一页时间线，读到已处理的帖子即停止解码
+def get_timeline_page(uid, page, stop_at):
+    url = f'{WEIBO_BASE_URL}/ajax/statuses/mymblog?uid={uid}&page={page}&feature=0'
+    return read_timeline(get_client().get(url).content, stop_at)
 
-# 获取最新的mid
-def get_new_mid(uid):
-    file_path = './Cache/weibo_mid_'+get_name(uid)+uid+'.json'
-    mids_dict = get_mids(uid)
-    mids = mids_dict['mids']
-    max_id = mids_dict['max_id']
+# 获取上次检查以来的所有新mid
+def get_new_mids(uid):
+    """
+    从第一页开始翻页，直到读到已处理的最大mid，返回期间的所有新帖子。
+    新帖子超过max_backlog条时只处理最新的max_backlog条，更早的记为已跳过。
+    最多翻ceil(max_backlog / TIMELINE_PAGE_SIZE) + 1页，某页没有新帖子时也停止
 
-    url = f'https://weibo.com/ajax/statuses/mymblog?uid={uid}&page=1&feature=0'
+    Args:
+        uid: 用户ID
+
+    Returns:
+        list: 新的mid，按发帖顺序从旧到新；初始化或读取第一页失败时返回None
+    """
+    store = get_mid_store()
+    max_id = get_mids(uid)
+    if max_id is None:
+        return None
+
+    # 调度器还没有该用户的发帖记录时读取整页
+    stop_at = None if scheduler.needs_history(uid) else max_id
     try:
-        resp = json.loads(requests.get(url=url,headers=get_header()).content.decode('utf-8'))
+        list = get_timeline_page(uid, 1, stop_at)
+    except KeyError:
+        # 响应中没有data或list，与其他处理错误一样交给上层记录
+        raise
     except:
-        add_log('ERROR',f'初始化mid时出错，uid：{uid}，昵称：{get_name(uid)}')
+        UID_ERRORS.inc(uid=uid, stage='timeline')
+        add_log('ERROR',f'初始化mid时出错，uid：{uid}，昵称：{get_name(uid)}',uid=uid)
         reset_uid(uid,'0')
         return None
-    list = resp['data']['list']
-    add_log('INFO',f'正在检索是否有更新，uid：{uid}，昵称：{get_name(uid)}，当前时间：{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())}')
-    # 只检查最新的5条微博即可
-    for item in list[:5]:
-        sleep(1)
-        mid = item['id']
-        if mid not in mids and mid > max_id:
-            create_time = item['created_at']
-            add_log('INFO',f'发现新的mid：{mid},创建时间：{create_time}')
-            print(f'发现新的mid：{mid},创建时间：{create_time}')
-            mids_dict['mids'].append(mid)
-            
-            with open(file_path,'w') as f:
-                mids_dict = {'nickname':get_name(uid),
-                            'uid':uid,
-                            "mids": mids,
-                            'max_id': mid}
-                json.dump(mids_dict,f,ensure_ascii=False,indent=2)
-            add_log('INFO',f'更新mid完成，最新帖子mid：{mids_dict["max_id"]}，当前时间：{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())}')
-            
-            return mid
-    else:
-        add_log('INFO',f'没有新的微博内容，uid：{uid}，昵称：{get_name(uid)}，当前时间：{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())}')
-    
+    # 记录时间线上的发帖时间，用于调整该用户的检查间隔（置顶帖不代表发帖频率）
+    scheduler.observe_posts(uid, [(item['id'], item.get('created_at')) for item in list if not item.get('isTop')])
+    add_log('INFO',f'正在检索是否有更新，uid：{uid}，昵称：{get_name(uid)}，当前时间：{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())}',uid=uid)
+
+    # mid到创建时间，按页面顺序（从新到旧）
+    new = {}
+    page = 1
+    max_pages = math.ceil(max_backlog / TIMELINE_PAGE_SIZE) + 1
+    while True:
+        reached = False
+        found = len(new)
+        for item in list:
+            mid = item['id']
+            if mid <= max_id:
+                # 置顶帖可能是旧帖，只有普通帖子说明已读到上次的位置
+                if not item.get('isTop'):
+                    reached = True
+                    break
+                continue
+            if mid not in new and not store.is_seen(uid, mid):
+                new[mid] = item.get('created_at')
+        if reached or not list or len(new) >= max_backlog:
+            break
+        # 接口忽略page参数、反复返回同一页时不会读到上次的位置
+        if len(new) == found or page >= max_pages:
+            add_log('WARNING',f'翻到第{page}页仍未读到上次处理的位置，停止翻页',uid=uid)
+            break
+        page += 1
+        try:
+            list = get_timeline_page(uid, page, max_id)
+        except Exception as e:
+            # 已读到的新帖子照常处理，更早的帖子无法获取
+            UID_ERRORS.inc(uid=uid, stage='timeline')
+            add_log('ERROR',f'获取第{page}页时间线时出错，更早的新微博将被跳过：{str(e)}',uid=uid)
+            break
+
+    if not new:
+        add_log('INFO',f'没有新的微博内容，uid：{uid}，昵称：{get_name(uid)}，当前时间：{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())}',uid=uid)
+        return []
+    mids = sorted(new, reverse=True)
+    if len(mids) > max_backlog:
+        add_log('WARNING',f'新微博共{len(mids)}条，超过上限{max_backlog}条，只处理最新的{max_backlog}条',uid=uid)
+        mids = mids[:max_backlog]
+    for mid in reversed(mids):
+        add_log('INFO',f'发现新的mid：{mid},创建时间：{new[mid]}',uid=uid)
+        print(f'发现新的mid：{mid},创建时间：{new[mid]}')
+    # 最大mid更新为最新的帖子，超出上限的更早帖子之后不再处理
+    store.add_mids(uid, mids, nickname=get_name(uid), created_at=new)
+    add_log('INFO',f'更新mid完成，共{len(mids)}条新微博（翻页{page}页），最新帖子mid：{mids[0]}，当前时间：{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())}',uid=uid)
+    return mids[::-1]
 
 
 # 通过mid获取帖子的内容
 def get_context(mid):
-    url = f'https://weibo.com/ajax/statuses/show?id={mid}&locale=zh-CN&isGetLongText=true'
-    resp = json.loads(requests.get(url=url,headers=get_header()).content.decode('utf-8'))
+    url = f'{WEIBO_BASE_URL}/ajax/statuses/show?id={mid}&locale=zh-CN&isGetLongText=true'
+    resp = json.loads(get_client().get(url).content.decode('utf-8'))
     text_raw = resp['text_raw']
     return text_raw
 
@@ -149,10 +251,10 @@ def generate_weibo_response(mid):
     add_log('INFO',f'AI生成的回复：{ai_response}')
     return ai_response
 
-def post_response(mid, comment=''):
+def post_response(mid, comment='', nickname=''):
 
     add_log('INFO',f'正在回复{nickname}：{mid}')
-    url = f'https://weibo.com/ajax/comments/create'
+    url = f'{WEIBO_BASE_URL}/ajax/comments/create'
     # 如果没有提供comment，则调用AI生成回复
     if not comment:
         comment = generate_weibo_response(mid)
@@ -166,86 +268,306 @@ def post_response(mid, comment=''):
     }
     try:
         print(data)
-        response = requests.post(url=url, headers=get_header(), data=data)
+        response = get_client().post(url, data=data)
         print(f'请求状态码：{response.status_code}')
         # print(f'响应内容：{response.content.decode("utf-8")}')
         resp = json.loads(response.content.decode('utf-8'))
         if resp.get('ok') == 1:
             add_log('INFO',f'成功回复mid：{mid}')
+            return True
         else:
             add_log('ERROR',f'回复mid：{mid}失败，错误信息：{resp.get("msg", "未知错误")}')
     except Exception as e:
         add_log('ERROR',f'回复mid：{mid}时发生错误：{str(e)}')
+    return False
 
 def get_config():
-    add_log('INFO',f"当前工作目录：{os.getcwd()}")
-    try:
-        # 使用os.path.dirname(__file__)获取脚本所在目录
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        config_path = os.path.join(script_dir, 'Config', 'config.json')
-        abs_path = os.path.abspath(config_path)
-        add_log('INFO',f"配置文件绝对路径：{abs_path}")
-        with open(config_path,'r', encoding='utf-8') as f:
-            config = json.load(f)   
-        return config
-    except Exception as e:
-        add_log('ERROR',f'读取配置文件时发生错误：{str(e)}')
-        return None
+    # 配置常驻内存，仅在文件变化或网页保存时重新加载
+    config = config_store.get_config()
+    if config is None:
+        add_log('ERROR',f'读取配置文件时发生错误：{config_store.CONFIG_FILE}')
+    return config
 
 def reset_uid(uid,enabled):
-    config = get_config()
-    config['uid'][uid] = enabled
-    save_config(config)
+    if shard is not None:
+        # 分片模式下由协调器修改配置，避免多个进程同时写配置文件
+        shard.set_enabled(uid, enabled)
+        return
+    def set_enabled(config):
+        config.setdefault('uid', {})[uid] = enabled
+    config_store.update_config(set_enabled)
     
 def save_config(config):
-    # 使用os.path.dirname(__file__)获取脚本所在目录
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    config_path = os.path.join(script_dir, 'Config', 'config.json')
-    with open(config_path,'w', encoding='utf-8') as f:
-        json.dump(config,f,ensure_ascii=False,indent=2)
+    config_store.save_config(config)
 
 
-def main():
-    while True:
+# 处理单个用户：检测新微博并回复
+def process_uid(uid):
+    """
+    检查单个用户是否有新微博，有则调用AI回复
+
+    Args:
+        uid: 用户ID
+    """
+    nickname = get_name(uid)
+    add_log('INFO',f'正在处理用户{nickname}({uid})',uid=uid)
+    if nickname == uid:
+        add_log('INFO',f'用户{nickname}({uid})的昵称与uid相同，已禁用',uid=uid)
+        print(f'用户{nickname}({uid})的昵称与uid相同，已禁用')
+        reset_uid(uid,'0')
+        return
+    # 获取上次检查以来的所有新微博，按发帖顺序交给流水线
+    mids = get_new_mids(uid) or []
+    detected_at = time.time()
+    for mid in mids:
+        # 交给流水线获取内容、生成回复并发布，不阻塞后续检查
+        get_pipeline().submit({'uid': uid, 'nickname': nickname, 'mid': mid,
+                               'detected_at': detected_at})
+
+
+# 流水线阶段：获取帖子内容
+def fetch_content_stage(job):
+    job['text'] = get_context(job['mid'])
+    add_log('INFO',f'微博内容：{job["text"]}',uid=job['uid'])
+    return job
+
+# 流水线阶段：调用AI生成回复
+def generate_reply_stage(job):
+    try:
+        job['reply'] = generate_response(job['text'])
+    except GenerationError as e:
+        # 生成失败时不发布，避免把错误信息当作评论发出去
+        add_log('ERROR',f'mid：{job["mid"]}生成回复失败，跳过发布：{str(e)}',uid=job['uid'])
+        UID_ERRORS.inc(uid=job['uid'], stage='generate')
+        REPLIES.inc(result='skipped')
+        return None
+    add_log('INFO',f'AI生成的回复：{job["reply"]}',uid=job['uid'])
+    return job
+
+# 流水线阶段：发布回复
+def post_reply_stage(job):
+    if post_response(job['mid'], comment=job['reply'], nickname=job['nickname']):
+        REPLIES.inc(result='posted')
+        REPLY_SECONDS.observe(time.time() - job['detected_at'])
+    else:
+        UID_ERRORS.inc(uid=job['uid'], stage='post')
+        REPLIES.inc(result='failed')
+    return None
+
+# 流水线阶段出错
+def on_pipeline_error(stage_name, job, error):
+    UID_ERRORS.inc(uid=job['uid'], stage=stage_name)
+    REPLIES.inc(result='failed')
+    add_log('ERROR',f'处理mid：{job["mid"]}时{stage_name}阶段出错：{str(error)}',uid=job['uid'])
+
+pipeline = None
+
+# 导出流水线和调度器的状态
+def collect_metrics():
+    stats = pipeline.stats() if pipeline is not None else {}
+    intervals = scheduler.get_intervals()
+    profile_stats = profile_cache.stats()
+    return [
+        ('pipeline_queue_depth', 'gauge', '流水线各阶段排队的任务数',
+         [({'stage': name}, stage['depth']) for name, stage in stats.items()]),
+        ('pipeline_busy_workers', 'gauge', '流水线各阶段正在处理任务的线程数',
+         [({'stage': name}, stage['busy']) for name, stage in stats.items()]),
+        ('pipeline_workers', 'gauge', '流水线各阶段的线程数',
+         [({'stage': name}, stage['workers']) for name, stage in stats.items()]),
+        ('pipeline_processed_total', 'counter', '流水线各阶段已处理的任务数',
+         [({'stage': name}, stage['processed']) for name, stage in stats.items()]),
+        ('scheduler_uids', 'gauge', '参与调度的用户数', [({}, len(intervals))]),
+        ('profile_cache_lookups_total', 'counter', '昵称缓存查询次数，result为hit、negative_hit或miss',
+         [({'result': 'hit'}, profile_stats['hits']),
+          ({'result': 'negative_hit'}, profile_stats['negative_hits']),
+          ({'result': 'miss'}, profile_stats['misses'])]),
+    ]
+
+metrics.register_collector(collect_metrics)
+
+# 获取回复流水线
+def get_pipeline(config=None):
+    """
+    获取回复流水线（获取内容 -> 生成回复 -> 发布），首次调用时创建，
+    传入config时按配置调整各阶段的工作线程数
+
+    Args:
+        config: 配置
+
+    Returns:
+        Pipeline: 流水线
+    """
+    global pipeline
+    settings = (config or {}).get('pipeline', {})
+    workers = {name: int(settings.get(f'{name}_workers', default))
+               for name, default in DEFAULT_PIPELINE_WORKERS.items()}
+    if pipeline is None:
+        queue_size = int(settings.get('queue_size', DEFAULT_QUEUE_SIZE))
+        pipeline = Pipeline([
+            Stage('content', profiled(fetch_content_stage), workers['content'], queue_size, on_pipeline_error),
+            Stage('generate', profiled(generate_reply_stage), workers['generate'], queue_size, on_pipeline_error),
+            Stage('post', profiled(post_reply_stage), workers['post'], queue_size, on_pipeline_error),
+        ])
+    elif config is not None:
+        for name, count in workers.items():
+            pipeline.get_stage(name).resize(count)
+    return pipeline
+
+
+# 检查单个用户，停止后不再开始新的检查
+def check_uid(uid, stop):
+    if stop is not None and stop.is_set():
+        return False
+    profiler.run(process_uid, uid)
+    return True
+
+# 并发检查一轮所有启用的用户
+def run_cycle(uids, concurrency, stop=None):
+    """
+    使用有界线程池并发检查所有用户，stop被设置后已开始的检查照常完成，其余用户跳过
+
+    Args:
+        uids: 启用的用户ID列表
+        concurrency: 最大并发数
+        stop: 停止事件
+
+    Returns:
+        list: 因停止而没有检查的用户
+    """
+    start = time.perf_counter()
+    skipped = []
+    if uids:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(uids)),
+                                thread_name_prefix='weibo-poll') as executor:
+            futures = {uid: executor.submit(check_uid, uid, stop) for uid in uids}
+            for uid, future in futures.items():
+                try:
+                    if not future.result():
+                        skipped.append(uid)
+                except Exception as e:
+                    UID_ERRORS.inc(uid=uid, stage='process')
+                    add_log('ERROR',f'处理用户{uid}时发生错误：{str(e)}')
+    elapsed = time.perf_counter() - start
+    checked = len(uids) - len(skipped)
+    CYCLE_SECONDS.observe(elapsed)
+    CHECKED_UIDS.inc(checked)
+    throughput = checked / elapsed if elapsed > 0 else 0.0
+    depth = '，'.join(f'{name}={stats["depth"]}' for name, stats in get_pipeline().stats().items())
+    add_log('INFO',f'本轮检查{checked}个用户，并发数{concurrency}，耗时{elapsed:.2f}秒，吞吐{throughput:.2f}个/秒，队列深度：{depth}')
+    print(f'本轮检查{checked}个用户，并发数{concurrency}，耗时{elapsed:.2f}秒，吞吐{throughput:.2f}个/秒，队列深度：{depth}')
+    if skipped:
+        add_log('INFO',f'爬虫正在停止，本轮跳过{len(skipped)}个用户')
+    return skipped
+
+
+def main(stop=None):
+    """
+    运行调度循环，直到stop被设置或配置无法读取。停止时等待流水线处理完已发现的微博，
+    昵称缓存、调度状态、连接池和流水线线程都保留在进程中，再次调用时直接复用
+
+    Args:
+        stop: 停止事件（threading.Event），为None时一直运行
+    """
+    # 同一进程内重复启动会成倍增加请求并争抢缓存和配置文件
+    if not main_lock.acquire(blocking=False):
+        add_log('WARNING','爬虫调度循环已在运行，忽略重复启动')
+        print('爬虫调度循环已在运行，忽略重复启动')
+        return
+    stop = stop or threading.Event()
+    try:
+        run_scheduler(stop)
+        if stop.is_set() and pipeline is not None:
+            config = get_config() or {}
+            timeout = float(config.get('drain_timeout', DEFAULT_DRAIN_TIMEOUT))
+            add_log('INFO',f'等待流水线处理完已发现的微博（最多{timeout:.0f}秒）')
+            if pipeline.drain(timeout):
+                add_log('INFO','流水线已处理完毕')
+            else:
+                depth = '，'.join(f'{name}={stats["depth"] + stats["busy"]}' for name, stats in pipeline.stats().items())
+                add_log('WARNING',f'等待流水线超时，未完成的任务：{depth}，将在后台继续处理')
+    finally:
+        main_lock.release()
+
+# 调度循环
+def run_scheduler(stop):
+    global max_backlog
+    # 一次性迁移旧版的按用户JSON缓存文件
+    config = get_config()
+    # 分片模式下由协调器在启动工作进程前迁移
+    if config and shard is None:
+        migrated = get_mid_store().migrate_json_cache(CACHE_DIR, uids=config.get('uid', {}).keys())
+        if migrated:
+            add_log('INFO',f'已将{migrated}个旧版mid缓存文件迁移到数据库')
+
+    enabled_uids = None
+    while not stop.is_set():
         config = get_config()
         if not config:
             add_log('ERROR',f'读取配置文件失败，程序退出')
             break
         uid_list = config['uid']
 
-        for uid in uid_list.keys():
-            enabled = True if uid_list[uid] == "1" else False
-            
-            print(f'用户{uid}的状态：{enabled}')
-            add_log('INFO',f'用户{uid}的状态：{enabled}')
-            
-            
-            if enabled:
-                global nickname
-                nickname = get_name(uid)
-                add_log('INFO',f'正在处理用户{nickname}({uid})')
-                if nickname == uid:
-                    add_log('INFO',f'用户{nickname}({uid})的昵称与uid相同，已禁用')
-                    print(f'用户{nickname}({uid})的昵称与uid相同，已禁用')
-                    reset_uid(uid,'0')
-                else:
-                    # 获取新微博
-                    mid = get_new_mid(uid)
-                    if mid:
-                        # 调用AI生成回复
-                        post_response(mid)
-                
-        # 休眠
-        add_log('INFO',f'休眠{config["sleep_time"]}秒')
-        print(f'休眠{config["sleep_time"]}秒')
-        sleep(config['sleep_time'])
+        uids = [uid for uid in uid_list.keys() if uid_list[uid] == "1"]
+        if shard is not None:
+            # 分片模式下只检查协调器分配给本进程的用户
+            uids = shard.current_uids()
+        # 新启用的用户（启动时为所有启用的用户）
+        added = []
+        # 启用的用户变化时才输出状态，避免每次调度都刷屏
+        if uids != enabled_uids:
+            for uid in uid_list.keys():
+                enabled = uid in uids
+                print(f'用户{uid}的状态：{enabled}')
+                add_log('INFO',f'用户{uid}的状态：{enabled}')
+            added = [uid for uid in uids if uid not in (enabled_uids or [])]
+            if enabled_uids is not None:
+                # 运行中重新启用的用户重新获取昵称，不沿用之前失败的结果
+                profile_cache.discard_failures(added)
+            enabled_uids = uids
 
+        concurrency = max(1, int(config.get('concurrency', DEFAULT_CONCURRENCY)))
+        # 连接池至少覆盖并发数，避免线程等待空闲连接
+        get_client().configure(
+            pool_size=max(int(config.get('http_pool_size', DEFAULT_POOL_SIZE)), concurrency),
+            timeout=config.get('http_timeout'),
+            rate_limits=config.get('rate_limits', {}))
+        # 每次检查最多处理的新微博数
+        max_backlog = max(1, int(config.get('max_backlog', DEFAULT_MAX_BACKLOG)))
+        # 每个用户保留的已处理mid数量
+        get_mid_store().retention = max(1, int(config.get('mid_retention', DEFAULT_RETENTION)))
+        # 检查间隔在[min_interval, max_interval]之间按发帖频率自适应，未配置时最短间隔沿用sleep_time
+        scheduler.configure(
+            min_interval=config.get('min_interval', config.get('sleep_time', DEFAULT_MIN_INTERVAL)),
+            max_interval=config.get('max_interval', DEFAULT_MAX_INTERVAL))
+        scheduler.sync(uids)
+        get_pipeline(config)
+        profile_settings = config.get('profile_cache', {})
+        profile_cache.configure(ttl=profile_settings.get('ttl'), negative_ttl=profile_settings.get('negative_ttl'))
+        if added:
+            # 并发预取新启用用户的昵称，避免第一轮检查逐个等待资料请求
+            start = time.perf_counter()
+            fetched = prefetch_names(added, max(1, int(profile_settings.get('prefetch_concurrency',
+                                                                          DEFAULT_PREFETCH_CONCURRENCY))))
+            if fetched:
+                add_log('INFO',f'已预取{fetched}个用户的昵称，耗时{time.perf_counter() - start:.2f}秒')
 
+        due = scheduler.pop_due()
+        if due:
+            skipped = run_cycle(due, concurrency, stop)
+            profiler.on_cycle_end()
+            for uid in due:
+                if uid in skipped:
+                    # 下次启动时立即检查
+                    scheduler.requeue(uid)
+                    continue
+                interval = scheduler.reschedule(uid)
+                if interval is not None:
+                    add_log('INFO',f'用户{uid}下次检查间隔：{interval:.0f}秒',uid=uid)
 
-if __name__ == "__main__":
-    main()
-    
+        # 休眠到下一个用户到期，最多休眠MAX_IDLE秒以便及时响应配置变化
+        wait = scheduler.seconds_until_next()
+        stop.wait(MAX_IDLE if wait is None else min(wait, MAX_IDLE))
 
 
-    
-    
+if __name__ == "__main__":
+    main()
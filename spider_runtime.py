@@ -0,0 +1,127 @@
+import time
+import threading
+from log_manager import add_log
+
+# 调度循环出错或因配置无法读取而退出后，重新运行前的等待时间（秒）
+RETRY_DELAY = 5
+# 停止时等待调度循环退出的最长时间（秒），需大于流水线的drain_timeout
+DEFAULT_STOP_TIMEOUT = 90
+
+
+# 在配置服务进程内运行的爬虫，同一时刻只有一个调度循环
+class SpiderRuntime:
+    def __init__(self, stop_timeout=DEFAULT_STOP_TIMEOUT):
+        """
+        Args:
+            stop_timeout: 停止时等待调度循环退出的最长时间（秒）
+        """
+        self.stop_timeout = stop_timeout
+        self.thread = None
+        self.stop_event = None
+        self.state = 'stopped'
+        self.started_at = None
+        self.starts = 0
+        self.last_error = None
+        # 串行化启动、停止和重启
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """
+        启动调度循环，已在运行时不做任何操作
+
+        Returns:
+            bool: 是否启动了新的调度循环
+        """
+        with self._lock:
+            return self._start()
+
+    def _start(self):
+        if self.running:
+            return False
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(self.stop_event,), name='spider', daemon=True)
+        self.state = 'running'
+        self.started_at = time.time()
+        self.starts += 1
+        self.thread.start()
+        return True
+
+    def _run(self, stop):
+        try:
+            # 只导入一次爬虫模块，重启时复用已有的连接池、缓存、调度状态和流水线
+            import spider
+        except Exception as e:
+            self.last_error = f'加载爬虫模块出错：{e}'
+            add_log('ERROR', self.last_error)
+            print(self.last_error)
+            self.state = 'stopped'
+            return
+        while not stop.is_set():
+            try:
+                spider.main(stop)
+            except Exception as e:
+                self.last_error = f'爬虫运行出错：{e}'
+                add_log('ERROR', self.last_error)
+                print(self.last_error)
+            # 出错或配置无法读取时稍后重试，停止时立即返回
+            stop.wait(RETRY_DELAY)
+        self.state = 'stopped'
+
+    def stop(self, timeout=None):
+        """
+        通知调度循环停止：不再开始新的用户检查，当前这一轮已开始的检查照常完成，
+        流水线处理完已发现的微博后返回
+
+        Args:
+            timeout: 等待的最长时间（秒），默认为stop_timeout
+
+        Returns:
+            bool: 调度循环是否已退出（本来就没有运行时为True）
+        """
+        with self._lock:
+            return self._stop(timeout)
+
+    def _stop(self, timeout):
+        if not self.running:
+            return True
+        self.state = 'stopping'
+        self.stop_event.set()
+        add_log('INFO', '正在停止爬虫...')
+        self.thread.join(self.stop_timeout if timeout is None else timeout)
+        if self.thread.is_alive():
+            # 线程无法强制结束，保持stopping状态，退出前不会启动新的调度循环
+            add_log('WARNING', '爬虫未能按时停止，将在当前任务完成后退出')
+            return False
+        add_log('INFO', '爬虫已停止')
+        return True
+
+    def restart(self):
+        """
+        停止后重新启动，进程内的连接池和缓存保持不变
+
+        Returns:
+            bool: 是否启动了新的调度循环（旧循环未能按时停止时为False）
+        """
+        with self._lock:
+            if not self._stop(None):
+                return False
+            return self._start()
+
+    def status(self):
+        """
+        Returns:
+            dict: state（running、stopping或stopped）、启动时间、启动次数和最近的错误
+        """
+        return {
+            'state': self.state if self.running else 'stopped',
+            'started_at': self.started_at,
+            'starts': self.starts,
+            'last_error': self.last_error,
+        }
+
+
+runtime = SpiderRuntime()
@@ -0,0 +1,221 @@
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+from collections import deque
+from multiprocessing.connection import Client
+from mid_store import get_store as get_mid_store
+from sharding import AUTHKEY_ENV, DEFAULT_HEARTBEAT, HANDOFF_MIDS, STOP_TIMEOUT, parse_address
+
+# 两次心跳之间最多缓存的日志条数，超出时丢弃最旧的
+MAX_PENDING_LOGS = 2000
+
+
+# 把日志转发给协调器的日志存储，替换工作进程中的log_manager.store
+class ForwardingLogStore:
+    def __init__(self, maxlen=MAX_PENDING_LOGS):
+        self.pending = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def append(self, entry):
+        with self._lock:
+            self.pending.append(entry)
+
+    def drain(self):
+        with self._lock:
+            entries = list(self.pending)
+            self.pending.clear()
+        return entries
+
+
+# 工作进程与协调器之间的连接，向爬虫提供分配到的用户
+class WorkerAgent:
+    def __init__(self, worker_id, address, authkey):
+        """
+        Args:
+            worker_id: 工作进程ID，同一协调器下唯一
+            address: 协调器地址（host:port）
+            authkey: 认证密钥
+        """
+        self.worker_id = worker_id
+        self.address = parse_address(address)
+        self.authkey = authkey.encode('utf-8')
+        self.logs = ForwardingLogStore()
+        self.conn = None
+        self.assigned = []
+        self.version = 0
+        self.heartbeat = DEFAULT_HEARTBEAT
+        self.held = set()
+        self.config_updates = []
+        # 已上报给协调器的各用户最大mid
+        self.reported = {}
+        self.started_at = time.time()
+        self._process = None
+        self._lock = threading.Lock()
+
+    def current_uids(self):
+        """
+        爬虫每次调度时调用，返回分配给本进程的用户并记为正在检查
+
+        Returns:
+            list: 用户ID列表
+        """
+        with self._lock:
+            self.held = set(self.assigned)
+            return list(self.assigned)
+
+    def set_enabled(self, uid, enabled):
+        """
+        启用或禁用用户，由协调器写入配置，禁用的用户立即不再检查
+        """
+        with self._lock:
+            self.config_updates.append((uid, enabled))
+            if enabled != '1' and uid in self.assigned:
+                self.assigned = [item for item in self.assigned if item != uid]
+
+    def health(self):
+        import spider
+        from metrics import CHECKED_UIDS, CYCLE_SECONDS, REPLIES
+        stats = spider.pipeline.stats() if spider.pipeline is not None else {}
+        result = {
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'checked': sum(value['value'] for value in CHECKED_UIDS.snapshot()),
+            'cycles': sum(value['count'] for value in CYCLE_SECONDS.snapshot()),
+            'replies': {value['labels']['result']: value['value'] for value in REPLIES.snapshot()},
+            'queue_depth': sum(stage['depth'] for stage in stats.values()),
+        }
+        try:
+            if self._process is None:
+                import psutil
+                self._process = psutil.Process()
+            result['rss'] = self._process.memory_info().rss
+            result['cpu_percent'] = self._process.cpu_percent(None)
+        except Exception:
+            pass
+        return result
+
+    def collect_states(self):
+        """
+        收集最大mid有变化的用户的状态，协调器把用户交给其他进程时转交
+
+        Returns:
+            dict: 用户ID到{max_id, mids}的映射
+        """
+        store = get_mid_store()
+        states = {}
+        for uid, max_id in store.max_ids().items():
+            if self.reported.get(uid) != max_id:
+                states[uid] = {'max_id': max_id, 'mids': store.recent_mids(uid, HANDOFF_MIDS)}
+        return states
+
+    def seed_states(self, states):
+        """
+        写入协调器转交的用户状态，只会推进本地记录的位置
+        """
+        store = get_mid_store()
+        for uid, state in states.items():
+            store.add_mids(uid, state['mids'], max_id=state['max_id'])
+
+    def send_heartbeat(self):
+        """
+        发送心跳（附带日志、配置修改和用户状态）并按回复更新分配的用户
+
+        Returns:
+            dict: 协调器的回复
+        """
+        with self._lock:
+            updates, self.config_updates = self.config_updates, []
+            held = sorted(self.held)
+        # 在读取held之后收集，释放用户时它最后的状态一定在同一次心跳中
+        states = self.collect_states()
+        message = {
+            'worker_id': self.worker_id,
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'held': held,
+            'health': self.health(),
+            'logs': self.logs.drain(),
+            'config_updates': updates,
+            'states': states,
+        }
+        try:
+            self.conn.send(message)
+            reply = self.conn.recv()
+        except Exception:
+            with self._lock:
+                # 没送达的配置修改下次重发
+                self.config_updates = updates + self.config_updates
+            raise
+        for uid, state in states.items():
+            self.reported[uid] = state['max_id']
+        # 先写入新分配用户的状态，再交给爬虫检查
+        self.seed_states(reply.get('states', {}))
+        with self._lock:
+            self.assigned = reply.get('uids', [])
+            self.version = reply.get('version', self.version)
+            self.heartbeat = reply.get('heartbeat', self.heartbeat)
+        return reply
+
+    def run(self):
+        """
+        心跳循环，协调器要求退出时返回。与协调器断开后立即停止检查所有用户，
+        等协调器把它们重新分配，然后不断重连
+        """
+        while True:
+            if self.conn is None:
+                try:
+                    self.conn = Client(self.address, authkey=self.authkey)
+                    # 新连接可能对应重启后的协调器，重新上报所有用户的状态
+                    self.reported = {}
+                except Exception as e:
+                    print(f'连接协调器失败：{e}')
+                    time.sleep(self.heartbeat)
+                    continue
+            try:
+                reply = self.send_heartbeat()
+            except Exception as e:
+                print(f'与协调器断开：{e}')
+                with self._lock:
+                    self.assigned = []
+                self.conn.close()
+                self.conn = None
+                time.sleep(self.heartbeat)
+                continue
+            if reply.get('stop'):
+                if reply.get('error'):
+                    print(f'协调器拒绝连接：{reply["error"]}')
+                return
+            time.sleep(self.heartbeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='爬虫工作进程，检查协调器分配的用户')
+    parser.add_argument('--coordinator', required=True, help='协调器地址，host:port')
+    parser.add_argument('--worker-id', default=f'{socket.gethostname()}-{os.getpid()}', help='工作进程ID')
+    args = parser.parse_args()
+    authkey = os.getenv(AUTHKEY_ENV)
+    if not authkey:
+        print(f'缺少认证密钥，请设置环境变量{AUTHKEY_ENV}')
+        sys.exit(1)
+
+    agent = WorkerAgent(args.worker_id, args.coordinator, authkey)
+    # 日志由协调器写入，网页上照常显示
+    import log_manager
+    log_manager.store = agent.logs
+    # 其他主机上的工作进程同样读取本机Config目录下的配置和cookie
+    import spider
+    spider.shard = agent
+    stop = threading.Event()
+    thread = threading.Thread(target=spider.main, args=(stop,), name='spider', daemon=True)
+    thread.start()
+    agent.run()
+    # 协调器要求退出：不再检查新的用户，等流水线处理完已发现的微博
+    stop.set()
+    thread.join(STOP_TIMEOUT)
+
+
+if __name__ == '__main__':
+    main()
@@ -63,6 +63,7 @@ function saveConfig() {
     // 收集Prompt和Sleep Time
     const prompt = document.getElementById('prompt').value.trim();
     const sleepTime = document.getElementById('sleep-time').value.trim();
+    const concurrency = document.getElementById('concurrency').value.trim();
 
     const uidDict = {};
     uidItems.forEach(item => {
@@ -84,6 +85,7 @@ function saveConfig() {
         uid: uidDict,
         prompt: prompt,
         sleep_time: sleepTime ? parseInt(sleepTime) : 10,
+        concurrency: concurrency ? parseInt(concurrency) : 5,
         env: {
             'ARK_API_KEY': arkApiKey
         },
@@ -111,6 +113,23 @@ document.getElementById('save-config').addEventListener('click', function() {
     });
 });
 
+// 启动、停止和重启在后台执行，轮询爬虫状态直到该操作完成，再显示结果
+function waitForControl(controlId, attempts = 180) {
+    fetch('/api/spider')
+    .then(response => response.json())
+    .then(data => {
+        const control = (data.controls || []).find(item => item.id === controlId);
+        if (control && (control.state === 'done' || control.state === 'failed')) {
+            showToast(control.message, control.state === 'done' ? 'success' : 'error');
+        } else if (control && attempts > 1) {
+            setTimeout(() => waitForControl(controlId, attempts - 1), 1000);
+        }
+    })
+    .catch(error => {
+        showToast('获取爬虫状态失败！⚠️'+error.message, 'error');
+    });
+}
+
 // 启动爬虫按钮点击事件
 document.getElementById('start-spider').addEventListener('click', function() {
     saveConfig()
@@ -122,7 +141,10 @@ document.getElementById('start-spider').addEventListener('click', function() {
             })
             .then(response => response.json())
             .then(data => {
-                showToast(data.message, 'success');
+                showToast(data.message, data.success ? 'success' : 'error');
+                if (data.control_id) {
+                    waitForControl(data.control_id);
+                }
                 // const status = document.getElementById('status');
                 // status.className = data.success ? 'status success' : 'status error';
                 // status.textContent = data.message;
@@ -142,6 +164,22 @@ document.getElementById('start-spider').addEventListener('click', function() {
     });
 });
 
+document.getElementById('stop-spider').addEventListener('click', function() {
+    fetch('/stop-spider', {
+        method: 'POST'
+    })
+    .then(response => response.json())
+    .then(data => {
+        showToast(data.message, data.success ? 'success' : 'error');
+        if (data.control_id) {
+            waitForControl(data.control_id);
+        }
+    })
+    .catch(error => {
+        showToast('停止爬虫失败！⚠️'+error.message, 'error');
+    });
+});
+
 // 日志按钮点击事件
 document.getElementById('logs-btn').addEventListener('click', function() {
     window.location.href = '/logs';
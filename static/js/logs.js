@@ -8,17 +8,29 @@ const logLevel = document.getElementById('log-level');
 const clearLogsBtn = document.getElementById('clear-logs');
 // 返回配置按钮
 const configBtn = document.getElementById('config-btn');
+// 加载更早日志按钮
+const loadMoreBtn = document.getElementById('load-more');
 
 // 轮询间隔（毫秒）
 const POLLING_INTERVAL = 5000;
+// 页面上最多保留的日志条数
+const MAX_LOG_ITEMS = 1000;
 
-// 加载日志
+// 已加载的最后一条日志序号
+let lastSeq = 0;
+
+// 加载日志（只获取上次之后新增的部分）
 function loadLogs() {
-    fetch('/api/logs')
+    fetch(`/api/logs?since=${lastSeq}`)
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            displayLogs(data.logs);
+            if (data.reset) {
+                displayLogs(data.logs);
+            } else {
+                appendLogs(data.logs);
+            }
+            lastSeq = data.last_seq;
         } else {
             console.error('获取日志失败:', data.message);
         }
@@ -46,17 +58,43 @@ function displayLogs(logs) {
     
     // 展示每条日志
     logs.forEach(log => {
-        addLogItem(log);
+        applyFilter(addLogItem(log));
     });
     
     // 滚动到底部
     scrollToBottom();
 }
 
+// 追加新增的日志
+function appendLogs(logs) {
+    if (logs.length === 0) {
+        return;
+    }
+    
+    // 移除“暂无日志数据”等占位项
+    logsContent.querySelectorAll('.log-item:not([data-seq])').forEach(item => item.remove());
+    
+    const atBottom = logsContent.scrollTop + logsContent.clientHeight >= logsContent.scrollHeight - 10;
+    logs.forEach(log => {
+        applyFilter(addLogItem(log));
+    });
+    
+    // 超出上限时移除最早的日志
+    while (logsContent.children.length > MAX_LOG_ITEMS) {
+        logsContent.removeChild(logsContent.firstElementChild);
+    }
+    
+    // 用户正在查看历史日志时不打断
+    if (atBottom) {
+        scrollToBottom();
+    }
+}
+
 // 添加日志项
 function addLogItem(log) {
     const logItem = document.createElement('div');
     logItem.className = `log-item ${log.level.toLowerCase()}`;
+    logItem.dataset.seq = log.seq;
     logItem.innerHTML = `
         <div class="log-time">${log.time}</div>
         <div class="log-content">
@@ -65,6 +103,7 @@ function addLogItem(log) {
         </div>
     `;
     logsContent.appendChild(logItem);
+    return logItem;
 }
 
 // 展示错误信息
@@ -92,6 +131,7 @@ function clearLogs() {
         .then(data => {
             if (data.success) {
                 displayLogs([]);
+                lastSeq = 0;
                 alert('日志清空成功！');
             } else {
                 console.error('清空日志失败:', data.message);
@@ -105,69 +145,178 @@ function clearLogs() {
     }
 }
 
-// 过滤日志
-function filterLogs() {
+// 判断单条日志是否符合当前过滤条件
+function applyFilter(item) {
     const searchTerm = logSearch.value.toLowerCase();
     const selectedLevel = logLevel.value;
+    const levelElement = item.querySelector('.log-level');
+    if (!levelElement) {
+        return;
+    }
+    
+    const logMessage = item.querySelector('.log-message').textContent.toLowerCase();
+    const itemLevel = levelElement.textContent;
     
-    const logItems = logsContent.querySelectorAll('.log-item');
-    
-    logItems.forEach(item => {
-        const logMessage = item.querySelector('.log-message').textContent.toLowerCase();
-        const logLevel = item.querySelector('.log-level').textContent;
-        
-        const matchesSearch = logMessage.includes(searchTerm);
-        const matchesLevel = selectedLevel === 'all' || logLevel.toLowerCase() === selectedLevel;
-        
-        if (matchesSearch && matchesLevel) {
-            item.style.display = 'block';
+    const matchesSearch = logMessage.includes(searchTerm);
+    const matchesLevel = selectedLevel === 'all' || itemLevel.toLowerCase() === selectedLevel;
+    
+    if (matchesSearch && matchesLevel) {
+        item.style.display = 'block';
+    } else {
+        item.style.display = 'none';
+    }
+}
+
+// 每页检索的日志条数
+const SEARCH_PAGE_SIZE = 200;
+// 检索输入防抖时间（毫秒）
+const SEARCH_DEBOUNCE = 300;
+
+// 检索防抖定时器ID
+let searchTimeoutId = null;
+// 当前检索已加载的条数
+let searchOffset = 0;
+
+// 是否设置了过滤条件
+function hasFilter() {
+    return logSearch.value.trim() !== '' || logLevel.value !== 'all';
+}
+
+// 在服务端检索日志（包括备份日志）
+function searchLogs(append) {
+    const params = new URLSearchParams({
+        level: logLevel.value,
+        q: logSearch.value.trim(),
+        limit: SEARCH_PAGE_SIZE,
+        offset: append ? searchOffset : 0
+    });
+    
+    fetch(`/api/logs?${params}`)
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            console.error('检索日志失败:', data.message);
+            return;
+        }
+        if (append) {
+            // 更早的日志插入到最前面
+            const firstItem = logsContent.firstElementChild;
+            data.logs.forEach(log => {
+                logsContent.insertBefore(addLogItem(log), firstItem);
+            });
         } else {
-            item.style.display = 'none';
+            displayLogs(data.logs);
+            searchOffset = 0;
         }
+        searchOffset += data.logs.length;
+        loadMoreBtn.style.display = searchOffset < data.total ? 'inline-block' : 'none';
+    })
+    .catch(error => {
+        console.error('检索日志时发生错误:', error);
+        displayError('检索日志时发生错误');
     });
 }
 
+// 过滤日志
+function filterLogs() {
+    clearTimeout(searchTimeoutId);
+    searchTimeoutId = setTimeout(function() {
+        stopLiveUpdates();
+        if (hasFilter()) {
+            // 有过滤条件时暂停实时更新，改为服务端检索
+            searchLogs(false);
+        } else {
+            // 清空过滤条件后重新加载最近日志并恢复实时更新
+            loadMoreBtn.style.display = 'none';
+            lastSeq = 0;
+            startLiveUpdates();
+        }
+    }, SEARCH_DEBOUNCE);
+}
+
 // 轮询定时器ID
 let pollingIntervalId = null;
+// 实时日志连接
+let eventSource = null;
 
 // 初始化
 function init() {
-    // 加载日志
-    loadLogs();
-    
-    // 设置轮询
-    startPolling();
+    // 优先使用实时日志流，浏览器不支持时退回轮询
+    startLiveUpdates();
     
     // 绑定事件
     clearLogsBtn.addEventListener('click', clearLogs);
     configBtn.addEventListener('click', function() {
-        // 停止轮询
-        stopPolling();
+        // 停止更新
+        stopLiveUpdates();
         window.location.href = '/';
     });
     
     // 绑定过滤事件
     logSearch.addEventListener('input', filterLogs);
     logLevel.addEventListener('change', filterLogs);
+    loadMoreBtn.addEventListener('click', function() {
+        searchLogs(true);
+    });
     
     // 绑定页面可见性变化事件
     document.addEventListener('visibilitychange', function() {
         if (document.hidden) {
-            // 页面变为不可见时停止轮询
-            stopPolling();
-        } else {
-            // 页面变为可见时启动轮询
-            startPolling();
+            // 页面变为不可见时停止更新
+            stopLiveUpdates();
+        } else if (!hasFilter()) {
+            // 页面变为可见时从上次的位置继续
+            startLiveUpdates();
         }
     });
     
     // 绑定页面卸载事件
     window.addEventListener('beforeunload', function() {
-        // 页面即将关闭时停止轮询
-        stopPolling();
+        // 页面即将关闭时停止更新
+        stopLiveUpdates();
     });
 }
 
+// 启动实时日志流
+function startLiveUpdates() {
+    if (!window.EventSource) {
+        loadLogs();
+        startPolling();
+        return;
+    }
+    if (eventSource !== null) {
+        return;
+    }
+    
+    eventSource = new EventSource(`/api/logs/stream?since=${lastSeq}`);
+    
+    // 服务端要求重新加载，清空当前页面
+    eventSource.addEventListener('reset', function() {
+        displayLogs([]);
+        lastSeq = 0;
+    });
+    
+    eventSource.onmessage = function(event) {
+        const log = JSON.parse(event.data);
+        appendLogs([log]);
+        lastSeq = log.seq;
+    };
+    
+    // 连接断开后浏览器会自动带上Last-Event-ID重连
+    eventSource.onerror = function() {
+        console.error('实时日志连接中断，正在重连...');
+    };
+}
+
+// 停止实时日志流
+function stopLiveUpdates() {
+    if (eventSource !== null) {
+        eventSource.close();
+        eventSource = null;
+    }
+    stopPolling();
+}
+
 // 启动轮询
 function startPolling() {
     // 确保不会重复启动轮询
@@ -0,0 +1,253 @@
+// 性能指标面板
+const metricsPanel = document.getElementById('metrics-panel');
+// 指标折线图
+const metricsChart = document.getElementById('metrics-chart');
+// 图例
+const metricsLegend = document.getElementById('metrics-legend');
+// 指标表格
+const metricsRows = document.getElementById('metrics-rows');
+// 计数汇总
+const metricsSummary = document.getElementById('metrics-summary');
+
+// 刷新间隔（毫秒）
+const METRICS_INTERVAL = 5000;
+// 图表上保留的点数
+const MAX_METRICS_POINTS = 60;
+
+// 展示的环节：名称、颜色、直方图名称和标签条件
+const METRICS_SERIES = [
+    { name: '时间线', color: '#667eea', metric: 'weibo_request_seconds', labels: { endpoint: 'timeline' } },
+    { name: '获取内容', color: '#28a745', metric: 'weibo_request_seconds', labels: { endpoint: 'status_show' } },
+    { name: 'AI生成', color: '#ff9800', metric: 'ai_generation_seconds', labels: { result: 'ok' } },
+    { name: '发布评论', color: '#dc3545', metric: 'weibo_request_seconds', labels: { endpoint: 'comment_create' } },
+    { name: '每轮检查', color: '#764ba2', metric: 'spider_cycle_seconds', labels: {} }
+];
+
+// 上一次的快照，用于计算区间内的平均耗时
+let lastMetrics = null;
+// 各环节最近的平均耗时
+let metricsHistory = METRICS_SERIES.map(() => []);
+// 刷新定时器ID
+let metricsIntervalId = null;
+
+// 汇总符合标签条件的直方图
+function sumHistogram(snapshot, series) {
+    const metric = snapshot[series.metric];
+    const result = { count: 0, sum: 0, buckets: null, counts: null };
+    if (!metric) {
+        return result;
+    }
+    metric.values.forEach(value => {
+        const matched = Object.keys(series.labels).every(key => value.labels[key] === series.labels[key]);
+        if (!matched) {
+            return;
+        }
+        result.count += value.count;
+        result.sum += value.sum;
+        result.buckets = value.buckets;
+        result.counts = result.counts ? result.counts.map((count, i) => count + value.counts[i]) : value.counts.slice();
+    });
+    return result;
+}
+
+// 根据桶计数估计分位数（取所在桶的上边界）
+function histogramPercentile(histogram, p) {
+    if (!histogram.count) {
+        return null;
+    }
+    const target = histogram.count * p / 100;
+    let seen = 0;
+    for (let i = 0; i < histogram.counts.length; i++) {
+        seen += histogram.counts[i];
+        if (seen >= target) {
+            return histogram.buckets[i];
+        }
+    }
+    return null;
+}
+
+// 格式化耗时
+function formatSeconds(seconds) {
+    if (seconds === null || seconds === undefined) {
+        return '-';
+    }
+    if (seconds === '+Inf') {
+        return '>120s';
+    }
+    return seconds < 1 ? `${(seconds * 1000).toFixed(0)}ms` : `${seconds.toFixed(2)}s`;
+}
+
+// 累加计数器
+function sumCounter(snapshot, name, labelName) {
+    const metric = snapshot[name];
+    const result = {};
+    if (!metric) {
+        return result;
+    }
+    metric.values.forEach(value => {
+        const key = value.labels[labelName];
+        result[key] = (result[key] || 0) + value.value;
+    });
+    return result;
+}
+
+// 获取并展示指标
+function loadMetrics() {
+    fetch('/api/metrics?format=json')
+    .then(response => response.json())
+    .then(snapshot => {
+        updateMetrics(snapshot);
+        lastMetrics = snapshot;
+    })
+    .catch(error => {
+        console.error('获取性能指标时发生错误:', error);
+    });
+}
+
+// 更新表格和图表
+function updateMetrics(snapshot) {
+    metricsRows.innerHTML = '';
+    METRICS_SERIES.forEach((series, index) => {
+        const current = sumHistogram(snapshot, series);
+        // 本次刷新区间内的平均耗时
+        let recent = null;
+        if (lastMetrics) {
+            const previous = sumHistogram(lastMetrics, series);
+            const count = current.count - previous.count;
+            if (count > 0) {
+                recent = (current.sum - previous.sum) / count;
+            }
+        }
+        metricsHistory[index].push(recent);
+        if (metricsHistory[index].length > MAX_METRICS_POINTS) {
+            metricsHistory[index].shift();
+        }
+
+        const row = document.createElement('tr');
+        [
+            series.name,
+            current.count,
+            formatSeconds(current.count ? current.sum / current.count : null),
+            formatSeconds(histogramPercentile(current, 95)),
+            formatSeconds(recent)
+        ].forEach(text => {
+            const cell = document.createElement('td');
+            cell.textContent = text;
+            row.appendChild(cell);
+        });
+        metricsRows.appendChild(row);
+    });
+
+    // 状态码、回复结果和出错最多的用户
+    const statuses = sumCounter(snapshot, 'weibo_responses_total', 'status');
+    const replies = sumCounter(snapshot, 'spider_replies_total', 'result');
+    const uidErrors = Object.entries(sumCounter(snapshot, 'spider_uid_errors_total', 'uid'))
+        .sort((a, b) => b[1] - a[1])
+        .slice(0, 5);
+    const format = counts => Object.entries(counts).map(([key, value]) => `${key}: ${value}`).join('，') || '无';
+    metricsSummary.textContent = `微博状态码 ${format(statuses)}；回复 ${format(replies)}；`
+        + `出错最多的用户 ${uidErrors.map(([uid, count]) => `${uid}: ${count}`).join('，') || '无'}`;
+
+    drawMetricsChart();
+}
+
+// 绘制最近平均耗时的折线图
+function drawMetricsChart() {
+    const ratio = window.devicePixelRatio || 1;
+    const width = metricsChart.clientWidth;
+    const height = metricsChart.clientHeight;
+    metricsChart.width = width * ratio;
+    metricsChart.height = height * ratio;
+    const ctx = metricsChart.getContext('2d');
+    ctx.scale(ratio, ratio);
+    ctx.clearRect(0, 0, width, height);
+
+    const padding = 40;
+    const values = metricsHistory.flat().filter(value => value !== null);
+    const maxValue = Math.max(0.001, ...values);
+
+    // 坐标轴和刻度
+    ctx.strokeStyle = '#e0e0e0';
+    ctx.fillStyle = '#888';
+    ctx.font = '11px sans-serif';
+    for (let i = 0; i <= 4; i++) {
+        const y = padding / 2 + (height - padding) * i / 4;
+        ctx.beginPath();
+        ctx.moveTo(padding, y);
+        ctx.lineTo(width - 10, y);
+        ctx.stroke();
+        ctx.fillText(formatSeconds(maxValue * (4 - i) / 4), 2, y + 4);
+    }
+
+    const step = (width - padding - 10) / (MAX_METRICS_POINTS - 1);
+    METRICS_SERIES.forEach((series, index) => {
+        const history = metricsHistory[index];
+        const offset = MAX_METRICS_POINTS - history.length;
+        ctx.strokeStyle = series.color;
+        ctx.lineWidth = 2;
+        ctx.beginPath();
+        let drawing = false;
+        history.forEach((value, i) => {
+            if (value === null) {
+                // 区间内没有样本时断开折线
+                drawing = false;
+                return;
+            }
+            const x = padding + (offset + i) * step;
+            const y = padding / 2 + (height - padding) * (1 - value / maxValue);
+            if (drawing) {
+                ctx.lineTo(x, y);
+            } else {
+                ctx.moveTo(x, y);
+                drawing = true;
+            }
+        });
+        ctx.stroke();
+    });
+}
+
+// 启动定时刷新
+function startMetrics() {
+    if (metricsIntervalId === null) {
+        loadMetrics();
+        metricsIntervalId = setInterval(loadMetrics, METRICS_INTERVAL);
+    }
+}
+
+// 停止定时刷新
+function stopMetrics() {
+    if (metricsIntervalId !== null) {
+        clearInterval(metricsIntervalId);
+        metricsIntervalId = null;
+    }
+}
+
+// 初始化指标面板
+function initMetrics() {
+    metricsLegend.innerHTML = '';
+    METRICS_SERIES.forEach(series => {
+        const item = document.createElement('span');
+        item.textContent = series.name;
+        item.style.setProperty('--series-color', series.color);
+        metricsLegend.appendChild(item);
+    });
+
+    // 只在面板展开且页面可见时刷新
+    metricsPanel.addEventListener('toggle', function() {
+        if (metricsPanel.open) {
+            startMetrics();
+        } else {
+            stopMetrics();
+        }
+    });
+    document.addEventListener('visibilitychange', function() {
+        if (document.hidden) {
+            stopMetrics();
+        } else if (metricsPanel.open) {
+            startMetrics();
+        }
+    });
+}
+
+// 页面加载完成后初始化
+window.addEventListener('DOMContentLoaded', initMetrics);
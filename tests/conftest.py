@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config_store
+import log_manager
+import mid_store
+
+
+# 把配置、日志和mid数据库指向临时目录，不影响正式数据
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_store, 'store', config_store.ConfigStore(str(tmp_path / 'config.json')))
+    monkeypatch.setattr(log_manager, 'store', log_manager.LogStore(str(tmp_path / 'logs' / 'logs.jsonl'),
+                                                                   str(tmp_path / 'logs' / 'backup')))
+    store = mid_store.MidStore(str(tmp_path / 'state.db'))
+    monkeypatch.setattr(mid_store, 'store', store)
+    yield store
+    store.close()
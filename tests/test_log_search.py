@@ -0,0 +1,46 @@
+import log_manager
+from log_manager import LogStore
+
+
+def make_store(tmp_path, **kwargs):
+    return LogStore(str(tmp_path / 'logs.jsonl'), str(tmp_path / 'backup'), **kwargs)
+
+
+def write(store, count, prefix='条目'):
+    for i in range(count):
+        store.append({'time': '2026-01-01 00:00:00', 'level': 'INFO', 'message': f'{prefix} {i}'})
+
+
+def test_search_includes_backups_and_logs_written_during_the_build(tmp_path, monkeypatch):
+    store = make_store(tmp_path, max_file_size=200)
+    write(store, 20)
+    # 已有备份文件，之后不再轮转
+    store.max_file_size = log_manager.MAX_FILE_SIZE
+    read_index = store._read_index
+
+    # 读取历史日志期间继续写日志
+    def read_while_logging(paths, last_seq):
+        write(store, 3, prefix='期间')
+        return read_index(paths, last_seq)
+
+    monkeypatch.setattr(store, '_read_index', read_while_logging)
+    assert store.search(query='条目')['total'] == 20
+    assert store.search(query='期间')['total'] == 3
+    write(store, 1, prefix='之后')
+    assert store.search(query='之后')['total'] == 1
+
+
+def test_index_is_built_under_the_lock_after_repeated_rotations(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+    write(store, 5)
+    attempts = []
+
+    # 每次不持锁建立时都发生轮转，结果被丢弃
+    def build_during_rotation():
+        attempts.append(1)
+        store._rotations += 1
+
+    monkeypatch.setattr(store, '_build_index', build_during_rotation)
+    assert store.search(query='条目')['total'] == 5
+    assert len(attempts) == log_manager.INDEX_BUILD_ATTEMPTS
+    assert store.search(level='WARNING')['total'] == 1
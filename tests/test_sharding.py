@@ -0,0 +1,72 @@
+import config_store
+from sharding import Coordinator, HashRing
+
+
+def heartbeat(coordinator, worker, held=(), states=None):
+    return coordinator._handle(worker, {'held': list(held), 'states': states or {}})
+
+
+def make_coordinator(uids):
+    config_store.save_config({'uid': {uid: '1' for uid in uids}})
+    return Coordinator()
+
+
+def test_ring_moves_only_the_new_nodes_share():
+    uids = [str(1000 + i) for i in range(1000)]
+    before = HashRing(['a', 'b', 'c']).assign(uids)
+    after = HashRing(['a', 'b', 'c', 'd']).assign(uids)
+    owner_before = {uid: node for node, owned in before.items() for uid in owned}
+    owner_after = {uid: node for node, owned in after.items() for uid in owned}
+    moved = [uid for uid in uids if owner_before[uid] != owner_after[uid]]
+    assert all(owner_after[uid] == 'd' for uid in moved)
+    assert len(moved) < len(uids) / 2
+
+
+def test_uids_sent_to_one_worker_are_not_given_to_another(stores):
+    uids = [str(1000 + i) for i in range(50)]
+    coordinator = make_coordinator(uids)
+    a = coordinator._register({'worker_id': 'a', 'host': 'h1', 'pid': 1})
+    assert sorted(heartbeat(coordinator, a)['uids']) == sorted(uids)
+
+    # b连接时a还没有发心跳上报held，但已拿到全部用户，下一轮就会检查
+    b = coordinator._register({'worker_id': 'b', 'host': 'h2', 'pid': 2})
+    assert heartbeat(coordinator, b)['uids'] == []
+
+    # a的下一次心跳缩小分配，但它仍在检查上一轮的用户
+    reply = heartbeat(coordinator, a, held=uids)
+    moved = set(uids) - set(reply['uids'])
+    assert moved
+    assert heartbeat(coordinator, b)['uids'] == []
+
+    # a释放后b才拿到这些用户
+    heartbeat(coordinator, a, held=reply['uids'])
+    assert set(heartbeat(coordinator, b)['uids']) == moved
+
+
+def test_lost_worker_keeps_its_uids_until_timeout(stores):
+    uids = [str(1000 + i) for i in range(20)]
+    coordinator = make_coordinator(uids)
+    a = coordinator._register({'worker_id': 'a', 'host': 'h1', 'pid': 1})
+    heartbeat(coordinator, a)
+    coordinator._lose(a)
+    b = coordinator._register({'worker_id': 'b', 'host': 'h2', 'pid': 2})
+    assert heartbeat(coordinator, b)['uids'] == []
+
+    del coordinator.workers['a']
+    assert sorted(heartbeat(coordinator, b)['uids']) == sorted(uids)
+
+
+def test_new_owner_receives_the_latest_state(stores):
+    coordinator = make_coordinator(['1001'])
+    a = coordinator._register({'worker_id': 'a', 'host': 'h1', 'pid': 1})
+    assert heartbeat(coordinator, a)['uids'] == ['1001']
+    heartbeat(coordinator, a, held=['1001'], states={'1001': {'max_id': 160, 'mids': [160, 150]}})
+    coordinator._lose(a)
+    del coordinator.workers['a']
+
+    b = coordinator._register({'worker_id': 'b', 'host': 'h2', 'pid': 2})
+    reply = heartbeat(coordinator, b, states={'1001': {'max_id': 100, 'mids': [100]}})
+    assert reply['uids'] == ['1001']
+    assert reply['states']['1001'] == {'max_id': 160, 'mids': [160, 150, 100]}
+    # 已经分配过的用户不再重复发送状态
+    assert heartbeat(coordinator, b, held=['1001'])['states'] == {}
@@ -0,0 +1,115 @@
+import pytest
+
+import spider
+from scheduler import PollScheduler
+
+UID = '1001'
+MAX_ID = 5000
+
+
+# 按页返回时间线，记录请求过的页码
+class FakeTimeline:
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    def __call__(self, uid, page, stop_at):
+        self.requested.append(page)
+        if callable(self.pages):
+            return self.pages(page)
+        return self.pages[page - 1] if page <= len(self.pages) else []
+
+
+def posts(*mids, top=False):
+    return [{'id': mid, 'created_at': f'created {mid}', 'isTop': 1 if top else 0} for mid in mids]
+
+
+@pytest.fixture
+def timeline(stores, monkeypatch):
+    stores.add_mids(UID, [MAX_ID])
+    monkeypatch.setattr(spider, 'scheduler', PollScheduler())
+    monkeypatch.setattr(spider, 'get_name', lambda uid: 'nickname')
+    monkeypatch.setattr(spider, 'max_backlog', spider.DEFAULT_MAX_BACKLOG)
+
+    def install(pages):
+        fake = FakeTimeline(pages)
+        monkeypatch.setattr(spider, 'get_timeline_page', fake)
+        return fake
+    return install
+
+
+def test_pages_until_the_stored_max_id(timeline, stores):
+    fake = timeline([posts(5012, 5011), posts(5010, MAX_ID, 4999)])
+    assert spider.get_new_mids(UID) == [5010, 5011, 5012]
+    assert fake.requested == [1, 2]
+    assert stores.get_max_id(UID) == 5012
+
+
+def test_no_new_posts_reads_one_page(timeline):
+    fake = timeline([posts(MAX_ID, 4999)])
+    assert spider.get_new_mids(UID) == []
+    assert fake.requested == [1]
+
+
+def test_repeated_page_stops_after_page_two(timeline, monkeypatch):
+    # 接口忽略page参数，每页都是第一页
+    monkeypatch.setattr(spider, 'max_backlog', 100)
+    fake = timeline(lambda page: posts(*range(5020, 5000, -1)))
+    assert spider.get_new_mids(UID) == list(range(5001, 5021))
+    assert fake.requested == [1, 2]
+
+
+def test_page_limit(timeline):
+    # 每页只有5条新帖子，max_backlog为20时最多翻ceil(20 / 20) + 1 = 2页
+    fake = timeline(lambda page: posts(*range(6000 - page * 5, 6000 - page * 5 - 5, -1)))
+    mids = spider.get_new_mids(UID)
+    assert fake.requested == [1, 2]
+    assert len(mids) == 10
+
+
+def test_backlog_overflow_keeps_the_newest(timeline, stores, monkeypatch):
+    monkeypatch.setattr(spider, 'max_backlog', 30)
+    fake = timeline([posts(*range(5100, 5080, -1)), posts(*range(5080, 5060, -1)), posts(MAX_ID)])
+    mids = spider.get_new_mids(UID)
+    # 读到30条就停止翻页，只处理最新的30条
+    assert fake.requested == [1, 2]
+    assert mids == list(range(5071, 5101))
+    assert stores.get_max_id(UID) == 5100
+    # 超出上限的更早帖子不会在下次检查时再被当作新帖子
+    fake = timeline([posts(*range(5100, 5080, -1)), posts(*range(5080, 5060, -1)), posts(MAX_ID)])
+    assert spider.get_new_mids(UID) == []
+    assert fake.requested == [1]
+
+
+def test_old_pinned_post_does_not_stop_paging(timeline):
+    # 置顶的旧帖子不代表读到了上次的位置
+    fake = timeline([posts(4000, top=True) + posts(5003, 5002), posts(5001, MAX_ID)])
+    assert spider.get_new_mids(UID) == [5001, 5002, 5003]
+    assert fake.requested == [1, 2]
+
+
+def test_new_pinned_post_is_reported_once(timeline):
+    fake = timeline([posts(5050, top=True) + posts(MAX_ID)])
+    assert spider.get_new_mids(UID) == [5050]
+    fake = timeline([posts(5050, top=True) + posts(MAX_ID)])
+    assert spider.get_new_mids(UID) == []
+
+
+def test_account_without_posts_is_initialized_once(timeline, monkeypatch):
+    requests = []
+
+    class Response:
+        content = b'{"ok": 1, "data": {"list": []}}'
+
+    class Client:
+        def get(self, url):
+            requests.append(url)
+            return Response()
+
+    monkeypatch.setattr(spider, 'get_client', lambda: Client())
+    fake = timeline([[]])
+    assert spider.get_new_mids('2002') == []
+    assert spider.get_new_mids('2002') == []
+    # 只在第一次检查时请求初始化的第一页
+    assert len(requests) == 1
+    assert fake.requested == [1, 1]
@@ -0,0 +1,114 @@
+import re
+import json
+
+# 时间线帖子中爬虫用到的字段
+TIMELINE_FIELDS = ('id', 'created_at', 'isTop', 'text_raw')
+
+# 跳过JSON中的空白
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+decoder = json.JSONDecoder()
+
+
+# 跳过空白，返回下一个非空白字符的位置
+def skip_whitespace(text, index):
+    return WHITESPACE.match(text, index).end()
+
+# 在JSON对象中查找键，只解码途经的其他值，不解码查找的键之后的内容
+def find_key(text, index, name):
+    """
+    Args:
+        text: JSON文本
+        index: 对象开头'{'的位置
+        name: 要查找的键
+
+    Returns:
+        int: 键对应的值的开头位置
+
+    Raises:
+        KeyError: 对象中没有该键
+        json.JSONDecodeError: JSON格式错误
+    """
+    index = skip_whitespace(text, index)
+    if text[index:index + 1] != '{':
+        raise json.JSONDecodeError('应为对象', text, index)
+    index = skip_whitespace(text, index + 1)
+    while text[index:index + 1] != '}':
+        key, index = decoder.raw_decode(text, index)
+        index = skip_whitespace(text, index)
+        if not isinstance(key, str) or text[index:index + 1] != ':':
+            raise json.JSONDecodeError('应为键值对', text, index)
+        index = skip_whitespace(text, index + 1)
+        if key == name:
+            return index
+        # 跳过其他键的值（如ok、since_id），这些值都很小
+        _, index = decoder.raw_decode(text, index)
+        index = skip_whitespace(text, index)
+        if text[index:index + 1] == ',':
+            index = skip_whitespace(text, index + 1)
+        elif text[index:index + 1] != '}':
+            raise json.JSONDecodeError('应为","或"}"', text, index)
+    raise KeyError(name)
+
+
+# 逐条读取mymblog返回的帖子
+def iter_timeline(content, fields=TIMELINE_FIELDS):
+    """
+    从data.list中逐条解码帖子，只保留需要的字段。调用方停止迭代后，剩余的帖子不再解码，
+    同一时刻只有一条完整的帖子对象存在
+
+    Args:
+        content: 响应内容（bytes或str）
+        fields: 保留的字段
+
+    Yields:
+        dict: 只含fields中存在的字段的帖子
+
+    Raises:
+        KeyError: 响应中没有data或list（如cookie过期）
+        json.JSONDecodeError: JSON格式错误
+    """
+    text = content.decode('utf-8') if isinstance(content, bytes) else content
+    index = find_key(text, find_key(text, 0, 'data'), 'list')
+    if text[index:index + 1] != '[':
+        raise json.JSONDecodeError('list应为数组', text, index)
+    index = skip_whitespace(text, index + 1)
+    if text[index:index + 1] == ']':
+        return
+    while True:
+        item, index = decoder.raw_decode(text, index)
+        post = {field: item[field] for field in fields if field in item}
+        # 暂停迭代期间不持有完整的帖子对象
+        del item
+        yield post
+        index = skip_whitespace(text, index)
+        if text[index:index + 1] == ']':
+            return
+        if text[index:index + 1] != ',':
+            raise json.JSONDecodeError('应为","或"]"', text, index)
+        index = skip_whitespace(text, index + 1)
+
+
+# 读取时间线上比max_id新的帖子
+def read_timeline(content, max_id=None, fields=TIMELINE_FIELDS):
+    """
+    按顺序读取帖子，读到第一条mid不大于max_id的非置顶帖子（含该条）后停止。
+    置顶帖可能比max_id旧，不作为停止条件
+
+    Args:
+        content: 响应内容（bytes或str）
+        max_id: 已处理的最大mid，为None时读取整页
+        fields: 保留的字段
+
+    Returns:
+        list: 帖子列表
+
+    Raises:
+        KeyError: 响应中没有data或list
+        json.JSONDecodeError: JSON格式错误
+    """
+    posts = []
+    for post in iter_timeline(content, fields):
+        posts.append(post)
+        if max_id is not None and not post.get('isTop') and post.get('id', 0) <= max_id:
+            break
+    return posts
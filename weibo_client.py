@@ -0,0 +1,137 @@
+import os
+import re
+import json
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from rate_limiter import RateLimiter, classify
+from metrics import WEIBO_REQUEST_SECONDS, WEIBO_RESPONSES
+
+# cookie文件路径
+COOKIE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Config', 'weibo_cookie.json')
+
+# 默认连接池大小
+DEFAULT_POOL_SIZE = 10
+# 默认超时时间（秒），分别为连接超时和读取超时
+DEFAULT_TIMEOUT = (5, 15)
+
+
+# 带连接池的微博客户端，所有微博请求共用一个Session
+class WeiboClient:
+    def __init__(self, cookie_file=COOKIE_FILE, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        """
+        初始化微博客户端
+
+        Args:
+            cookie_file: cookie文件路径
+            pool_size: 连接池大小（每个主机保持的长连接数）
+            timeout: 请求超时时间，可以是秒数或(连接超时, 读取超时)
+        """
+        self.cookie_file = cookie_file
+        self.pool_size = None
+        self.adapter = None
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._header = None
+        self._header_stamp = None
+        self._lock = threading.Lock()
+        self.rate_limiter = RateLimiter()
+        self.configure(pool_size=pool_size, timeout=timeout)
+
+    def configure(self, pool_size=None, timeout=None, rate_limits=None):
+        """
+        调整连接池大小、超时时间和限速，参数未变化时不做任何操作
+
+        Args:
+            pool_size: 连接池大小
+            timeout: 请求超时时间
+            rate_limits: 各接口类别的限速配置，见rate_limiter.DEFAULT_RATE_LIMITS
+        """
+        if rate_limits is not None:
+            self.rate_limiter.configure(rate_limits)
+        if timeout is not None:
+            self.timeout = tuple(timeout) if isinstance(timeout, list) else timeout
+        if pool_size is not None and pool_size != self.pool_size:
+            self.pool_size = pool_size
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+            # 关闭旧连接池中的空闲连接，正在使用的连接归还时随之关闭
+            old, self.adapter = self.adapter, adapter
+            if old is not None:
+                old.close()
+
+    def get_header(self):
+        """
+        获取请求头，仅在cookie文件变化时重新解析
+
+        Returns:
+            dict: 请求头
+        """
+        stat = os.stat(self.cookie_file)
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if stamp != self._header_stamp:
+            with self._lock:
+                if stamp != self._header_stamp:
+                    with open(self.cookie_file, 'r') as f:
+                        header = json.loads(f.read())
+                    cookie = header['Cookie']
+                    header['x-xsrf-token'] = re.findall(r'XSRF-TOKEN=([^;]+)', cookie)[0]
+                    # 加上Referer
+                    header['referer'] = 'https://weibo.com/'
+                    self._header = header
+                    self._header_stamp = stamp
+        return self._header
+
+    def get(self, url, **kwargs):
+        """
+        发送GET请求
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        self.rate_limiter.acquire(url)
+        return self._send(self.session.get, url, headers=self.get_header(), **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        """
+        发送POST请求
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        self.rate_limiter.acquire(url)
+        return self._send(self.session.post, url, headers=self.get_header(), data=data, **kwargs)
+
+    def _send(self, method, url, **kwargs):
+        # 按接口类别记录耗时和状态码
+        endpoint = classify(url)[1] or 'other'
+        try:
+            with WEIBO_REQUEST_SECONDS.time(endpoint=endpoint):
+                response = method(url=url, **kwargs)
+        except Exception:
+            WEIBO_RESPONSES.inc(endpoint=endpoint, status='error')
+            raise
+        WEIBO_RESPONSES.inc(endpoint=endpoint, status=response.status_code)
+        return response
+
+    def close(self):
+        """
+        关闭连接池
+        """
+        self.session.close()
+
+
+client = None
+client_lock = threading.Lock()
+
+# 获取全局共享的微博客户端
+def get_client():
+    """
+    获取全局共享的微博客户端，首次调用时创建
+
+    Returns:
+        WeiboClient: 微博客户端
+    """
+    global client
+    if client is None:
+        with client_lock:
+            if client is None:
+                client = WeiboClient()
+    return client